@@ -0,0 +1,49 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class TTLCache:
+    """In-process cache of awaitable results that expire after `ttl` seconds.
+
+    Concurrent requests for a key that is missing or expired share a single load instead of each starting one, so a
+    burst of probes or dashboard refreshes costs one JDA query per key per `ttl`. Failed loads are not cached.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: dict[Hashable, tuple[float, Any]] = {}
+        self.loading: dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        task = self.loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, load))
+            self.loading[key] = task
+        # Shielded, so a client disconnecting does not cancel the load the other waiters share
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await load()
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            if len(self.entries) > self.max_entries:
+                self.evict()
+            return value
+        finally:
+            del self.loading[key]
+
+    def evict(self) -> None:
+        """Drop expired entries, then the oldest ones while the cache is still over `max_entries`."""
+        now = time.monotonic()
+        self.entries = {key: entry for key, entry in self.entries.items() if entry[0] > now}
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+
+    def clear(self) -> None:
+        self.entries.clear()
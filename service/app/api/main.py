@@ -1,18 +1,51 @@
+import asyncio
 import logging
-from fastapi import FastAPI
+import secrets
+from contextlib import asynccontextmanager
+
+from typing import Annotated
+
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import HTMLResponse
 
+from app.api.cache import TTLCache
+from app.api.queries import fetch_flag_counts, fetch_rows_loaded, fetch_store, read_last_runs
 from app.glogger import setup_glogger
-from app.settings import settings
+from app.jobs.worker import Worker
+from app.settings import get_settings
+from app.utils_oracle import close_async_oracle_pool, close_oracle_pool, oracle_pool_statistics
 
-setup_glogger(
-    app_name=settings.app_name,
-    environment=settings.environment,
-    level=settings.log_level,
-)
+settings = get_settings()
 
 logger = logging.getLogger(__name__)
-app = FastAPI()
+
+# Results of JDA and checkpoint reads, shared by all requests of this replica
+cache = TTLCache(ttl=settings.api_cache_ttl)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Configured on startup rather than import, so importing the app (e.g. in tests) leaves logging alone
+    setup_glogger(
+        app_name=settings.app_name,
+        environment=settings.environment,
+        app_version=settings.application_version,
+        level=settings.log_level,
+        development=settings.disable_json_logs,
+    )
+    # Set by the `worker` command, which serves this API next to its jobs
+    worker = getattr(app.state, "worker", None)
+    if worker is not None:
+        worker.start()
+    yield
+    if worker is not None:
+        # Runs cannot be interrupted; let them finish before their pools are closed
+        await asyncio.to_thread(worker.stop)
+    close_oracle_pool()
+    await close_async_oracle_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -22,4 +55,75 @@ async def root() -> str:
     Welcome to the Etos JDA Integrations. <br>
     Spec - SwaggerUI : <a href="/docs">/docs</a>. <br>
     </html>
-    """
\ No newline at end of file
+    """
+
+
+@app.get("/healthcheck")
+async def healthcheck() -> dict[str, str]:
+    """Liveness and readiness probe; touches neither JDA nor the checkpoint volume."""
+    return {"status": "ok"}
+
+
+@app.get("/metrics/oracle-pool")
+async def oracle_pool() -> dict[str, int | float]:
+    """JDA session pool usage."""
+    return oracle_pool_statistics()
+
+
+@app.get("/status/last-run")
+async def last_run() -> dict:
+    """Outcome and metrics of the last run of each job, and the store watermark."""
+    return await cache.get("last_run", lambda: asyncio.to_thread(read_last_runs, settings.checkpoint_path))
+
+
+@app.get("/status/rows-loaded")
+async def rows_loaded() -> dict:
+    """Rows and stores in the JDA store feed, and when it was last loaded."""
+    return await cache.get("rows_loaded", fetch_rows_loaded)
+
+
+@app.get("/status/pending")
+async def pending() -> dict:
+    """Store feed rows per jda_processed_flag, and how many JDA has yet to process."""
+    return await cache.get("pending", fetch_flag_counts)
+
+
+@app.get("/stores/{store_id}")
+async def store(store_id: int) -> dict:
+    """The latest row of a store in the JDA store feed."""
+    row = await cache.get(("store", store_id), lambda: fetch_store(store_id))
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Store {store_id} is not in the JDA store feed")
+    return row
+
+
+@app.get("/jobs")
+async def jobs() -> dict[str, dict]:
+    """Jobs of the worker: whether each is running, when it runs next and how its last run went."""
+    return get_worker().status()
+
+
+@app.post("/jobs/{job_name}/runs", status_code=202)
+async def trigger_job(job_name: str, authorization: Annotated[str | None, Header()] = None) -> dict[str, str]:
+    """Start a run of a job in the worker; 409 when it, or a job sharing its checkpoints, is already running."""
+    token = settings.worker_trigger_token
+    if token is None:
+        raise HTTPException(status_code=403, detail="Triggering jobs is disabled; set WORKER_TRIGGER_TOKEN to enable it")
+    if authorization is None or not secrets.compare_digest(
+        authorization.encode(), f"Bearer {token.get_secret_value()}".encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid or missing bearer token")
+    try:
+        started = get_worker().trigger(job_name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Invalid job name: {job_name}") from None
+    if not started:
+        raise HTTPException(status_code=409, detail=f"{job_name} is already running")
+    return {"job": job_name, "status": "started"}
+
+
+def get_worker() -> Worker:
+    worker = getattr(app.state, "worker", None)
+    if worker is None:
+        raise HTTPException(status_code=503, detail="Jobs run in the worker; this API was started without one")
+    return worker
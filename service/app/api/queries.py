@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import orjson
+
+from app.jobs.checkpoint_store import get_checkpoint_store
+from app.jobs.job_get_stores import STORE_COLUMNS
+from app.utils_oracle import async_oracle_connection
+
+# Flag of rows JDA has not processed yet
+PENDING_FLAG = "U"
+
+FLAG_COUNTS_QUERY = """
+    SELECT jda_processed_flag, COUNT(*)
+      FROM intowner.csg_etos_store_in
+     GROUP BY jda_processed_flag
+"""
+
+ROWS_LOADED_QUERY = """
+    SELECT COUNT(*)
+         , COUNT(DISTINCT store)
+         , COUNT(CASE WHEN jda_processed_time >= SYSTIMESTAMP - INTERVAL '1' DAY THEN 1 END)
+         , MAX(jda_processed_time)
+      FROM intowner.csg_etos_store_in
+"""
+
+STORE_QUERY = f"""
+    SELECT {", ".join(STORE_COLUMNS)}, jda_processed_flag, jda_processed_time
+      FROM intowner.csg_etos_store_in
+     WHERE store = :store
+     ORDER BY jda_processed_time DESC
+     FETCH FIRST 1 ROWS ONLY
+"""
+
+
+async def fetch_flag_counts() -> dict[str, int | dict[str, int]]:
+    """Rows of the store feed per jda_processed_flag, and how many JDA has yet to process."""
+    async with async_oracle_connection() as connection:
+        with connection.cursor() as cursor:
+            await cursor.execute(FLAG_COUNTS_QUERY)
+            flags = {flag or "null": count for flag, count in await cursor.fetchall()}
+    return {"pending": flags.get(PENDING_FLAG, 0), "flags": flags}
+
+
+async def fetch_rows_loaded() -> dict[str, int | datetime | None]:
+    """Size of the store feed and when it was last loaded."""
+    async with async_oracle_connection() as connection:
+        with connection.cursor() as cursor:
+            await cursor.execute(ROWS_LOADED_QUERY)
+            rows, stores, rows_last_day, last_loaded_at = await cursor.fetchone()
+    return {"rows": rows, "stores": stores, "rows_last_day": rows_last_day, "last_loaded_at": last_loaded_at}
+
+
+async def fetch_store(store_id: int) -> dict | None:
+    """The latest feed row of a store, or None when it was never loaded."""
+    async with async_oracle_connection() as connection:
+        with connection.cursor() as cursor:
+            await cursor.execute(STORE_QUERY, store=store_id)
+            row = await cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0].lower() for column in cursor.description], row, strict=True))
+
+
+def read_last_runs(checkpoint_path: str) -> dict:
+    """Outcome of the last run of every job, and the store watermark, as recorded on the checkpoint volume."""
+    store = get_checkpoint_store(checkpoint_path)
+    watermark = store.get("load_stores_last_update_time")
+    return {
+        "runs": {key.removeprefix("last_run/"): orjson.loads(value) for key, value in store.items("last_run/")},
+        "load_stores_last_update_time": watermark.decode() if watermark is not None else None,
+    }
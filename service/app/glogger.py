@@ -1,13 +1,22 @@
-import json
 import logging
+import queue
 import sys
+import threading
 import traceback
 from datetime import datetime
+from typing import TextIO
+
+import orjson
 
 
 class HealthCheckFilter(logging.Filter):
     def filter(self, record: logging.LogRecord) -> bool:
-        return "healthcheck" not in record.getMessage()
+        # Look at the message and its arguments without formatting them, this runs for every record
+        if isinstance(record.msg, str) and "healthcheck" in record.msg:
+            return False
+        if isinstance(record.args, tuple):
+            return not any(isinstance(arg, str) and "healthcheck" in arg for arg in record.args)
+        return True
 
 
 class GLoggerHandler(logging.Handler):
@@ -25,26 +34,25 @@ class GLoggerHandler(logging.Handler):
         super().__init__()
 
     def format(self, record):
-        data = record.__dict__
         json_record = {}
         json_record["service"] = self.app_name
         json_record["env"] = self.environment
         json_record["app_version"] = self.app_version
-        json_record["timestamp"] = datetime.now().isoformat()
+        json_record["timestamp"] = datetime.fromtimestamp(record.created).isoformat()
         json_record["level"] = record.levelname
         json_record["msg"] = record.getMessage()
 
-        if int(data["levelno"]) >= logging.ERROR:
+        if record.levelno >= logging.ERROR:
             if record.exc_info:
                 err_type, err_value, err_traceback = record.exc_info
                 json_record["stacktrace"] = traceback.format_exception(
                     err_type, err_value, err_traceback
                 )
 
-        if "trace_id" in data:
-            json_record["trace_id"] = data["trace_id"]
-        if "data" in data:
-            json_record["data"] = data["data"]
+        if hasattr(record, "trace_id"):
+            json_record["trace_id"] = record.trace_id
+        if hasattr(record, "data"):
+            json_record["data"] = record.data
 
         if self.development:
             result = (
@@ -57,7 +65,70 @@ class GLoggerHandler(logging.Handler):
 
             return result
 
-        return json.dumps(json_record)
+        return orjson.dumps(json_record, default=str).decode()
+
+
+class BatchingStreamHandler(logging.Handler):
+    """Write log records to a stream from a background thread, in batches.
+
+    Emitting only puts the record on a queue; formatting, serialization and writing happen on the writer thread,
+    which flushes whenever `batch_size` records are waiting or `flush_interval` seconds have passed. Records are
+    formatted after they are emitted, so mutable log arguments should not be changed afterwards.
+    """
+
+    def __init__(self, stream: TextIO | None = None, batch_size: int = 500, flush_interval: float = 0.2):
+        super().__init__()
+        self.stream = stream or sys.stderr
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records: queue.SimpleQueue[logging.LogRecord | None] = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self._write_batches, name="glogger", daemon=True)
+        self.writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.writer.is_alive():
+            self.records.put(record)
+        else:
+            # Records logged after shutdown, e.g. "Application finished", are written directly
+            self._write([record])
+
+    def close(self) -> None:
+        """Write the remaining records and stop the writer."""
+        if self.writer.is_alive():
+            self.records.put(None)
+            self.writer.join()
+        super().close()
+
+    def _write_batches(self) -> None:
+        while True:
+            batch: list[logging.LogRecord] = []
+            stop = False
+            try:
+                while len(batch) < self.batch_size:
+                    record = self.records.get(timeout=self.flush_interval if batch else None)
+                    if record is None:
+                        stop = True
+                        break
+                    batch.append(record)
+            except queue.Empty:
+                pass
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list[logging.LogRecord]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if lines:
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except Exception:
+                self.handleError(batch[-1])
 
 
 def setup_glogger(
@@ -68,13 +139,19 @@ def setup_glogger(
     logger=logging.getLogger(),  # noqa: B008
     development=False,
 ):
+    # GLogger records carry no thread or process details, so skip collecting them for every record
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False
+
     formatter = GLoggerHandler(app_name, environment, app_version, development)
     for logger_name in logging.root.manager.loggerDict.keys():
         override_logger = logging.getLogger(logger_name)
         override_logger.addFilter(HealthCheckFilter())
         for handler in override_logger.handlers:
             handler.setFormatter(formatter)
-    handler = logging.StreamHandler()
+    handler = BatchingStreamHandler()
     handler.setFormatter(formatter)
     logger.handlers.append(handler)
     logger.setLevel(level)
@@ -84,21 +161,9 @@ def setup_glogger(
     def excepthook(exc_type, exc_value, exc_traceback):
         logger.error(exc_value, exc_info=(exc_type, exc_value, exc_traceback))
 
-    # Redirect print statements to the logging module
-    class LoggerWriter:
-        def __init__(self, level):
-            self.level = level
-
-        def write(self, message):
-            if message != "\n":
-                logger.log(self.level, message)
-
-        def flush(self):
-            pass
-
-    # Redirect stdout and stderr
     sys.excepthook = excepthook
-    sys.stdout = LoggerWriter(logging.DEBUG)
-    sys.stderr = LoggerWriter(logging.ERROR)
+    # Warnings are the one thing written to stderr outside logging; stdout and stderr themselves are left alone, as
+    # logging every write to them would turn each chunk of a print into a record, and loop on handler errors
+    logging.captureWarnings(True)
 
     return logger
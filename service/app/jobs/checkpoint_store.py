@@ -0,0 +1,188 @@
+import fcntl
+import mmap
+import os
+import struct
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+# File layout: header, index of fixed size entries sorted by key, then the keys and values they point into.
+# Lookups binary search the index of the memory-mapped file, so reading one watermark does not parse every hash.
+MAGIC = b"ETOSCKP1"
+HEADER = struct.Struct("<8sI")
+ENTRY = struct.Struct("<IIII")  # key offset, key length, value offset, value length
+
+
+class CheckpointStore:
+    """Many checkpoint values (watermarks, fingerprints, cursors) in one compact, memory-mapped file.
+
+    Updates rewrite the file to a temporary file and rename it into place, under an exclusive advisory lock on a
+    sidecar lock file, so replicas sharing the checkpoint volume neither lose each other's updates nor see a partial
+    file. Readers need no lock: a rename never changes a file that is already mapped.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._mapping: mmap.mmap | None = None
+        self._mapped_version: tuple[int, int, int] | None = None
+
+    def get(self, key: str) -> bytes | None:
+        """Value of `key`, or None when it is not set."""
+        mapping = self._map()
+        if mapping is None:
+            return None
+        encoded = key.encode()
+        low, high = 0, entry_count(mapping)
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, value_offset, value_length = ENTRY.unpack_from(
+                mapping, HEADER.size + middle * ENTRY.size
+            )
+            middle_key = mapping[key_offset : key_offset + key_length]
+            if middle_key == encoded:
+                return mapping[value_offset : value_offset + value_length]
+            if middle_key < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def items(self, prefix: str = "") -> Iterator[tuple[str, bytes]]:
+        """Keys starting with `prefix` and their values, in key order."""
+        mapping = self._map()
+        if mapping is None:
+            return
+        encoded = prefix.encode()
+        for key, value in raw_entries(mapping, start=first_index_at_or_after(mapping, encoded)):
+            if not key.startswith(encoded):
+                return
+            yield key.decode(), value
+
+    def update(self, values: Mapping[str, bytes | None]) -> None:
+        """Set the given keys at once; a None value removes the key."""
+        if not values:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.locked():
+            # Re-read under the lock, another replica may have written since this one last looked
+            mapping = self._map()
+            entries = dict(raw_entries(mapping)) if mapping is not None else {}
+            for key, value in values.items():
+                if value is None:
+                    entries.pop(key.encode(), None)
+                else:
+                    entries[key.encode()] = value
+            temporary_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with temporary_path.open("wb") as file:
+                file.write(encode(entries))
+                file.flush()
+                os.fsync(file.fileno())
+            temporary_path.replace(self.path)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the exclusive advisory lock of the store."""
+        with self.lock_path.open("a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _map(self) -> mmap.mmap | None:
+        """Mapping of the current file, re-mapped only when the file was replaced."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version != self._mapped_version:
+            if stat.st_size == 0:
+                return None
+            with self.path.open("rb") as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapping[: len(MAGIC)] != MAGIC:
+                mapping.close()
+                msg = f"Not a checkpoint store: {self.path}"
+                raise ValueError(msg)
+            self._mapping, self._mapped_version = mapping, version
+        return self._mapping
+
+
+class CheckpointUpdates:
+    """Updates to a checkpoint store staged over a job run, and written with a single rewrite when committed.
+
+    Every update of the store rewrites the whole file, which grows with the fingerprints, so a run stages its
+    watermark, fingerprints and last run here instead of updating the store for each.
+    """
+
+    def __init__(self, store: CheckpointStore):
+        self.store = store
+        self.values: dict[str, bytes | None] = {}
+        self.callbacks: list[Callable[[], None]] = []
+
+    def update(self, values: Mapping[str, bytes | None]) -> None:
+        """Stage the given keys; a None value removes the key."""
+        self.values.update(values)
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Call `callback` once the staged values are written, e.g. to drop what they supersede."""
+        self.callbacks.append(callback)
+
+    def commit(self) -> None:
+        """Write the staged values at once."""
+        values, self.values = self.values, {}
+        callbacks, self.callbacks = self.callbacks, []
+        self.store.update(values)
+        for callback in callbacks:
+            callback()
+
+
+def raw_entries(mapping: mmap.mmap, start: int = 0) -> Iterator[tuple[bytes, bytes]]:
+    """Encoded keys and values of a mapped store, from entry `start` on."""
+    index = memoryview(mapping)[HEADER.size + start * ENTRY.size : HEADER.size + entry_count(mapping) * ENTRY.size]
+    try:
+        for key_offset, key_length, value_offset, value_length in ENTRY.iter_unpack(index):
+            yield mapping[key_offset : key_offset + key_length], mapping[value_offset : value_offset + value_length]
+    finally:
+        index.release()
+
+
+def encode(entries: Mapping[bytes, bytes]) -> bytes:
+    """Serialize encoded keys and values into the store's file layout."""
+    keys = sorted(entries)
+    data_offset = HEADER.size + len(keys) * ENTRY.size
+    index = bytearray(HEADER.pack(MAGIC, len(keys)))
+    data = bytearray()
+    for key in keys:
+        value = entries[key]
+        key_offset = data_offset + len(data)
+        data += key
+        index += ENTRY.pack(key_offset, len(key), key_offset + len(key), len(value))
+        data += value
+    return bytes(index + data)
+
+
+def entry_count(mapping: mmap.mmap) -> int:
+    return HEADER.unpack_from(mapping, 0)[1]
+
+
+def first_index_at_or_after(mapping: mmap.mmap, key: bytes) -> int:
+    """Index of the first entry whose key sorts at or after `key`."""
+    low, high = 0, entry_count(mapping)
+    while low < high:
+        middle = (low + high) // 2
+        key_offset, key_length, _, _ = ENTRY.unpack_from(mapping, HEADER.size + middle * ENTRY.size)
+        if mapping[key_offset : key_offset + key_length] < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+@cache
+def get_checkpoint_store(checkpoint_path: str) -> CheckpointStore:
+    """The checkpoint store in the `checkpoint_path` directory, shared within the process."""
+    return CheckpointStore(Path(checkpoint_path) / "checkpoints.bin")
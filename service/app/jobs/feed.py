@@ -0,0 +1,442 @@
+import hashlib
+import logging
+from collections.abc import Callable, Iterator, Mapping
+from dataclasses import dataclass
+from functools import cache, cached_property
+from itertools import repeat
+from typing import Any, Generic, TypeVar
+
+import oracledb
+import orjson
+
+from app.jobs.checkpoint_store import CheckpointUpdates
+from app.jobs.job import Checkpoint, FingerprintIndex, Job, RejectSink, RunJournal, prefetch
+from app.jobs.normalize import ColumnBatch, RejectedItem
+from app.settings import get_graphql_settings
+from app.utils_graphql import PersistedQuery, selection_set
+from app.utils_oracle import BulkInsertResult, bulk_insert, column_widths
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+# Watermark used when no checkpoint exists yet, i.e. the first run does a full load
+INITIAL_WATERMARK = "2021-10-01 00:00:00"
+
+
+class FeedSyncState(Generic[R]):
+    """Watermark, fingerprints and progress of one run of a feed, kept under `name` on the checkpoint volume."""
+
+    def __init__(
+        self,
+        name: str,
+        checkpoint_path: str,
+        key: Callable[[R], str],
+        watermark: Callable[[R], str | None],
+        fingerprint: Callable[[R], str],
+        resume: bool = True,
+        label: str = "Records",
+    ):
+        self.checkpoint = Checkpoint(name=f"{name}_last_update_time", checkpoint_path=checkpoint_path)
+        self.fingerprints = FingerprintIndex(name=f"{name}_fingerprints", checkpoint_path=checkpoint_path)
+        self.journal = RunJournal(name=f"{name}_progress", checkpoint_path=checkpoint_path)
+        self.key, self.watermark, self.fingerprint = key, watermark, fingerprint
+        self.label = label
+        self.last_update_time = self.checkpoint.read_checkpoint() or INITIAL_WATERMARK
+        self.high_water_mark = self.last_update_time
+        # Watermarks fetched this run, and the oldest watermark of a record JDA rejected. The checkpoint is held below
+        # it, as only records newer than the checkpoint are fetched, and the rejected record must be fetched again.
+        self.watermarks: set[str] = set()
+        self.retry_from: str | None = None
+        # Cursor of the first page an interrupted run did not commit, and whether it committed every page
+        self.resume_after: str | None = None
+        self.fetch_complete = False
+        self.resuming = False
+        if resume:
+            self.resume()
+        else:
+            self.journal.clear()
+
+    def resume(self) -> None:
+        """Pick up the progress of an interrupted run from the same watermark, if there is one."""
+        entries = [entry for entry in self.journal.entries() if entry["last_update_time"] == self.last_update_time]
+        if not entries:
+            self.journal.clear()
+            return
+        self.resuming = True
+        for entry in entries:
+            self.fingerprints.pending.update(entry["fingerprints"])
+            if "after" in entry:
+                self.resume_after = entry["after"]
+                self.fetch_complete = entry["after"] is None
+                self.high_water_mark = entry["high_water_mark"]
+                self.retry_from = entry.get("retry_from")
+        logger.info(
+            f"Resuming interrupted run from {self.last_update_time} after page cursor {self.resume_after}",
+            extra={"data": {"after": self.resume_after, "fetch_complete": self.fetch_complete}},
+        )
+
+    def changed(self, records: list[R]) -> list[R]:
+        """Track the watermark of a fetched page and return its new or changed records."""
+        watermarks = {watermark for record in records if (watermark := self.watermark(record))}
+        self.watermarks |= watermarks
+        self.high_water_mark = max([self.high_water_mark, *watermarks])
+        # Records whose JDA columns did not change are skipped, so JDA does not reprocess them
+        return [
+            record
+            for record in records
+            if self.fingerprints.classify(self.key(record), self.fingerprint(record)) != "unchanged"
+        ]
+
+    def accepted(self, records: list[R], rejected_keys: set[str]) -> list[R]:
+        """`records` less those JDA rejected on write.
+
+        The fingerprints of rejected records are dropped and the checkpoint is held below their watermark, so the next
+        run fetches and writes them again.
+        """
+        if not rejected_keys:
+            return records
+        self.fingerprints.discard(rejected_keys)
+        rejected = [record for record in records if self.key(record) in rejected_keys]
+        self.retry_from = min(
+            [watermark for watermark in (self.retry_from, *map(self.watermark, rejected)) if watermark is not None],
+            default=None,
+        )
+        return [record for record in records if self.key(record) not in rejected_keys]
+
+    def checkpoint_committed(self, records: list[R]) -> None:
+        """Journal the fingerprints of committed records, so a resumed run does not write them again."""
+        self.journal.append({"last_update_time": self.last_update_time, "fingerprints": self.pending_of(records)})
+
+    def page_committed(self, after: str | None, records: list[R] = ()) -> None:
+        """Journal a committed page and its records; a resumed run continues at `after`, None being the end."""
+        self.journal.append(
+            {
+                "last_update_time": self.last_update_time,
+                "after": after,
+                "high_water_mark": self.high_water_mark,
+                "retry_from": self.retry_from,
+                "fingerprints": self.pending_of(records),
+            }
+        )
+
+    def checkpoint_watermark(self) -> str:
+        """The watermark the run commits: its high water mark, or the newest one below a record JDA rejected.
+
+        After resuming, the watermarks of the pages committed before the interruption are unknown, so the checkpoint
+        may then stay further back than needed; records fetched again unchanged are skipped all the same.
+        """
+        if self.retry_from is None:
+            return self.high_water_mark
+        logger.info(f"Holding the checkpoint below {self.retry_from}, the watermark of a record JDA rejected")
+        below = (watermark for watermark in self.watermarks if watermark < self.retry_from)
+        return max([self.last_update_time, *below])
+
+    def pending_of(self, records: list[R]) -> dict[str, str]:
+        return {self.key(record): self.fingerprints.pending[self.key(record)] for record in records}
+
+    def commit(self, updates: CheckpointUpdates) -> None:
+        """Stage the watermark and fingerprints of the run in `updates`; call only after every page is committed.
+
+        A failed run stages nothing, so the next one retries from the old watermark. The journal is only cleared once
+        `updates` are written.
+        """
+        self.fingerprints.save(updates)
+        watermark = self.checkpoint_watermark()
+        if watermark != self.last_update_time:
+            self.checkpoint.new_checkpoint_on_success = watermark
+            self.checkpoint.update_checkpoint(updates)
+            logger.info(f"Checkpoint advances to {watermark}")
+        updates.after_commit(self.journal.clear)
+        counters = self.fingerprints.counters
+        logger.info(
+            f"{self.label} new: {counters['new']}, changed: {counters['changed']}, "
+            f"unchanged: {counters['unchanged']}",
+            extra={"data": dict(counters)},
+        )
+
+
+@dataclass(frozen=True)
+class Column:
+    """JDA column of a feed, bound from the value at `path` of each item (None binds null)."""
+
+    name: str
+    path: str | None
+    db_type: oracledb.DbType
+    # Coercion of the supergraph value, e.g. int or parse_datetime; None values are never passed to it, and an item
+    # whose value raises TypeError or ValueError is set aside as invalid
+    parse: Callable[[Any], Any] | None = None
+
+
+@dataclass(frozen=True)
+class FeedSpec:
+    """Declaration of a supergraph to JDA feed.
+
+    The supergraph field `root` is queried with the usual filters and cursor paging (`last_update_time`, `first`,
+    `after`, `items` and `page_info`), selecting the paths of `columns`, `key` and `watermark`. Items are written to
+    `table` with array DML; `constants` are SQL expressions for the remaining columns, such as the JDA flags.
+    """
+
+    name: str
+    operation: str
+    root: str
+    table: str
+    key: str
+    columns: tuple[Column, ...]
+    watermark: str = "last_update_time"
+    constants: tuple[tuple[str, str], ...] = (("jda_processed_flag", "'U'"), ("jda_processed_time", "SYSTIMESTAMP"))
+
+
+# A decoded item: its key, its watermark and its bind row
+FeedRecord = tuple[str, str | None, tuple]
+
+
+@dataclass
+class FeedPage(Generic[R]):
+    """A decoded response: the valid records, the items set aside, the values cut to fit and the next cursor."""
+
+    records: list[R]
+    rejected: list[RejectedItem]
+    truncated: int
+    cursor: str | None
+
+
+@dataclass(frozen=True)
+class CompiledFeed:
+    spec: FeedSpec
+    query: PersistedQuery
+    insert_statement: str
+    input_sizes: tuple[oracledb.DbType, ...]
+
+    def decode_page(self, content: bytes, widths: Mapping[str, int] | None = None) -> FeedPage[FeedRecord]:
+        """Decode a response into records, cutting strings to `widths` (column -> characters) of the feed's table."""
+        page = orjson.loads(content)["data"][self.spec.root]
+        cursor = page["page_info"]["end_cursor"] if page["page_info"]["has_next_page"] else None
+        batch = ColumnBatch(page["items"])
+        records = self.decode(batch, widths or {})
+        return FeedPage(records, batch.rejected(self.spec.key.split(".")[0]), batch.truncated, cursor)
+
+    def decode(self, batch: ColumnBatch, widths: Mapping[str, int]) -> list[FeedRecord]:
+        """Records of the valid items of `batch`, normalized column by column; the other items are marked rejected."""
+        spec = self.spec
+        keys = batch.column(spec.key)
+        batch.reject_missing(spec.key, keys)
+        watermarks = batch.column(spec.watermark)
+        columns = []
+        for column in spec.columns:
+            if column.path is None:
+                columns.append(repeat(None, len(batch.items)))
+                continue
+            values = batch.column(column.path)
+            if column.parse is int:
+                values = batch.ints(column.path, values)
+            elif column.parse is not None:
+                values = batch.coerce(column.path, values, column.parse)
+            elif column.db_type is oracledb.DB_TYPE_VARCHAR:
+                values = batch.strings(column.path, values)
+            if column.name in widths:
+                # Cut before fingerprinting, so fingerprints match what JDA holds
+                values = batch.truncate(values, widths[column.name])
+            columns.append(values)
+        return [
+            (str(key), watermark, row)
+            for (key, watermark), row in zip(
+                batch.valid_rows([keys, watermarks]), batch.valid_rows(columns), strict=True
+            )
+        ]
+
+
+@cache
+def compile_feed(spec: FeedSpec) -> CompiledFeed:
+    """Build the query and insert statement of a feed, once per process."""
+    return CompiledFeed(
+        spec=spec,
+        query=PersistedQuery(feed_query(spec)),
+        insert_statement=feed_insert_statement(spec),
+        input_sizes=tuple(column.db_type for column in spec.columns),
+    )
+
+
+def feed_selection(spec: FeedSpec) -> list[str]:
+    """Item paths requested from the supergraph: those bound to columns, the key and the watermark."""
+    return list(dict.fromkeys([*(column.path for column in spec.columns if column.path), spec.key, spec.watermark]))
+
+
+def feed_query(spec: FeedSpec) -> str:
+    return f"""
+query {spec.operation}($last_update_time: String!, $first: Int!, $after: String) {{
+  {spec.root}(filters: {{last_update_time: $last_update_time}}, first: $first, after: $after) {{
+    items {selection_set(feed_selection(spec), indent="    ")}
+    page_info {{
+      end_cursor
+      has_next_page
+    }}
+  }}
+}}
+"""
+
+
+def feed_insert_statement(spec: FeedSpec) -> str:
+    """Plain INSERT, so oracledb sends each batch as a single array bind."""
+    names = [column.name for column in spec.columns] + [name for name, _ in spec.constants]
+    values = [f":{column.name}" for column in spec.columns] + [expression for _, expression in spec.constants]
+    return f"""
+    INSERT INTO {spec.table} ({", ".join(names)})
+    VALUES ({", ".join(values)})
+"""
+
+
+def record_fingerprint(record: FeedRecord) -> str:
+    """Stable hash of the values written to JDA for a record."""
+    return hashlib.blake2b(orjson.dumps(record[2]), digest_size=16).hexdigest()
+
+
+class FeedSteps(Generic[R]):
+    """The steps of loading a feed that do no I/O, mixed into the sync and asyncio jobs loading it."""
+
+    feed: FeedSpec
+
+    def sync_state(self) -> FeedSyncState[R]:
+        """Watermark, fingerprints and progress of this run."""
+        raise NotImplementedError
+
+    def decode_page(self, content: bytes) -> FeedPage[R]:
+        """Decode a response of the feed's query."""
+        raise NotImplementedError
+
+    def prepare(self, records: list[R]) -> list[R]:
+        """Bring fetched records in line with what JDA will hold, before they are fingerprinted."""
+        return records
+
+    @cached_property
+    def compiled(self) -> CompiledFeed:
+        return compile_feed(self.feed)
+
+    @cached_property
+    def rejects(self) -> RejectSink:
+        """Where fetched items that fail validation are set aside."""
+        return RejectSink(self.feed.name, self.global_settings.checkpoint_path)
+
+    def decoded(self, content: bytes) -> FeedPage[R]:
+        """Decode a response, counting its records and setting invalid items aside in `rejects`."""
+        self.metrics.count("bytes_received", len(content))
+        with self.metrics.span("decode"):
+            page = self.decode_page(content)
+        self.metrics.count("rows_fetched", len(page.records) + len(page.rejected))
+        self.metrics.count("values_truncated", page.truncated)
+        if page.rejected:
+            self.metrics.count("rows_invalid", len(page.rejected))
+            self.rejects.write(page.rejected)
+        logger.info(
+            f"Fetched page of {len(page.records)} {self.feed.root} ({self.metrics.counters['rows_fetched']} in total)"
+        )
+        return page
+
+    def changed(self, records: list[R], state: FeedSyncState[R]) -> list[R]:
+        """The new or changed records of a fetched page."""
+        with self.metrics.span("transform"):
+            return state.changed(self.prepare(records))
+
+
+class FeedLoader(FeedSteps[R], Job):
+    """Job loading a supergraph feed into JDA one page at a time, with change detection and resumable checkpoints.
+
+    Subclasses set `feed` and provide the sync state, the decoding and the write of a page.
+    """
+
+    def task(self) -> None:
+        """Run update task."""
+        state = self.sync_state()
+        logger.info(f"Loading {self.feed.name} updated since {state.last_update_time}")
+
+        pages = iter(()) if state.fetch_complete else self.pages(state)
+        # The next page is fetched in the background while the current one is written to JDA, held off while JDA is
+        # falling behind. Every page is committed and journaled on its own, so an interrupted run costs at most one
+        # page of rework.
+        for records, cursor in prefetch(pages, throttle=self.batch_size.backpressure):
+            changed = self.changed(records, state)
+            state.page_committed(cursor, self.write(changed, state) if changed else [])
+
+        state.commit(self.checkpoint_updates)
+
+    def write(self, records: list[R], state: FeedSyncState[R]) -> list[R]:
+        """Write the changed records of a page to JDA and commit them, returning those to journal with the page."""
+        raise NotImplementedError
+
+    @cached_property
+    def widths(self) -> dict[str, int]:
+        """Maximum characters of the string columns of the feed's table."""
+        return column_widths(self.jda_connection, self.feed.table)
+
+    def pages(self, state: FeedSyncState[R]) -> Iterator[tuple[list[R], str | None]]:
+        """Pages of records to load, each with the cursor of the page after it."""
+        return self.fetch_pages(state.last_update_time, after=state.resume_after)
+
+    def fetch_pages(
+        self, last_update_time: str, after: str | None = None, page_size: int | None = None
+    ) -> Iterator[tuple[list[R], str | None]]:
+        """Yield pages of records updated after `last_update_time`, each with the cursor of the page after it.
+
+        Follows the supergraph cursor from `after` on; the last page comes with a None cursor. Invalid items are set
+        aside in `rejects` instead of failing the run.
+        """
+        page_size = page_size or get_graphql_settings().supergraph_page_size
+        cursor = after
+        while True:
+            with self.metrics.span("fetch"):
+                response = self.compiled.query.post(
+                    self.supergraph_client,
+                    {"last_update_time": last_update_time, "first": page_size, "after": cursor},
+                    extensions={"idempotent": True},
+                )
+                response.raise_for_status()
+            page = self.decoded(response.content)
+            cursor = page.cursor
+            yield page.records, cursor
+            if cursor is None:
+                return
+
+
+class FeedJob(FeedLoader[FeedRecord]):
+    """Job loading a declared feed: paged supergraph fetch, change detection, array DML and resumable checkpoints.
+
+    Subclasses only set `feed`.
+    """
+
+    def sync_state(self) -> FeedSyncState[FeedRecord]:
+        return FeedSyncState(
+            self.feed.name,
+            self.global_settings.checkpoint_path,
+            key=lambda record: record[0],
+            watermark=lambda record: record[1],
+            fingerprint=record_fingerprint,
+            resume=self.global_settings.resume_interrupted_runs,
+        )
+
+    def decode_page(self, content: bytes) -> FeedPage[FeedRecord]:
+        return self.compiled.decode_page(content, self.widths)
+
+    def write(self, records: list[FeedRecord], state: FeedSyncState[FeedRecord]) -> list[FeedRecord]:
+        result = self.persist(records)
+        return state.accepted(records, {records[row.offset][0] for row in result.rejected})
+
+    def persist(self, records: list[FeedRecord]) -> BulkInsertResult:
+        """Write records to the feed's JDA table and commit them."""
+        try:
+            with self.metrics.span("persist"):
+                result = bulk_insert(
+                    self.jda_connection,
+                    self.compiled.insert_statement,
+                    [record[2] for record in records],
+                    input_sizes=self.compiled.input_sizes,
+                    batch_size=self.batch_size,
+                )
+                self.jda_connection.commit()
+        except Exception:
+            logger.error(f"Error while inserting {self.feed.name} records")
+            self.jda_connection.rollback()
+            raise
+        self.metrics.count("rows_inserted", result.inserted)
+        self.metrics.count("rows_rejected", len(result.rejected))
+        logger.info(f"{result.inserted} {self.feed.name} records committed, {len(result.rejected)} rejected")
+        return result
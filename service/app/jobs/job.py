@@ -1,30 +1,100 @@
 import asyncio
 import logging
+import os
+import queue
+import threading
 from abc import ABCMeta, abstractmethod
+from collections import Counter
+from collections.abc import AsyncIterable, Awaitable, Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import AsyncExitStack, ExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from functools import cached_property
 from pathlib import Path
+from typing import Any, TypeVar
 
-import httpx
-from pydantic import BaseModel
+import oracledb
+import orjson
 
-from app.settings import GraphQLSettings, JDASettings, Settings
-from app.utils_oracle import create_oracle_connection
+from app.jobs.checkpoint_store import CheckpointUpdates, get_checkpoint_store
+from app.jobs.metrics import JobMetrics, export_metrics
+from app.jobs.normalize import RejectedItem
+from app.settings import get_settings
+from app.utils_graphql import create_async_supergraph_client, create_supergraph_client, supergraph_metrics
+from app.utils_oracle import (
+    AdaptiveBatchSize,
+    BulkInsertResult,
+    adaptive_batch_size,
+    async_oracle_connection,
+    close_async_oracle_pool,
+    oracle_connection,
+    oracle_pool_statistics,
+)
 
 logger = logging.getLogger(__name__)
 
-jda_settings = JDASettings()
-graphql_settings = GraphQLSettings()
+T = TypeVar("T")
 
+class BaseJob(metaclass=ABCMeta):
+    """What sync and asyncio jobs share: scheduling attributes, settings, metrics and the reporting of a run."""
 
-class Job(metaclass=ABCMeta):
+    # Jobs that must succeed before this one runs in a `run-all`
+    depends_on: tuple[type["BaseJob"], ...] = ()
+    # Whether `run-all` includes this job when no jobs are selected explicitly
+    scheduled: bool = True
+    # Jobs with the same lock name never run at the same time, e.g. because they share checkpoints; None means the
+    # class name
+    lock_name: str | None = None
+    # Whether the job opens a JDA session; jobs that only talk to the supergraph can then run while JDA is down
+    uses_jda: bool = True
+
+    def __init__(self):
+        super().__init__()
+        self.global_settings = get_settings()
+        self.metrics = JobMetrics()
+
+    @cached_property
+    def batch_size(self) -> AdaptiveBatchSize:
+        """Array DML batch size of this run's JDA writes, adapting to how fast JDA takes them."""
+        return adaptive_batch_size()
+
+    @cached_property
+    def checkpoint_updates(self) -> CheckpointUpdates:
+        """Checkpoint store updates of this run, written at once when the run is reported."""
+        return CheckpointUpdates(get_checkpoint_store(self.global_settings.checkpoint_path))
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        """Log, time and report the run of the job's task in the block."""
+        job_name = to_screaming_snake_case(self.__class__.__name__)
+        logger.info(f"JOB_{job_name}: ALERT_001_{job_name}_START")
+        status = "failed"
+        retries = supergraph_metrics.retries
+        try:
+            with self.metrics.span("task"):
+                yield
+            status = "succeeded"
+            logger.info(f"JOB_{job_name}: ALERT_001_{job_name}_COMPLETE")
+        except Exception as error:
+            logger.error({"msg": f"JOB_{job_name} ERROR", "error": str(error)})
+            raise error
+        finally:
+            report_metrics(self, status, retries)
+
+    def log_statistics(self) -> None:
+        logger.info("JDA connection pool statistics", extra={"data": oracle_pool_statistics()})
+        logger.info("Supergraph request statistics", extra={"data": supergraph_metrics.as_dict()})
+
+
+class Job(BaseJob):
     """Main class for all jobs."""
 
     def __init__(self):
         super().__init__()
-        self.global_settings = Settings()
-        self.jda_connection = create_oracle_connection()
-        self.supergraph_client = httpx.Client(
-            base_url=graphql_settings.supergraph_url, headers=graphql_settings.authorization_header
-        )
+        self.exit_stack = ExitStack()
+        self.jda_connection = self.exit_stack.enter_context(oracle_connection()) if self.uses_jda else None
+        self.supergraph_client = create_supergraph_client()
 
     @abstractmethod
     def task(self) -> None:
@@ -33,47 +103,400 @@ class Job(metaclass=ABCMeta):
 
     def run(self) -> None:
         """Run the job."""
-        job_name = to_screaming_snake_case(self.__class__.__name__)
-        logger.info(f"JOB_{job_name}: ALERT_001_{job_name}_START")
-        try:
+        with self.running():
             self.task()
-            logger.info(f"JOB_{job_name}: ALERT_001_{job_name}_COMPLETE")
-        except Exception as error:
-            logger.error({"msg": f"JOB_{job_name} ERROR", "error": str(error)})
-            raise error
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.ros_connection.close()
+        self.exit_stack.close()
         self.supergraph_client.close()
+        self.log_statistics()
+
+
+class AsyncJob(BaseJob):
+    """Main class for asyncio jobs, using an async supergraph client and an async JDA session."""
+
+    def __init__(self):
+        super().__init__()
+        self.exit_stack = AsyncExitStack()
+
+    @abstractmethod
+    async def task(self) -> None:
+        """Implement tasks for the job."""
+        raise NotImplementedError("Task method must be implemented.")
+
+    async def run(self) -> None:
+        """Run the job."""
+        with self.running():
+            await self.task()
+
+    async def __aenter__(self):
+        self.jda_connection = (
+            await self.exit_stack.enter_async_context(async_oracle_connection()) if self.uses_jda else None
+        )
+        self.supergraph_client = await self.exit_stack.enter_async_context(create_async_supergraph_client())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.exit_stack.aclose()
+        self.log_statistics()
+
+
+def report_metrics(job: BaseJob, status: str, retries_before: int) -> None:
+    """Log the metrics of a finished run as structured data and export them when configured."""
+    # Supergraph retries are counted process wide; concurrent jobs in a `run-all` see each other's retries
+    job.metrics.count("supergraph_retries", supergraph_metrics.retries - retries_before)
+    if "batch_size" in vars(job):
+        # Only runs that wrote to JDA created a batch size controller
+        controller = job.batch_size
+        for decision, count in controller.decisions.items():
+            job.metrics.count(f"batch_size_{decision}", count)
+        job.metrics.count("final_batch_size", controller.size)
+        job.metrics.count("backpressure_ms", round(controller.backpressure_seconds * 1000))
+    job_name = job.__class__.__name__
+    logger.info(
+        f"JOB_{to_screaming_snake_case(job_name)}: metrics",
+        extra={"data": {"job": job_name, "status": status, **job.metrics.as_dict()}},
+    )
+    export_metrics(
+        job.metrics,
+        job_name,
+        status,
+        path=job.global_settings.metrics_path,
+        pushgateway_url=job.global_settings.metrics_pushgateway_url,
+    )
+    # Read back by the API's load status endpoints; written together with the checkpoints the run staged
+    last_run = {"status": status, "finished_at": datetime.now(UTC).isoformat(), **job.metrics.as_dict()}
+    job.checkpoint_updates.update({f"last_run/{job_name}": orjson.dumps(last_run)})
+    try:
+        job.checkpoint_updates.commit()
+    except OSError as error:
+        if status == "succeeded":
+            # The watermark and fingerprints of the run would be lost with it
+            raise
+        logger.warning(f"Could not record the last run of {job_name}: {error}")
+
+
+def run_job(job: type[Job] | type[AsyncJob]) -> None:
+    """Run a sync or asyncio job to completion."""
+    if issubclass(job, AsyncJob):
+        asyncio.run(run_async_job(job, owns_loop=True))
+    else:
+        with job() as job_instance:
+            job_instance.run()
+
+
+async def run_async_job(job: type[AsyncJob], owns_loop: bool = False) -> None:
+    """Run an asyncio job to completion on the running event loop.
+
+    When the loop ends with the job (`owns_loop`), the asyncio JDA pool bound to it is closed as well, as nothing can
+    use it once the loop is gone.
+    """
+    try:
+        async with job() as job_instance:
+            await job_instance.run()
+    finally:
+        if owns_loop:
+            await close_async_oracle_pool()
+
+
+async def run_stages(
+    source: AsyncIterable[Any], *stages: Callable[[Any], Awaitable[Any]], queue_size: int = 2
+) -> None:
+    """Run `source` and each stage concurrently, connected by bounded queues.
+
+    Every item of `source` passes through the stages in order, each stage receiving the result of the previous one.
+    A full queue makes the upstream stage wait, so a slow stage never lets work pile up in memory; if any stage
+    fails, the others are cancelled and the error is raised.
+    """
+    done = object()
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+
+    async def produce() -> None:
+        async for item in source:
+            await queues[0].put(item)
+        await queues[0].put(done)
+
+    async def consume(stage: Callable[[Any], Awaitable[Any]], inbox: asyncio.Queue, outbox: asyncio.Queue | None) -> None:
+        while (item := await inbox.get()) is not done:
+            result = await stage(item)
+            if outbox is not None:
+                await outbox.put(result)
+        if outbox is not None:
+            await outbox.put(done)
+
+    try:
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(produce())
+            for index, stage in enumerate(stages):
+                outbox = queues[index + 1] if index + 1 < len(queues) else None
+                tasks.create_task(consume(stage, queues[index], outbox))
+    except ExceptionGroup as errors:
+        raise errors.exceptions[0] from None
 
 
 class Checkpoint:
+    """Named checkpoint value, kept in the checkpoint store of `checkpoint_path`."""
+
     def __init__(self, name: str, checkpoint_path: str):
         self.name: str = name
         self.checkpoint_path: str = checkpoint_path
         self.new_checkpoint_on_success: str | None = None
+        self.store = get_checkpoint_store(checkpoint_path)
 
-    def save_checkpoint(self, checkpoint_value: str) -> None:
-        """Save checkpoint value."""
-        checkpoint_path = Path(self.checkpoint_path) / self.name
-        checkpoint_path.write_text(str(checkpoint_value))
+    def save_checkpoint(self, checkpoint_value: str, updates: CheckpointUpdates | None = None) -> None:
+        """Save checkpoint value, or stage it in `updates`."""
+        (self.store if updates is None else updates).update({self.name: str(checkpoint_value).encode()})
 
-    def update_checkpoint(self) -> None:
+    def update_checkpoint(self, updates: CheckpointUpdates | None = None) -> None:
         """Update checkpoint value."""
         if self.new_checkpoint_on_success:
-            self.save_checkpoint(self.new_checkpoint_on_success)
+            self.save_checkpoint(self.new_checkpoint_on_success, updates)
 
     def read_checkpoint(self) -> str | None:
         """Read checkpoint value."""
-        checkpoint_path = Path(self.checkpoint_path) / self.name
-        if checkpoint_path.exists():
-            return checkpoint_path.read_text()
+        value = self.store.get(self.name)
+        return value.decode() if value is not None else None
+
+
+class FingerprintIndex:
+    """Content hashes of the records loaded by previous runs, kept in the checkpoint store."""
+
+    def __init__(self, name: str, checkpoint_path: str):
+        self.store = get_checkpoint_store(checkpoint_path)
+        self.prefix = f"{name}/"
+        self.fingerprints: dict[str, str] = {
+            key.removeprefix(self.prefix): value.decode() for key, value in self.store.items(self.prefix)
+        }
+        self.pending: dict[str, str] = {}
+        self.counters: Counter[str] = Counter()
+
+    def classify(self, key: str, fingerprint: str) -> str:
+        """Return "new", "changed" or "unchanged" for a record and remember its fingerprint."""
+        previous = self.pending.get(key, self.fingerprints.get(key))
+        if previous is None:
+            status = "new"
+        elif previous == fingerprint:
+            status = "unchanged"
         else:
-            return None
-        
+            status = "changed"
+        self.counters[status] += 1
+        if status != "unchanged":
+            self.pending[key] = fingerprint
+        return status
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """Forget the fingerprints this run noted for `keys`, e.g. because their records were not written."""
+        for key in keys:
+            self.pending.pop(key, None)
+
+    def save(self, updates: CheckpointUpdates | None = None) -> None:
+        """Persist the fingerprints of this run, or stage them in `updates`.
+
+        Call only after the records are committed.
+        """
+        if not self.pending:
+            return
+        (self.store if updates is None else updates).update(
+            {self.prefix + key: fingerprint.encode() for key, fingerprint in self.pending.items()}
+        )
+        self.fingerprints.update(self.pending)
+        self.pending = {}
+
+
+class RunJournal:
+    """Append-only log of the committed progress of a run, so an interrupted run can resume where it stopped.
+
+    Appending costs one small write per entry however large the checkpoint store has grown. The journal is cleared
+    once the run is recorded in the checkpoint store.
+    """
+
+    def __init__(self, name: str, checkpoint_path: str):
+        self.path = Path(checkpoint_path) / f"{name}.journal"
+
+    def entries(self) -> list[dict]:
+        """Entries of the interrupted run, if any; a torn last entry from a crash mid-write is dropped."""
+        if not self.path.is_file():
+            return []
+        entries = []
+        for line in self.path.read_bytes().splitlines():
+            try:
+                entries.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                break
+        return entries
+
+    def append(self, entry: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as file:
+            file.write(orjson.dumps(entry) + b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class RejectSink:
+    """Append-only file of the fetched items a job left out because they failed validation, with the reasons.
+
+    Rejected items are not retried: once fixed upstream their new update time brings them into a later run.
+    """
+
+    def __init__(self, name: str, checkpoint_path: str):
+        self.path = Path(checkpoint_path) / "rejects" / f"{name}.jsonl"
+
+    def write(self, rejected: list[RejectedItem]) -> None:
+        if not rejected:
+            return
+        rejected_at = datetime.now(UTC).isoformat()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as file:
+            for item in rejected:
+                file.write(
+                    orjson.dumps({"rejected_at": rejected_at, "key": item.key, "reasons": item.reasons, "item": item.item})
+                    + b"\n"
+                )
+        logger.warning(
+            f"Rejected {len(rejected)} invalid items, see {self.path}",
+            extra={"data": {"rejected": [{"key": item.key, "reasons": item.reasons} for item in rejected]}},
+        )
+
+
+@dataclass
+class ShardResult:
+    shard: int
+    rows: int
+    result: BulkInsertResult | None = None
+    error: Exception | None = None
+
+
+def shard_by(items: Iterable[T], key: Callable[[T], int], shards: int) -> list[list[T]]:
+    """Partition `items` on `key` modulo `shards`, so equal keys always land in the same shard."""
+    partitions: list[list[T]] = [[] for _ in range(shards)]
+    for item in items:
+        partitions[key(item) % shards].append(item)
+    return partitions
+
+
+def persist_shards(
+    shards: Sequence[list[T]],
+    persist: Callable[[oracledb.Connection, list[T]], BulkInsertResult],
+    on_committed: Callable[[list[T], BulkInsertResult], None] | None = None,
+) -> list[ShardResult]:
+    """Persist each shard in its own thread over its own pooled JDA session, committing every shard independently.
+
+    A failing shard is rolled back and reported without affecting the others. `on_committed` is called in the
+    calling thread with the items and result of each shard as soon as it is committed, e.g. to checkpoint it, so a
+    retry only redoes failed shards.
+    """
+
+    def persist_shard(items: list[T]) -> BulkInsertResult:
+        with oracle_connection() as connection:
+            try:
+                result = persist(connection, items)
+                connection.commit()
+                return result
+            except Exception:
+                connection.rollback()
+                raise
+
+    results = []
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="persist-shard") as executor:
+        futures = {executor.submit(persist_shard, items): number for number, items in enumerate(shards) if items}
+        for future in as_completed(futures):
+            number = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:  # noqa: BLE001
+                logger.error(f"Shard {number} of {len(shards)} failed: {error}")
+                results.append(ShardResult(number, len(shards[number]), error=error))
+                continue
+            results.append(ShardResult(number, len(shards[number]), result=result))
+            if on_committed is not None:
+                on_committed(shards[number], result)
+    return sorted(results, key=lambda shard_result: shard_result.shard)
+
+
+async def async_persist_shards(
+    shards: Sequence[list[T]],
+    persist: Callable[[oracledb.AsyncConnection, list[T]], Awaitable[BulkInsertResult]],
+    on_committed: Callable[[list[T], BulkInsertResult], None] | None = None,
+) -> list[ShardResult]:
+    """Asyncio counterpart of persist_shards: every shard is persisted concurrently over its own pooled JDA session.
+
+    `on_committed` is called on the event loop as soon as a shard is committed.
+    """
+
+    async def persist_shard(number: int, items: list[T]) -> ShardResult:
+        try:
+            async with async_oracle_connection() as connection:
+                try:
+                    result = await persist(connection, items)
+                    await connection.commit()
+                except Exception:
+                    await connection.rollback()
+                    raise
+        except Exception as error:  # noqa: BLE001
+            logger.error(f"Shard {number} of {len(shards)} failed: {error}")
+            return ShardResult(number, len(items), error=error)
+        if on_committed is not None:
+            on_committed(items, result)
+        return ShardResult(number, len(items), result=result)
+
+    return list(await asyncio.gather(*(persist_shard(number, items) for number, items in enumerate(shards) if items)))
+
+
+def prefetch(iterable: Iterable[T], depth: int = 1, throttle: Callable[[], float] | None = None) -> Iterator[T]:
+    """Iterate over `iterable` in a background thread, keeping up to `depth` items ready.
+
+    Lets a slow consumer (e.g. the JDA insert) overlap with a slow producer (e.g. the supergraph fetch).
+    `throttle` is asked before every item how many seconds the producer should wait first, e.g. while JDA is falling
+    behind. Exceptions raised by the producer are re-raised in the consuming thread.
+    """
+    done = object()
+    errors: list[BaseException] = []
+    items: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            iterator = iter(iterable)
+            while True:
+                if throttle is not None and (delay := throttle()) > 0 and stop.wait(delay):
+                    return
+                item = next(iterator, done)
+                if item is done:
+                    break
+                if not put(item):
+                    return
+        except BaseException as error:  # noqa: BLE001
+            errors.append(error)
+        put(done)
+
+    producer = threading.Thread(target=produce, name="prefetch", daemon=True)
+    producer.start()
+    try:
+        while (item := items.get()) is not done:
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        producer.join()
+
+
 def to_screaming_snake_case(text: str) -> str:
     """Convert PascalCase to SCREAMING_SNAKE_CASE."""
     return "".join(["_" + c.lower() if c.isupper() else c for c in text]).lstrip("_").upper()
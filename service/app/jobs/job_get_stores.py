@@ -1,14 +1,53 @@
-from fastapi import Depends, HTTPException
-from dataclasses import dataclass
-from datetime import datetime
+import asyncio
+from collections.abc import AsyncIterator, Iterator, Mapping
+from dataclasses import dataclass, fields
+from datetime import UTC, datetime
+from functools import cached_property, partial
+from itertools import repeat
+from operator import attrgetter
+import hashlib
 import logging
-from app.jobs.job import Job
+from app.jobs.feed import (
+    Column,
+    FeedLoader,
+    FeedPage,
+    FeedSpec,
+    FeedSteps,
+    FeedSyncState,
+    compile_feed,
+    feed_selection,
+)
+from app.jobs.job import (
+    AsyncJob,
+    ShardResult,
+    async_persist_shards,
+    persist_shards,
+    prefetch,
+    run_stages,
+    shard_by,
+)
+from app.jobs.metrics import JobMetrics
+from app.jobs.normalize import ColumnBatch, RejectedItem, truncate_columns
+from app.jobs.spool import SpoolReader, SpoolWriter, spool_path
+from app.settings import get_graphql_settings, get_jda_settings
+from app.utils_oracle import (
+    AdaptiveBatchSize,
+    BulkInsertResult,
+    async_bulk_insert,
+    async_bulk_merge,
+    async_column_widths,
+    async_table_exists,
+    bulk_insert,
+    bulk_merge,
+    table_exists,
+)
+import oracledb
 import orjson
 
 # Define logger
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class Store:
     id: int
     name: str
@@ -18,248 +57,590 @@ class Store:
     telephone: str
     city_name: str
     country_code: str
-    district_id: int
+    district_id: int | None
     district_name: str
-    datetime_opened: datetime
-    datetime_closed: datetime
+    datetime_opened: datetime | None
+    datetime_closed: datetime | None
     store_organizational_unit: str
     store_organizational_unit_name: str
     store_type: str
-    store_format: int
+    store_format: int | None
     format_name: str
     gln: str
-    chain_id: int
+    chain_id: int | None
     chain_name: str
-    area_id: int
+    area_id: int | None
     area_name: str
-    region_id: int
-    region_name: str
-    size_total_sqft: int
-    size_selling_sqft: int
+    size_total_sqft: int | None
+    size_selling_sqft: int | None
     timezone_name: str
+    postal_code: str
+    contact_name: str
+    linear_distance: int | None
+    region_id: int | None = None
+    region_name: str | None = None
+    last_update_time: str | None = None
 
-class LoadStores(Job):
+
+# Store field -> path of its value in a GetStores item
+STORE_FIELD_PATHS = {
+    "id": "id",
+    "name": "name",
+    "name_secondary": "name_secondary",
+    "name_short": "name_short",
+    "email": "contact.email",
+    "telephone": "contact.telephone",
+    "city_name": "address.city_name",
+    "country_code": "address.country_code",
+    "district_id": "address.district_id",
+    "district_name": "address.district_name",
+    "datetime_opened": "datetime_opened",
+    "datetime_closed": "datetime_closed",
+    "store_organizational_unit": "organization.store_organizational_unit",
+    "store_organizational_unit_name": "organization.store_organizational_unit_name",
+    "store_type": "organization.store_type",
+    "store_format": "organization.store_format",
+    "format_name": "organization.format_name",
+    "gln": "organization.gln",
+    "chain_id": "organization.chain_id",
+    "chain_name": "organization.chain_name",
+    "area_id": "organization.area_id",
+    "area_name": "organization.area_name",
+    "size_total_sqft": "size_total_sqft",
+    "size_selling_sqft": "size_selling_sqft",
+    "timezone_name": "timezone_name",
+    "postal_code": "address.postal_code",
+    "contact_name": "address.name",
+    "linear_distance": "linear_distance",
+    "last_update_time": "last_update_time",
+}
+
+
+def parse_datetime(value: str | None) -> datetime | None:
+    """Parse a supergraph timestamp such as "2021-10-01 00:00:00"."""
+    return datetime.fromisoformat(value) if value else None
+
+
+# Coercion of the store fields that are not strings
+STORE_FIELD_PARSERS = {
+    "id": int,
+    "district_id": int,
+    "store_format": int,
+    "chain_id": int,
+    "area_id": int,
+    "size_total_sqft": int,
+    "size_selling_sqft": int,
+    "linear_distance": int,
+    "datetime_opened": parse_datetime,
+    "datetime_closed": parse_datetime,
+}
+
+STORE_TABLE = "intowner.csg_etos_store_in"
+
+
+def store_column(name: str, field: str | None, db_type: oracledb.DbType) -> Column:
+    """JDA column bound from a Store field; None binds null."""
+    return Column(name, STORE_FIELD_PATHS[field] if field else None, db_type, STORE_FIELD_PARSERS.get(field))
+
+
+# The JDA store feed, column by column in bind order. The query, bind rows, input sizes and the insert, staging and
+# MERGE statements are all derived from it, so adding a column is a single line here.
+STORE_FEED = FeedSpec(
+    name="load_stores",
+    operation="GetStores",
+    root="stores",
+    table=STORE_TABLE,
+    key="id",
+    columns=(
+        store_column("store", "id", oracledb.DB_TYPE_NUMBER),
+        store_column("store_name", "name", oracledb.DB_TYPE_VARCHAR),
+        store_column("store_name3", "name_secondary", oracledb.DB_TYPE_VARCHAR),
+        store_column("store_name10", "name_short", oracledb.DB_TYPE_VARCHAR),
+        store_column("store_open_date", "datetime_opened", oracledb.DB_TYPE_DATE),
+        store_column("store_close_date", "datetime_closed", oracledb.DB_TYPE_DATE),
+        store_column("phone_number", "telephone", oracledb.DB_TYPE_VARCHAR),
+        store_column("fax_number", "telephone", oracledb.DB_TYPE_VARCHAR),
+        store_column("email", "email", oracledb.DB_TYPE_VARCHAR),
+        store_column("total_square_ft", "size_total_sqft", oracledb.DB_TYPE_NUMBER),
+        store_column("selling_square_ft", "size_selling_sqft", oracledb.DB_TYPE_NUMBER),
+        store_column("linear_distance", "linear_distance", oracledb.DB_TYPE_NUMBER),
+        store_column("store_format", "store_format", oracledb.DB_TYPE_NUMBER),
+        store_column("store_format_name", "format_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("org_unit_id", "store_organizational_unit", oracledb.DB_TYPE_VARCHAR),
+        store_column("org_unit_name", "store_organizational_unit_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("store_type", "store_type", oracledb.DB_TYPE_VARCHAR),
+        store_column("timezone_name", "timezone_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("gln", "gln", oracledb.DB_TYPE_VARCHAR),
+        store_column("chain", "chain_id", oracledb.DB_TYPE_NUMBER),
+        store_column("chain_name", "chain_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("area", "area_id", oracledb.DB_TYPE_NUMBER),
+        store_column("area_name", "area_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("district", "district_id", oracledb.DB_TYPE_NUMBER),
+        store_column("district_name", "district_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("city", "city_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("state", None, oracledb.DB_TYPE_VARCHAR),
+        store_column("country_id", "country_code", oracledb.DB_TYPE_VARCHAR),
+        store_column("post", "postal_code", oracledb.DB_TYPE_VARCHAR),
+        store_column("store_mgr_name", "contact_name", oracledb.DB_TYPE_VARCHAR),
+        store_column("contact_name", "contact_name", oracledb.DB_TYPE_VARCHAR),
+    ),
+    constants=(
+        ("region", "null"),
+        ("region_name", "null"),
+        ("jda_processed_flag", "'U'"),
+        ("jda_processed_time", "SYSTIMESTAMP"),
+    ),
+)
+
+# Columns bound by STORE_INSERT_STATEMENT and the Store field bound to each, in bind order; None binds null
+STORE_COLUMNS = tuple(column.name for column in STORE_FEED.columns)
+STORE_BIND_FIELDS = tuple(
+    {path: field for field, path in STORE_FIELD_PATHS.items()}.get(column.path) for column in STORE_FEED.columns
+)
+STORE_INPUT_SIZES = list(compile_feed(STORE_FEED).input_sizes)
+STORE_INSERT_STATEMENT = compile_feed(STORE_FEED).insert_statement
+get_stores_query = compile_feed(STORE_FEED).query
+GET_STORES_QUERY = get_stores_query.query
+# Only the fields JDA receives, plus the watermark, are requested from the supergraph
+STORE_SELECTION = feed_selection(STORE_FEED)
+
+_store_bound_values = attrgetter(*(field for field in STORE_BIND_FIELDS if field))
+_store_null_positions = [position for position, field in enumerate(STORE_BIND_FIELDS) if field is None]
+
+
+def store_bind_row(store: Store) -> tuple:
+    """Bind values for STORE_INSERT_STATEMENT, in STORE_BIND_FIELDS order."""
+    values = _store_bound_values(store)
+    if not _store_null_positions:
+        return values
+    row = list(values)
+    for position in _store_null_positions:
+        row.insert(position, None)
+    return tuple(row)
+
+
+class StoreSyncState(FeedSyncState[Store]):
+    """Watermark, fingerprints and progress of one store sync run."""
+
+    def __init__(self, checkpoint_path: str, resume: bool = True):
+        super().__init__(
+            "load_stores",
+            checkpoint_path,
+            key=lambda store: str(store.id),
+            watermark=lambda store: store.last_update_time,
+            fingerprint=store_fingerprint,
+            resume=resume,
+            label="Stores",
+        )
+
+    def persisted(self, stores: list[Store], result: BulkInsertResult) -> list[Store]:
+        """The stores of a committed persist that JDA took; those it rejected are retried by the next run."""
+        # Bind rows start with the store id, in either persist mode
+        return self.accepted(stores, {str(row.row[0]) for row in result.rejected})
+
+
+class StoreFeed(FeedSteps[Store]):
+    """The store feed as loaded by LoadStores and AsyncLoadStores: its sync state, decoding and sharded persist."""
+
+    feed = STORE_FEED
+    # Shared by every job that uses the load_stores checkpoints
+    lock_name = "load_stores"
+    # Maximum characters of the Store fields bound to string columns
+    field_widths: dict[str, int]
+
+    def sync_state(self) -> StoreSyncState:
+        return StoreSyncState(self.global_settings.checkpoint_path, resume=self.global_settings.resume_interrupted_runs)
+
+    def decode_page(self, content: bytes) -> FeedPage[Store]:
+        stores, rejected, cursor = decode_stores_page(content)
+        return FeedPage(stores, rejected, 0, cursor)
+
+    def prepare(self, stores: list[Store]) -> list[Store]:
+        # Cut here rather than when decoding, as spooled stores are decoded without a JDA session
+        self.metrics.count("values_truncated", truncate_columns(stores, self.field_widths))
+        return stores
+
+    def store_shards(self, stores: list[Store], parallelism: int) -> list[list[Store]]:
+        """Split stores over `parallelism` JDA sessions."""
+        logger.info(f"Storing info in JDA for {len(stores)} stores over {parallelism} sessions")
+        # Sharding on the store id keeps every version of a store in one shard, so a MERGE never sees it twice
+        return shard_by(stores, key=lambda store: store.id, shards=parallelism)
+
+    def shards_persisted(self, results: list[ShardResult]) -> None:
+        """Count and log the outcome of a sharded persist, raising if any shard failed.
+
+        Each shard commits on its own and is checkpointed right away, so after a failure the next run skips the
+        stores of committed shards and only redoes the failed ones.
+        """
+        for shard_result in results:
+            if shard_result.result is not None:
+                log_persisted(self.metrics, shard_result.result)
+        failed = [shard_result for shard_result in results if shard_result.error is not None]
+        logger.info(
+            f"{len(results) - len(failed)} of {len(results)} shards committed",
+            extra={
+                "data": {
+                    "shards": [
+                        {
+                            "shard": shard_result.shard,
+                            "rows": shard_result.rows,
+                            "status": "failed" if shard_result.error else "committed",
+                        }
+                        for shard_result in results
+                    ]
+                }
+            },
+        )
+        if failed:
+            msg = f"{len(failed)} of {len(results)} store shards failed: {', '.join(str(f.error) for f in failed)}"
+            raise RuntimeError(msg) from failed[0].error
+
+
+class LoadStores(StoreFeed, FeedLoader[Store]):
     """Retrieve store info from supergraph and store it in JDA."""
 
     def task(self) -> None:
         """Run update task."""
-        stores = self.get_stores_from_graphql()
-        self.load_store_info_in_jda(stores)
+        if get_jda_settings().jda_persist_mode == "merge" and not table_exists(self.jda_connection, STORE_STAGE_TABLE):
+            # Fail before fetching anything
+            raise RuntimeError(STORE_STAGE_TABLE_MISSING)
+        super().task()
 
-    def get_stores_from_graphql(self) -> list[Store]:
-        """Load store info from supergraph."""
-        logger.info("Fetching store info from supergraph")
+    def write(self, stores: list[Store], state: StoreSyncState) -> list[Store]:
+        if (parallelism := get_jda_settings().jda_persist_parallelism) > 1:
+            # Shards journal their stores as they commit
+            self.persist_store_shards(stores, state, parallelism)
+            return []
+        return state.persisted(stores, self.persist_store_data(stores))
 
-        stores = self.fetch_stores()
+    @cached_property
+    def field_widths(self) -> dict[str, int]:
+        return store_field_widths(self.widths)
 
-        logger.info("Store info fetched successfully")
-        return stores
+    def persist_store_data(self, stores: list[Store]) -> BulkInsertResult:
+        """Store store info in JDA."""
+        logger.info(f"Storing info in JDA for {len(stores)} stores")
+        try:
+            with self.metrics.span("persist"):
+                result = write_stores(self.jda_connection, stores, self.batch_size)
+                self.jda_connection.commit()
+            log_persisted(self.metrics, result)
+        except Exception as e:
+            logger.error("Error while inserting stores")
+            self.jda_connection.rollback()
+            raise e
+        logger.info("Insert process completed successfully.")
+        return result
 
-    def fetch_stores(self) -> list[Store]:
-        graphql_query = """
-        query GetStores {
-          stores(filters: {last_update_time: "2021-10-01 00:00:00"}) {
-            items {
-              id
-              name
-              address {
-                city_name
-                country_code
-                district_id
-                district_name
-                postal_code
-              }              
-              contact {
-                telephone
-                email
-              }
-              linear_distance
-              name_secondary
-              name_short
-              datetime_opened
-              datetime_closed
-              size_selling_sqft
-              size_total_sqft
-              timezone_name
-              opening_hours              
-              organization {
-                area_id
-                area_name
-                chain_id
-                chain_name
-                format_name
-                gln
-                store_format
-                store_organizational_unit
-                store_organizational_unit_name
-                store_type
-              }
-
-            }
-          }
+    def persist_store_shards(self, stores: list[Store], state: StoreSyncState, parallelism: int) -> None:
+        """Store store info in JDA over `parallelism` sessions at once, one shard of stores each."""
+        with self.metrics.span("persist"):
+            results = persist_shards(
+                self.store_shards(stores, parallelism),
+                partial(write_stores, batch_size=self.batch_size),
+                on_committed=lambda shard, result: state.checkpoint_committed(state.persisted(shard, result)),
+            )
+        self.shards_persisted(results)
+
+
+class SpoolStores(LoadStores):
+    """Fetch the stores LoadStores would load and spool them to the checkpoint volume, for LoadSpooledStores.
+
+    Splits a load in two: the supergraph can be read off-peak, even while JDA is in a maintenance window, and the
+    spool loaded later during the JDA window.
+    """
+
+    scheduled = False
+    uses_jda = False
+
+    def task(self) -> None:
+        """Run spool task."""
+        checkpoint_path = self.global_settings.checkpoint_path
+        state = self.sync_state()
+        if state.resuming:
+            # Its progress refers to the pages of the current spool, a new spool could shift them
+            msg = "An interrupted store load is pending, run LoadSpooledStores or LoadStores first, or use --no-resume"
+            raise RuntimeError(msg)
+
+        path = spool_path(checkpoint_path, "load_stores")
+        logger.info(f"Spooling stores updated since {state.last_update_time} to {path}")
+        header = {
+            "feed": "load_stores",
+            "last_update_time": state.last_update_time,
+            "fields": STORE_FIELDS,
+            "spooled_at": datetime.now(UTC).isoformat(),
         }
+        total = 0
+        with SpoolWriter(path, header) as spool:
+            for stores, cursor in prefetch(self.fetch_pages(state.last_update_time)):
+                with self.metrics.span("spool"):
+                    spool.write(cursor, [store_spool_row(store) for store in stores])
+                total += len(stores)
+        self.metrics.count("bytes_spooled", spool.bytes_written)
+        logger.info(f"Spooled {total} stores ({spool.bytes_written / 1024 / 1024:.1f} MB)")
+
+
+class LoadSpooledStores(LoadStores):
+    """Load the stores spooled by SpoolStores into JDA, without calling the supergraph.
+
+    Runs exactly like LoadStores otherwise: change detection, persist mode, checkpoints and resuming an interrupted
+    load all apply. The spool is kept, so a failed load can be rerun; once loaded it is recognised as such and skipped.
+    """
+
+    scheduled = False
+
+    def pages(self, state: StoreSyncState) -> Iterator[tuple[list[Store], str | None]]:
+        path = spool_path(self.global_settings.checkpoint_path, "load_stores")
+        with SpoolReader(path) as spool:
+            if spool.header["fields"] != list(STORE_FIELDS):
+                msg = f"Spool {path} was written with different store fields, spool the stores again"
+                raise ValueError(msg)
+            if spool.header["last_update_time"] != state.last_update_time:
+                logger.warning(
+                    f"Spool {path} holds stores updated since {spool.header['last_update_time']}, the checkpoint is "
+                    f"at {state.last_update_time}: the spool was loaded already or is stale, nothing to load"
+                )
+                return
+            logger.info(f"Loading stores spooled at {spool.header['spooled_at']} from {path}")
+
+            pages = spool.pages()
+            if state.resume_after is not None:
+                # Skip the pages the interrupted load committed
+                if not any(after == state.resume_after for after, _ in pages):
+                    msg = f"Spool {path} has no page after cursor {state.resume_after} to resume from"
+                    raise ValueError(msg)
+            for after, rows in pages:
+                with self.metrics.span("decode"):
+                    stores = [decode_spooled_store(row) for row in rows]
+                self.metrics.count("rows_fetched", len(stores))
+                yield stores, after
+
+
+class AsyncLoadStores(StoreFeed, AsyncJob):
+    """Asyncio variant of LoadStores, running fetch, transform and persist as concurrent stages."""
+
+    # Alternative runtime for LoadStores: shares its checkpoints, and so its lock, and needs thin mode, so it is only
+    # run by `run-all` when selected explicitly
+    scheduled = False
+
+    async def task(self) -> None:
+        """Run update task."""
+        state = self.sync_state()
+        logger.info(f"Loading stores updated since {state.last_update_time}")
+        if get_jda_settings().jda_persist_mode == "merge" and not await async_table_exists(
+            self.jda_connection, STORE_STAGE_TABLE
+        ):
+            raise RuntimeError(STORE_STAGE_TABLE_MISSING)
+        self.field_widths = store_field_widths(await async_column_widths(self.jda_connection, STORE_TABLE))
+
+        async def transform(page: tuple[list[Store], str | None]) -> tuple[list[Store], str | None]:
+            stores, cursor = page
+            return await asyncio.to_thread(self.changed, stores, state), cursor
+
+        async def persist(page: tuple[list[Store], str | None]) -> None:
+            stores, cursor = page
+            committed = await self.write(stores, state) if stores else []
+            await asyncio.to_thread(state.page_committed, cursor, committed)
+
+        if not state.fetch_complete:
+            await run_stages(self.fetch_pages(state.last_update_time, state.resume_after), transform, persist)
+
+        state.commit(self.checkpoint_updates)
+
+    async def fetch_pages(
+        self, last_update_time: str, after: str | None = None
+    ) -> AsyncIterator[tuple[list[Store], str | None]]:
+        """Yield pages of stores updated after `last_update_time`, from cursor `after` on.
+
+        Each page comes with the cursor of the page after it, None for the last page.
         """
-        response = self.supergraph_client.post(
-            url="",
-            json={"query": graphql_query},
-            timeout=60,
-        )
-        response.raise_for_status()
-        return [
-            Store(
-                   id=store["id"],
-                   name=store["name"],
-                   name_secondary=store["name_secondary"],
-                   name_short=store["name_short"],
-                   email=store["contact"]["email"],
-                   telephone=store["contact"]["telephone"],
-                   city_name=store["address"]["city_name"],
-                   country_code=store["address"]["country_code"],
-                   district_id=store["address"]["district_id"],
-                   district_name=store["address"]["district_name"],
-                   postal_code=store["address"]["postal_code"],
-                   contact_name=store["address"]["name"],                   
-                   datetime_opened=store["datetime_opened"],
-                   datetime_closed=store["datetime_closed"],
-                   store_organizational_unit=store["organization"]["store_organizational_unit"],
-                   store_organizational_unit_name=store["organization"]["store_organizational_unit_name"],
-                   store_type=store["organization"]["store_type"],
-                   store_format=store["organization"]["store_format"],
-                   format_name=store["organization"]["format_name"],
-                   gln=store["organization"]["gln"],
-                   chain_id=store["organization"]["chain_id"],
-                   chain_name=store["organization"]["chain_name"],
-                   area_id=store["organization"]["area_id"],
-                   area_name=store["organization"]["area_name"],
-                   size_total_sqft=store["size_total_sqft"],
-                   size_selling_sqft=store["size_selling_sqft"],
-                   timezone_name=store["timezone_name"]
-            )
-            for store in orjson.loads(response.content)["data"]["stores"]["items"]
-        ]
-    
-    def persist_store_data(self, stores: list[Store]) -> None:
+        cursor = after
+        while True:
+            if delay := self.batch_size.backpressure():
+                await asyncio.sleep(delay)
+            with self.metrics.span("fetch"):
+                response = await self.compiled.query.post_async(
+                    self.supergraph_client,
+                    {
+                        "last_update_time": last_update_time,
+                        "first": get_graphql_settings().supergraph_page_size,
+                        "after": cursor,
+                    },
+                    extensions={"idempotent": True},
+                )
+                response.raise_for_status()
+            page = await asyncio.to_thread(self.decoded, response.content)
+            cursor = page.cursor
+            yield page.records, cursor
+            if cursor is None:
+                return
+
+    async def write(self, stores: list[Store], state: StoreSyncState) -> list[Store]:
+        """Asyncio counterpart of LoadStores.write."""
+        if (parallelism := get_jda_settings().jda_persist_parallelism) > 1:
+            with self.metrics.span("persist"):
+                results = await async_persist_shards(
+                    self.store_shards(stores, parallelism),
+                    partial(async_write_stores, batch_size=self.batch_size),
+                    on_committed=lambda shard, result: state.checkpoint_committed(state.persisted(shard, result)),
+                )
+            self.shards_persisted(results)
+            return []
+        return state.persisted(stores, await self.persist_store_data(stores))
+
+    async def persist_store_data(self, stores: list[Store]) -> BulkInsertResult:
         """Store store info in JDA."""
         logger.info(f"Storing info in JDA for {len(stores)} stores")
-        with self.ros_connection.cursor() as cursor:
-            # Run update
-            try:
-                cursor.executemany(
-                    """
-                      BEGIN
-                     INSERT INTO intowner.csg_etos_store_in ( store
-                                                            , store_name
-                                                            , store_name3
-                                                            , store_name10
-                                                            , store_open_date
-                                                            , store_close_date
-                                                            , phone_number
-                                                            , fax_number
-                                                            , email
-                                                            , total_square_ft
-                                                            , selling_square_ft
-                                                            , linear_distance
-                                                            , store_format
-                                                            , store_format_name
-                                                            , org_unit_id
-                                                            , org_unit_name
-                                                            , store_type
-                                                            , timezone_name
-                                                            , gln
-                                                            , chain
-                                                            , chain_name
-                                                            , area
-                                                            , area_name
-                                                            , region
-                                                            , region_name
-                                                            , district
-                                                            , district_name
-                                                            , city
-                                                            , state
-                                                            , country_id
-                                                            , post
-                                                            , store_mgr_name
-                                                            , contact_name
-                                                            , jda_processed_flag
-                                                            , jda_processed_time)
-                                                      VALUES (:store
-                                                            , :store_name
-                                                            , :store_name3
-                                                            , :store_name10
-                                                            , :store_open_date
-                                                            , :store_close_date
-                                                            , :phone_number
-                                                            , :fax_number
-                                                            , :email
-                                                            , :total_square_ft
-                                                            , :selling_square_ft
-                                                            , :linear_distance
-                                                            , :store_format
-                                                            , :store_format_name
-                                                            , :org_unit_id
-                                                            , :org_unit_name
-                                                            , :store_type
-                                                            , :timezone_name
-                                                            , :gln
-                                                            , :chain
-                                                            , :chain_name
-                                                            , :area
-                                                            , :area_name
-                                                            , null
-                                                            , null
-                                                            , :district
-                                                            , :district_name
-                                                            , :city
-                                                            , :state
-                                                            , :country_id
-                                                            , :post
-                                                            , :store_mgr_name
-                                                            , :contact_name
-                                                            , 'U'
-                                                            , SYSTIMESTAMP);
-                      END;
-                      """,
-                     [
-                        (
-                            store.store,
-                            store.name,
-                            store.name_secondary,
-                            store.name_short,
-                            store.datetime_opened,
-                            store.datetime_closed,
-                            store.telephone,
-                            store.telephone,
-                            store.email,
-                            store.size_total_sqft,
-                            store.size_selling_sqft,
-                            store.linear_distnace,
-                            store.store_format,
-                            store.format_name,
-                            store.store_organizational_unit,
-                            store.store_organizational_unit_name,
-                            store.store_type,
-                            store.timezone_name,
-                            store.gln,
-                            store.chain_id,
-                            store.chain_name,
-                            store.area_id,
-                            store.area_name,
-                            store.district_id,
-                            store.district_name,
-                            store.city_name,
-                            store.country_code,
-                            store.postal_code,
-                            store.contact_name,
-                            store.contact_name
-                        )
-                        for store in stores
-                    ],
-                 )
-                self.ros_connection.commit()
-                logger.info("Stores committed successfully")
-            except Exception as e:
-                logger.error("Error while inserting stores")
-                self.ros_connection.rollback()
-                raise e
-        logger.info("Insert process completed successfully.")
-                                        
\ No newline at end of file
+        try:
+            with self.metrics.span("persist"):
+                result = await async_write_stores(self.jda_connection, stores, self.batch_size)
+                await self.jda_connection.commit()
+            log_persisted(self.metrics, result)
+        except Exception as e:
+            logger.error("Error while inserting stores")
+            await self.jda_connection.rollback()
+            raise e
+        return result
+
+
+def write_stores(
+    connection: oracledb.Connection, stores: list[Store], batch_size: int | AdaptiveBatchSize
+) -> BulkInsertResult:
+    """Write stores to JDA in the configured persist mode; committing is left to the caller."""
+    statements, rows = store_write(stores)
+    bulk_write = bulk_merge if len(statements) == 2 else bulk_insert
+    return bulk_write(connection, *statements, rows, input_sizes=STORE_INPUT_SIZES, batch_size=batch_size)
+
+
+async def async_write_stores(
+    connection: oracledb.AsyncConnection, stores: list[Store], batch_size: int | AdaptiveBatchSize
+) -> BulkInsertResult:
+    """Asyncio counterpart of write_stores."""
+    statements, rows = store_write(stores)
+    bulk_write = async_bulk_merge if len(statements) == 2 else async_bulk_insert
+    return await bulk_write(connection, *statements, rows, input_sizes=STORE_INPUT_SIZES, batch_size=batch_size)
+
+
+def store_write(stores: list[Store]) -> tuple[tuple[str, ...], list[tuple]]:
+    """Statements and bind rows of a store write in the configured persist mode.
+
+    "merge" stages one row per store and applies them with a single MERGE; "append" inserts a row per store.
+    """
+    if get_jda_settings().jda_persist_mode == "merge":
+        return (STORE_STAGE_INSERT_STATEMENT, STORE_MERGE_STATEMENT), store_merge_rows(stores)
+    return (STORE_INSERT_STATEMENT,), [store_bind_row(store) for store in stores]
+
+
+def log_persisted(metrics: JobMetrics, result: BulkInsertResult) -> None:
+    """Count and log the outcome of a committed persist."""
+    metrics.count("rows_inserted", result.inserted)
+    metrics.count("rows_rejected", len(result.rejected))
+    metrics.count("rows_merged", result.merged)
+    logger.info(
+        f"{result.inserted} stores committed successfully, {len(result.rejected)} rejected, {result.merged} merged"
+    )
+
+
+def decode_stores_page(content: bytes) -> tuple[list[Store], list[RejectedItem], str | None]:
+    """Decode a GetStores response into the page of valid stores, the rejected items and the cursor of the next page."""
+    page = orjson.loads(content)["data"]["stores"]
+    stores, rejected = decode_stores(page["items"])
+    return stores, rejected, next_page_cursor(page)
+
+
+def next_page_cursor(page: dict) -> str | None:
+    """Cursor of the page after `page`, or None on the last page."""
+    return page["page_info"]["end_cursor"] if page["page_info"]["has_next_page"] else None
+
+
+def decode_stores(items: list[dict]) -> tuple[list[Store], list[RejectedItem]]:
+    """Map GetStores items onto Store records, column by column, separating out the invalid items.
+
+    Ids, sizes and timestamps are coerced to their declared types. An item with a missing field or an unparsable
+    value is rejected with its reasons instead of failing the page.
+    """
+    batch = ColumnBatch(items)
+    columns = []
+    for field in STORE_FIELDS:
+        path = STORE_FIELD_PATHS.get(field)
+        if path is None:
+            # Not in the supergraph, e.g. the region
+            columns.append(repeat(None, len(items)))
+            continue
+        values = batch.column(path)
+        parse = STORE_FIELD_PARSERS.get(field)
+        if parse is int:
+            columns.append(batch.ints(path, values, required=field == "id"))
+        elif parse is parse_datetime:
+            columns.append(batch.datetimes(path, values))
+        else:
+            columns.append(batch.strings(path, values))
+    return [Store(*row) for row in batch.valid_rows(columns)], batch.rejected("id")
+
+
+# Store fields in declaration order, as spooled by store_spool_row
+STORE_FIELDS = [field.name for field in fields(Store)]
+STORE_DATETIME_INDEXES = [STORE_FIELDS.index("datetime_opened"), STORE_FIELDS.index("datetime_closed")]
+
+store_spool_row = attrgetter(*STORE_FIELDS)
+
+
+def decode_spooled_store(row: list) -> Store:
+    """Rebuild a store from its spooled row; orjson wrote its datetimes as ISO strings."""
+    for index in STORE_DATETIME_INDEXES:
+        row[index] = parse_datetime(row[index])
+    return Store(*row)
+
+
+def store_field_widths(column_widths: Mapping[str, int]) -> dict[str, int]:
+    """Maximum characters of each Store field bound to a string column; fields bound twice get the narrower width."""
+    widths: dict[str, int] = {}
+    for column, field in zip(STORE_COLUMNS, STORE_BIND_FIELDS, strict=True):
+        if field is not None and column in column_widths:
+            widths[field] = min(column_widths[column], widths.get(field, column_widths[column]))
+    return widths
+
+
+def store_merge_rows(stores: list[Store]) -> list[tuple]:
+    """Bind rows for the staging table, one per store; MERGE rejects two source rows for the same target row."""
+    return [store_bind_row(store) for store in {store.id: store for store in stores}.values()]
+
+
+def store_fingerprint(store: Store) -> str:
+    """Stable hash of the values written to JDA for a store."""
+    return hashlib.blake2b(orjson.dumps(store_bind_row(store)), digest_size=16).hexdigest()
+
+
+# Staging table of the "merge" persist mode, created once in JDA with STORE_STAGE_DDL by the `create-stage-table`
+# command. Rows are private to the session and gone on commit, so concurrent runs never see each other's batches.
+STORE_STAGE_TABLE = "intowner.csg_etos_store_stage"
+
+STORE_STAGE_DDL = f"""
+    CREATE GLOBAL TEMPORARY TABLE {STORE_STAGE_TABLE}
+    ON COMMIT DELETE ROWS
+    AS SELECT {", ".join(STORE_COLUMNS)} FROM intowner.csg_etos_store_in WHERE 1 = 0
+"""
+
+STORE_STAGE_TABLE_MISSING = (
+    f"Persist mode merge needs the staging table {STORE_STAGE_TABLE}, create it with the create-stage-table command"
+)
+
+STORE_STAGE_INSERT_STATEMENT = f"""
+    INSERT INTO {STORE_STAGE_TABLE} ({", ".join(STORE_COLUMNS)})
+    VALUES ({", ".join(f":{column}" for column in STORE_COLUMNS)})
+"""
+
+# Upsert keyed on store. Matched rows are only updated when a column differs (DECODE treats two nulls as equal),
+# so JDA is flagged to reprocess changed stores only.
+STORE_MERGE_STATEMENT = f"""
+    MERGE INTO intowner.csg_etos_store_in target
+    USING {STORE_STAGE_TABLE} stage
+       ON (target.store = stage.store)
+     WHEN MATCHED THEN UPDATE
+      SET {", ".join(f"target.{column} = stage.{column}" for column in STORE_COLUMNS[1:])}
+        , target.jda_processed_flag = 'U'
+        , target.jda_processed_time = SYSTIMESTAMP
+    WHERE {" OR ".join(f"DECODE(target.{column}, stage.{column}, 0, 1) = 1" for column in STORE_COLUMNS[1:])}
+     WHEN NOT MATCHED THEN INSERT ({", ".join(STORE_COLUMNS)}, jda_processed_flag, jda_processed_time)
+          VALUES ({", ".join(f"stage.{column}" for column in STORE_COLUMNS)}, 'U', SYSTIMESTAMP)
+"""
@@ -1,16 +1,28 @@
+import cProfile
 import logging
-import sys
-from typing import Annotated
+from pathlib import Path
+from typing import Annotated, Literal
 
 import typer
 from typer import Typer
 
 from app.glogger import setup_glogger
-from app.jobs.job import Job
-from app.jobs.job_get_stores import LoadStores
-from app.settings import Settings
+from app.jobs.job import AsyncJob, Job, run_job
+from app.jobs.job_get_stores import (
+    STORE_STAGE_DDL,
+    STORE_STAGE_TABLE,
+    AsyncLoadStores,
+    LoadSpooledStores,
+    LoadStores,
+    SpoolStores,
+)
+from app.jobs.scheduler import run_jobs
+from app.settings import get_jda_settings, get_settings
+from app.utils_oracle import oracle_connection, table_exists
 
-jobs = [LoadStores]
+jobs: list[type[Job] | type[AsyncJob]] = [LoadStores, AsyncLoadStores, SpoolStores, LoadSpooledStores]
+
+logger = logging.getLogger(__name__)
 
 # Sub apps
 ingoing = Typer()
@@ -20,29 +32,136 @@ app = Typer()
 
 
 @app.command()
-def execute(job_name: Annotated[str, typer.Argument(help="Name of the job to execute")]) -> None:
+def execute(
+    job_name: Annotated[str, typer.Argument(help="Name of the job to execute")],
+    profile: Annotated[
+        Path | None, typer.Option(help="Write cProfile stats of the run to this file, for pstats or snakeviz")
+    ] = None,
+    persist_mode: Annotated[
+        Literal["append", "merge"] | None,
+        typer.Option(help="How stores are written to JDA in this run; JDA_PERSIST_MODE by default"),
+    ] = None,
+    resume: Annotated[
+        bool | None,
+        typer.Option(
+            "--resume/--no-resume",
+            help="Continue an interrupted run after its last committed page; RESUME_INTERRUPTED_RUNS by default",
+        ),
+    ] = None,
+) -> None:
+    setup_logging()
+    job = get_job(job_name)
+    if persist_mode is not None:
+        get_jda_settings().jda_persist_mode = persist_mode
+    if resume is not None:
+        get_settings().resume_interrupted_runs = resume
+    if profile is None:
+        run_job(job)
+        return
+
+    # Profiles the main thread only; prefetch and pool threads show up as time spent waiting on them
+    profiler = cProfile.Profile()
     try:
-        job: type[Job] = getattr(sys.modules[__name__], job_name)
-    except AttributeError as e:
-        msg = f"Invalid job name: {job_name}"
-        raise ValueError(msg) from e
+        profiler.runcall(run_job, job)
+    finally:
+        profile.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(profile)
+        logger.info(f"Profile of {job_name} written to {profile}")
 
-    with job() as job_instance:
-        job_instance.run()
 
+@app.command("run-all")
+def run_all(
+    job_names: Annotated[
+        list[str] | None, typer.Option("--job", help="Job to run, may be repeated; all scheduled jobs by default")
+    ] = None,
+    workers: Annotated[int, typer.Option(help="Number of jobs to run concurrently")] = 4,
+    timeout: Annotated[float | None, typer.Option(help="Per job timeout in seconds")] = None,
+) -> None:
+    setup_logging()
+    selected = [get_job(job_name) for job_name in job_names] if job_names else [job for job in jobs if job.scheduled]
+    if any(issubclass(job, AsyncJob) for job in selected) and get_jda_settings().jda_thick_mode:
+        # Asyncio jobs need thin mode, which a process cannot switch to once a sync job started the thick client
+        logger.info("Running in thin mode, as asyncio jobs are selected")
+        get_jda_settings().jda_thick_mode = False
+    results = run_jobs(selected, max_workers=workers, timeout=timeout)
 
-def main() -> None:
-    global_settings = Settings()
+    for result in results:
+        logger.info(
+            f"{result.name}: {result.status} in {result.seconds:.1f}s" + (f" ({result.error})" if result.error else ""),
+            extra={"data": {"job": result.name, "status": result.status, "seconds": round(result.seconds, 3)}},
+        )
+    unsuccessful = [result.name for result in results if result.status != "succeeded"]
+    if unsuccessful:
+        msg = f"Jobs did not succeed: {', '.join(unsuccessful)}"
+        raise RuntimeError(msg)
+
+
+@app.command()
+def worker(
+    schedule: Annotated[
+        list[str] | None,
+        typer.Option(help="JobName=seconds, may be repeated; WORKER_SCHEDULE by default"),
+    ] = None,
+    host: Annotated[str, typer.Option(help="Interface the API and job trigger listen on")] = "0.0.0.0",  # noqa: S104
+    port: Annotated[int, typer.Option(help="Port the API and job trigger listen on")] = 8000,
+) -> None:
+    """Stay resident and run jobs on their schedule or when triggered through the API, with warm JDA pools.
+
+    Needs JDA_THICK_MODE=false, as the API reads JDA with asyncio.
+    """
+    # Imported here, as the API resolves settings on import and --help must not
+    import uvicorn
+
+    from app.api.main import app as api
+    from app.jobs.worker import Worker, parse_schedule
+
+    global_settings = get_settings()
+    registered = {job.__name__: job for job in jobs}
+    api.state.worker = Worker(
+        jobs,
+        parse_schedule(schedule or global_settings.worker_schedule, registered),
+        global_settings.checkpoint_path,
+    )
+    # The API's lifespan sets up logging and starts and stops the worker
+    uvicorn.run(api, host=host, port=port, log_config=None)
+
+
+@app.command("create-stage-table")
+def create_stage_table() -> None:
+    """Create the staging table of the merge persist mode in JDA, once; needs CREATE TABLE rights on its schema."""
+    setup_logging()
+    with oracle_connection() as connection:
+        if table_exists(connection, STORE_STAGE_TABLE):
+            logger.info(f"Staging table {STORE_STAGE_TABLE} exists already")
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(STORE_STAGE_DDL)
+    logger.info(f"Staging table {STORE_STAGE_TABLE} created")
+
+
+def get_job(job_name: str) -> type[Job] | type[AsyncJob]:
+    """Look up a registered job by class name."""
+    for job in jobs:
+        if job.__name__ == job_name:
+            return job
+    msg = f"Invalid job name: {job_name}"
+    raise ValueError(msg)
+
+
+def setup_logging() -> None:
+    """Route logging through GLogger; called by each command so `--help` never resolves settings."""
+    global_settings = get_settings()
     setup_glogger(
         app_name=global_settings.app_name,
         app_version=global_settings.application_version,
         environment=global_settings.environment,
         development=global_settings.disable_json_logs,
     )
-    logger = logging.getLogger(__name__)
+    logger.info("Starting application")
 
+
+def main() -> None:
     try:
-        logger.info("Starting application")
         app(standalone_mode=False)
     except Exception as e:
         logger.exception("Exception during runtime", exc_info=e)
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the exported Prometheus metric names
+METRIC_PREFIX = "etos_jda_job"
+
+
+class JobMetrics:
+    """Timed stages and counters of one job run.
+
+    Stages such as fetch, decode, transform and persist may run in several threads at once (see `prefetch`), so
+    their times can add up to more than the run's wall time.
+    """
+
+    def __init__(self):
+        self.stage_seconds: defaultdict[str, float] = defaultdict(float)
+        self.stage_calls: Counter[str] = Counter()
+        self.counters: Counter[str] = Counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Add the time spent in the block to `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.stage_seconds[stage] += seconds
+                self.stage_calls[stage] += 1
+
+    def count(self, counter: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[counter] += value
+
+    def as_dict(self) -> dict[str, dict]:
+        with self.lock:
+            return {
+                "stage_seconds": {stage: round(seconds, 6) for stage, seconds in self.stage_seconds.items()},
+                "stage_calls": dict(self.stage_calls),
+                "counters": dict(self.counters),
+            }
+
+    def prometheus_text(self, job_name: str, status: str) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        labels = f'job_name="{job_name}"'
+        data = self.as_dict()
+        lines = [
+            f"# TYPE {METRIC_PREFIX}_stage_seconds gauge",
+            *(
+                f'{METRIC_PREFIX}_stage_seconds{{{labels},stage="{stage}"}} {seconds}'
+                for stage, seconds in data["stage_seconds"].items()
+            ),
+            f"# TYPE {METRIC_PREFIX}_stage_calls gauge",
+            *(
+                f'{METRIC_PREFIX}_stage_calls{{{labels},stage="{stage}"}} {calls}'
+                for stage, calls in data["stage_calls"].items()
+            ),
+        ]
+        for counter, value in sorted(data["counters"].items()):
+            lines += [f"# TYPE {METRIC_PREFIX}_{counter} gauge", f"{METRIC_PREFIX}_{counter}{{{labels}}} {value}"]
+        lines += [
+            f"# TYPE {METRIC_PREFIX}_succeeded gauge",
+            f"{METRIC_PREFIX}_succeeded{{{labels}}} {int(status == 'succeeded')}",
+            f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_timestamp_seconds{{{labels}}} {time.time():.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def export_metrics(
+    metrics: JobMetrics, job_name: str, status: str, path: str | None, pushgateway_url: str | None
+) -> None:
+    """Write the metrics of a run to a textfile collector file and/or push them to a Prometheus pushgateway.
+
+    Export problems are logged, never raised, so they cannot fail a job that did its work.
+    """
+    text = metrics.prometheus_text(job_name, status)
+    if path:
+        try:
+            metrics_path = Path(path) / f"{job_name}.prom"
+            metrics_path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so the collector never scrapes a half written file
+            temporary_path = metrics_path.with_suffix(".tmp")
+            temporary_path.write_text(text)
+            temporary_path.replace(metrics_path)
+        except OSError as error:
+            logger.warning(f"Could not write job metrics to {path}: {error}")
+    if pushgateway_url:
+        try:
+            response = httpx.put(f"{pushgateway_url.rstrip('/')}/metrics/job/{job_name}", content=text, timeout=5)
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            logger.warning(f"Could not push job metrics to {pushgateway_url}: {error}")
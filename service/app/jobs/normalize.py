@@ -0,0 +1,154 @@
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from datetime import datetime
+from types import NoneType
+from typing import Any
+
+
+@dataclass
+class RejectedItem:
+    """A fetched item left out of a load, with every reason it failed validation."""
+
+    key: Any
+    reasons: list[str]
+    item: Any
+
+
+# Marks values that failed to convert
+INVALID = object()
+
+
+class ColumnBatch:
+    """A page of supergraph items normalized one column at a time.
+
+    Each column is extracted, coerced and validated in a single pass over the page, and every parsed value is
+    converted once however many items share it. Invalid values do not raise: the item is marked with the reason and
+    left out of `valid_rows`, so one bad record no longer fails the whole run.
+    """
+
+    def __init__(self, items: list[dict]):
+        self.items = items
+        self.reasons: dict[int, list[str]] = {}
+        self.truncated = 0
+        self._parents: dict[str, list] = {}
+
+    def reject(self, index: int, reason: str) -> None:
+        self.reasons.setdefault(index, []).append(reason)
+
+    def column(self, path: str) -> list:
+        """Values at the dotted `path` of every item; missing keys and null parents reject the item."""
+        parent_path, _, name = path.rpartition(".")
+        parents = self.parents(parent_path) if parent_path else self.items
+        try:
+            return [parent[name] for parent in parents]
+        except (KeyError, TypeError):
+            pass
+        values = []
+        for index, parent in enumerate(parents):
+            try:
+                values.append(parent[name])
+            except (KeyError, TypeError):
+                # Items whose parent is not an object were rejected for that already
+                if isinstance(parent, dict):
+                    self.reject(index, f"{path} is missing")
+                values.append(None)
+        return values
+
+    def parents(self, path: str) -> list:
+        """Objects at `path`, looked up once per page for all the columns below them."""
+        if path not in self._parents:
+            values = self.column(path)
+            if set(map(type, values)) != {dict}:
+                for index, value in enumerate(values):
+                    if not isinstance(value, dict) and f"{path} is missing" not in self.reasons.get(index, ()):
+                        self.reject(index, f"{path} is not an object")
+            self._parents[path] = values
+        return self._parents[path]
+
+    def ints(self, path: str, values: list, required: bool = False) -> list[int | None]:
+        """Coerce numbers, which the supergraph may serialize as strings, to int."""
+        if set(map(type, values)) <= {int, NoneType}:
+            # Already ints, as the supergraph sends most of them
+            if required and None in values:
+                self.reject_missing(path, values)
+            return values
+        return self.coerce(path, values, int, required)
+
+    def datetimes(self, path: str, values: list) -> list[datetime | None]:
+        """Parse timestamps such as "2021-10-01 00:00:00"; empty strings are treated as null."""
+        return self.coerce(path, [value or None for value in values], datetime.fromisoformat)
+
+    def strings(self, path: str, values: list) -> list[str | None]:
+        if not set(map(type, values)) <= {str, NoneType}:
+            for index, value in enumerate(values):
+                if value is not None and type(value) is not str:
+                    self.reject(index, f"{path} is not a string: {value!r}")
+        return values
+
+    def truncate(self, values: list, width: int) -> list:
+        """Cut strings in `values` down to `width` characters, counting the values cut in `truncated`."""
+        for index, value in enumerate(values):
+            if type(value) is str and len(value) > width:
+                values[index] = value[:width]
+                self.truncated += 1
+        return values
+
+    def coerce(self, path: str, values: list, convert: Callable[[Any], Any], required: bool = False) -> list:
+        """Convert each distinct value once, rejecting items whose value does not convert."""
+        try:
+            distinct = set(values)
+        except TypeError:
+            # Unhashable values, such as a list where a scalar was expected, never convert
+            values = list(values)
+            for index, value in enumerate(values):
+                if not isinstance(value, Hashable):
+                    self.reject(index, f"{path} is invalid: {value!r}")
+                    values[index] = None
+            distinct = set(values)
+        converted: dict[Any, Any] = {None: None}
+        for value in distinct:
+            try:
+                converted[value] = None if value is None else convert(value)
+            except (TypeError, ValueError):
+                converted[value] = INVALID
+        result = [converted[value] for value in values]
+        if INVALID in converted.values():
+            for index, value in enumerate(result):
+                if value is INVALID:
+                    self.reject(index, f"{path} is invalid: {values[index]!r}")
+                    result[index] = None
+        if required and None in distinct:
+            self.reject_missing(path, values)
+        return result
+
+    def reject_missing(self, path: str, values: list) -> None:
+        for index, value in enumerate(values):
+            if value is None:
+                self.reject(index, f"{path} is required")
+
+    def valid_rows(self, columns: Iterable[Iterable]) -> Iterator[tuple]:
+        """Rows of the given columns, skipping rejected items."""
+        rows = zip(*columns, strict=True)
+        if not self.reasons:
+            return rows
+        return (row for index, row in enumerate(rows) if index not in self.reasons)
+
+    def rejected(self, key_path: str) -> list[RejectedItem]:
+        """The rejected items with their reasons, identified by their value at the top-level `key_path`."""
+        rejected = []
+        for index, reasons in sorted(self.reasons.items()):
+            item = self.items[index]
+            rejected.append(RejectedItem(item.get(key_path) if isinstance(item, dict) else None, reasons, item))
+        return rejected
+
+
+def truncate_columns(records: list, widths: Mapping[str, int]) -> int:
+    """Cut string attributes of `records` down to `widths` (attribute -> characters), returning how many were cut."""
+    truncated = 0
+    for name, width in widths.items():
+        for record in records:
+            value = getattr(record, name)
+            if value is not None and len(value) > width:
+                setattr(record, name, value[:width])
+                truncated += 1
+    return truncated
@@ -0,0 +1,113 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from app.jobs.job import AsyncJob, Job, run_job
+
+logger = logging.getLogger(__name__)
+
+JobType = type[Job] | type[AsyncJob]
+
+
+@dataclass
+class JobResult:
+    name: str
+    status: str  # succeeded, failed, timed_out or skipped
+    seconds: float
+    error: str | None = None
+
+
+def run_jobs(jobs: Sequence[JobType], max_workers: int = 4, timeout: float | None = None) -> list[JobResult]:
+    """Run jobs concurrently on up to `max_workers` threads, respecting their `depends_on` and `lock_name`.
+
+    A job starts once all of its dependencies in `jobs` have succeeded and is skipped when one of them did not; jobs
+    sharing a lock name run one after the other. Jobs cannot be interrupted, so a job exceeding `timeout` seconds is
+    reported as timed out and its thread is abandoned; worker threads are daemons, so they never keep the process
+    alive. An abandoned thread keeps its slot and lock until it returns, and jobs that can only wait for it are skipped.
+    """
+    pending = list(jobs)
+    results: dict[JobType, JobResult] = {}
+    running: dict[JobType, float] = {}
+    # Timed out jobs whose threads are still going
+    abandoned: set[JobType] = set()
+    finished: queue.Queue[tuple[JobType, JobResult]] = queue.Queue()
+
+    def work(job: JobType) -> None:
+        start = time.perf_counter()
+        try:
+            run_job(job)
+            result = JobResult(job.__name__, "succeeded", time.perf_counter() - start)
+        except Exception as error:
+            result = JobResult(job.__name__, "failed", time.perf_counter() - start, str(error))
+        finished.put((job, result))
+
+    def dependencies(job: JobType) -> list[JobType]:
+        # Dependencies that are not part of this run are assumed to be satisfied
+        return [dependency for dependency in job.depends_on if dependency in jobs]
+
+    def ready(job: JobType) -> bool:
+        return all(dependency in results for dependency in dependencies(job))
+
+    while pending or running:
+        skipped = True
+        while skipped:
+            skipped = False
+            for job in list(pending):
+                failed = [
+                    dependency
+                    for dependency in dependencies(job)
+                    if dependency in results and results[dependency].status != "succeeded"
+                ]
+                if failed:
+                    pending.remove(job)
+                    reason = f"{failed[0].__name__} {results[failed[0]].status}"
+                    results[job] = JobResult(job.__name__, "skipped", 0.0, reason)
+                    skipped = True
+
+        for job in list(pending):
+            if len(running) + len(abandoned) >= max_workers:
+                break
+            locked = {lock_name(other) for other in [*running, *abandoned]}
+            if ready(job) and lock_name(job) not in locked:
+                pending.remove(job)
+                running[job] = time.perf_counter()
+                threading.Thread(target=work, args=(job,), name=job.__name__, daemon=True).start()
+
+        if not running:
+            if pending:
+                # Jobs that could start but for the slot or lock of a timed out job
+                blocked = [job for job in pending if ready(job)]
+                if not blocked:
+                    msg = f"Circular job dependencies: {', '.join(job.__name__ for job in pending)}"
+                    raise ValueError(msg)
+                for job in blocked:
+                    pending.remove(job)
+                    results[job] = JobResult(job.__name__, "skipped", 0.0, "a timed out job is still running")
+                continue
+            break
+
+        wait = None if timeout is None else max(0.0, min(running.values()) + timeout - time.perf_counter())
+        try:
+            job, result = finished.get(timeout=wait)
+            if job in running:
+                del running[job]
+                results[job] = result
+            else:
+                abandoned.discard(job)
+        except queue.Empty:
+            now = time.perf_counter()
+            for job, started in list(running.items()):
+                if now - started >= timeout:
+                    del running[job]
+                    abandoned.add(job)
+                    results[job] = JobResult(job.__name__, "timed_out", now - started, f"exceeded {timeout}s")
+
+    return [results[job] for job in jobs]
+
+
+def lock_name(job: JobType) -> str:
+    """Name shared by jobs that must never run at the same time, the class name unless the job sets one."""
+    return getattr(job, "lock_name", None) or job.__name__
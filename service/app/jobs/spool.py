@@ -0,0 +1,120 @@
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+# File layout: magic, then frames of a length and CRC-32 followed by an orjson payload. The first frame is the
+# header, every following frame one page of rows with the cursor of the page after it, and an empty frame ends the
+# file. Spools are written to a temporary file and renamed when complete, the end frame catches copies cut short.
+MAGIC = b"ETOSSPL1"
+FRAME = struct.Struct("<II")  # payload length, CRC-32 of the payload
+END_FRAME = FRAME.pack(0, 0)
+
+
+class SpoolWriter:
+    """Writes fetched pages of rows to a spool file, which appears at `path` only once it is complete."""
+
+    def __init__(self, path: str | Path, header: dict[str, Any]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.temporary_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        self.file = self.temporary_path.open("wb")
+        self.file.write(MAGIC)
+        self.bytes_written = len(MAGIC)
+        self.write_frame(orjson.dumps(header))
+
+    def write(self, after: str | None, rows: Sequence[Sequence]) -> None:
+        """Append a page of rows; `after` is the cursor of the page following it, None for the last page."""
+        self.write_frame(orjson.dumps([after, rows]))
+
+    def write_frame(self, payload: bytes) -> None:
+        self.file.write(FRAME.pack(len(payload), zlib.crc32(payload)))
+        self.file.write(payload)
+        self.bytes_written += FRAME.size + len(payload)
+
+    def close(self) -> None:
+        """Finish the spool and move it into place, replacing an earlier spool at `path`."""
+        self.file.write(END_FRAME)
+        self.bytes_written += FRAME.size
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.temporary_path.replace(self.path)
+
+    def abort(self) -> None:
+        """Drop the partial spool, leaving an earlier spool at `path` as it was."""
+        self.file.close()
+        self.temporary_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SpoolReader:
+    """Reads a spool file through a read-only memory map; payloads are parsed in place, without copying them."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with self.path.open("rb") as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mapping[: len(MAGIC)] != MAGIC:
+            self.mapping.close()
+            msg = f"Not a spool file: {self.path}"
+            raise ValueError(msg)
+        frames = self.frames()
+        self.header: dict[str, Any] = orjson.loads(next(frames))
+        self._pages = frames
+
+    def pages(self) -> Iterator[tuple[str | None, list[list]]]:
+        """The spooled pages in fetch order, each as the cursor of the page after it and its rows."""
+        for payload in self._pages:
+            after, rows = orjson.loads(payload)
+            yield after, rows
+
+    def frames(self) -> Iterator[memoryview]:
+        view = memoryview(self.mapping)
+        offset = len(MAGIC)
+        try:
+            while True:
+                if offset + FRAME.size > len(view):
+                    msg = f"Spool file {self.path} is truncated"
+                    raise ValueError(msg)
+                length, checksum = FRAME.unpack_from(view, offset)
+                offset += FRAME.size
+                if length == 0:
+                    return
+                with view[offset : offset + length] as payload:
+                    if len(payload) < length or zlib.crc32(payload) != checksum:
+                        msg = f"Spool file {self.path} is corrupt at offset {offset - FRAME.size}"
+                        raise ValueError(msg)
+                    yield payload
+                offset += length
+        finally:
+            # The map cannot be closed while views into it are alive
+            view.release()
+
+    def close(self) -> None:
+        self._pages.close()
+        self.mapping.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def spool_path(checkpoint_path: str, name: str) -> Path:
+    """Where the spool of the feed `name` is kept on the checkpoint volume."""
+    return Path(checkpoint_path) / "spool" / f"{name}.spool"
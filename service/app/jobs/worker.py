@@ -0,0 +1,182 @@
+import asyncio
+import fcntl
+import logging
+import threading
+import time
+from collections.abc import Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.jobs.job import AsyncJob, run_async_job, run_job
+from app.jobs.scheduler import JobResult, JobType, lock_name
+from app.settings import get_jda_settings
+from app.utils_oracle import close_async_oracle_pool
+
+logger = logging.getLogger(__name__)
+
+
+class JobAlreadyRunning(RuntimeError):
+    pass
+
+
+class Worker:
+    """Runs registered jobs in a resident process, on fixed intervals and on demand.
+
+    Imports, the Oracle client, the JDA session pools and the supergraph credential and connections are set up once
+    and stay warm between runs, so a run costs little more than its own work. A job never overlaps with itself or
+    with jobs of the same lock name: not within the worker, and through a file lock on the checkpoint volume not with
+    other workers sharing it either.
+    """
+
+    def __init__(self, jobs: Sequence[JobType], schedule: Mapping[JobType, float], checkpoint_path: str):
+        self.jobs = {job.__name__: job for job in jobs}
+        self.schedule = dict(schedule)
+        self.lock_path = Path(checkpoint_path) / "locks"
+        self.locks: dict[str, threading.Lock] = {}
+        self.running: dict[str, float] = {}
+        self.last_results: dict[str, JobResult] = {}
+        self.next_runs: dict[str, float] = {}
+        self.state_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.threads: list[threading.Thread] = []
+        # Asyncio jobs all run on this loop, so they share its async JDA pool
+        self.loop = asyncio.new_event_loop()
+
+    def start(self) -> None:
+        # The API reads JDA with asyncio in this process, which oracledb only supports in thin mode, and a process
+        # cannot switch modes once a sync job has opened a session
+        if get_jda_settings().jda_thick_mode:
+            msg = "The worker serves the API, whose asyncio JDA sessions need thin mode: set JDA_THICK_MODE=false"
+            raise RuntimeError(msg)
+        threading.Thread(target=self.loop.run_forever, name="worker-asyncio", daemon=True).start()
+        threading.Thread(target=self.serve, name="worker-schedule", daemon=True).start()
+        logger.info(
+            "Worker started",
+            extra={"data": {"schedule": {job.__name__: seconds for job, seconds in self.schedule.items()}}},
+        )
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop scheduling, and wait up to `timeout` seconds for the runs in progress to finish."""
+        self.stopping.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in list(self.threads):
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if self.loop.is_running() and not any(thread.is_alive() for thread in self.threads):
+            # The pool of the worker's loop can only be closed on that loop
+            asyncio.run_coroutine_threadsafe(close_async_oracle_pool(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        logger.info("Worker stopped")
+
+    def serve(self) -> None:
+        """Trigger scheduled jobs at every multiple of their interval, like cron, until stopped."""
+        now = time.time()
+        with self.state_lock:
+            for job, interval in self.schedule.items():
+                self.next_runs[job.__name__] = next_multiple(now, interval)
+        while not self.stopping.is_set():
+            with self.state_lock:
+                due = min(self.next_runs.values(), default=None)
+            if self.stopping.wait(timeout=None if due is None else max(0.0, due - time.time())):
+                return
+            now = time.time()
+            for job, interval in self.schedule.items():
+                if self.next_runs[job.__name__] <= now:
+                    with self.state_lock:
+                        self.next_runs[job.__name__] = next_multiple(now, interval)
+                    if not self.trigger(job.__name__):
+                        logger.warning(f"Skipped scheduled run of {job.__name__}, the previous run is still running")
+
+    def trigger(self, job_name: str) -> bool:
+        """Start a run of `job_name` in the background; False when it, or a job sharing its lock, is running.
+
+        Raises KeyError for jobs that are not registered.
+        """
+        job = self.jobs[job_name]
+        lock = self.job_lock(job)
+        if self.stopping.is_set() or not lock.acquire(blocking=False):
+            return False
+        thread = threading.Thread(target=self.run, args=(job, lock), name=job_name, daemon=True)
+        with self.state_lock:
+            self.running[job_name] = time.time()
+            self.threads = [thread for thread in self.threads if thread.is_alive()] + [thread]
+        thread.start()
+        return True
+
+    def run(self, job: JobType, lock: threading.Lock) -> JobResult:
+        """Run `job` under its locks, which the caller acquired in-process; records and returns the result."""
+        start = time.perf_counter()
+        try:
+            try:
+                with self.file_lock(job):
+                    if issubclass(job, AsyncJob):
+                        asyncio.run_coroutine_threadsafe(run_async_job(job), self.loop).result()
+                    else:
+                        run_job(job)
+                result = JobResult(job.__name__, "succeeded", time.perf_counter() - start)
+            except JobAlreadyRunning as error:
+                result = JobResult(job.__name__, "skipped", time.perf_counter() - start, str(error))
+            except Exception as error:
+                result = JobResult(job.__name__, "failed", time.perf_counter() - start, str(error))
+            with self.state_lock:
+                del self.running[job.__name__]
+                self.last_results[job.__name__] = result
+        finally:
+            lock.release()
+        logger.info(
+            f"{result.name}: {result.status} in {result.seconds:.3f}s" + (f" ({result.error})" if result.error else ""),
+            extra={"data": {"job": result.name, "status": result.status, "seconds": round(result.seconds, 3)}},
+        )
+        return result
+
+    def job_lock(self, job: JobType) -> threading.Lock:
+        with self.state_lock:
+            return self.locks.setdefault(lock_name(job), threading.Lock())
+
+    @contextmanager
+    def file_lock(self, job: JobType) -> Iterator[None]:
+        """Hold the job's lock file on the checkpoint volume, failing fast when another process holds it."""
+        self.lock_path.mkdir(parents=True, exist_ok=True)
+        with (self.lock_path / f"{lock_name(job)}.lock").open("a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                msg = f"{job.__name__} is running in another process"
+                raise JobAlreadyRunning(msg) from None
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def status(self) -> dict[str, dict]:
+        """Per registered job: whether it is running, its next scheduled run and the result of its last run."""
+        with self.state_lock:
+            return {
+                name: {
+                    "running_since": self.running.get(name),
+                    "next_run": self.next_runs.get(name),
+                    "last_result": vars(self.last_results[name]) if name in self.last_results else None,
+                }
+                for name in self.jobs
+            }
+
+
+def next_multiple(now: float, interval: float) -> float:
+    """The first multiple of `interval` seconds since the epoch after `now`, e.g. every quarter past for 900."""
+    return (now // interval + 1) * interval
+
+
+def parse_schedule(entries: Sequence[str] | Mapping[str, float], jobs: Mapping[str, JobType]) -> dict[JobType, float]:
+    """Map "JobName=seconds" entries, or a job name to seconds mapping, onto registered jobs."""
+    if not isinstance(entries, Mapping):
+        pairs = [entry.partition("=")[::2] for entry in entries]
+        entries = {name.strip(): float(seconds) for name, seconds in pairs}
+    schedule = {}
+    for name, seconds in entries.items():
+        if name not in jobs:
+            msg = f"Invalid job name in schedule: {name}"
+            raise ValueError(msg)
+        if seconds <= 0:
+            msg = f"Invalid interval for {name}: {seconds}"
+            raise ValueError(msg)
+        schedule[jobs[name]] = seconds
+    return schedule
@@ -1,7 +1,8 @@
 from app.glogger import setup_glogger
-from app.settings import settings
+from app.settings import get_settings
 
 if __name__ == "__main__":
+    settings = get_settings()
     setup_glogger(
         app_name=settings.app_name,
         environment=settings.environment,
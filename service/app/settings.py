@@ -1,28 +1,34 @@
-import time
-import os
-from azure.identity import DefaultAzureCredential
-from dotenv import load_dotenv, find_dotenv
+from functools import cache
+from typing import Literal
+
+from dotenv import find_dotenv
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-DOTENV = "C:/Users/pnl1aa3e/Documents/Git/etos-jda-store-service/service/default.env"
-print("******************************")
-
-
-load_dotenv(DOTENV)
+# Settings are resolved on first use, not at import, so importing the CLI or running --help never reads dotenv
+# files, secrets or Azure credentials
 
 
-print(DOTENV)
-
-print("******************************")
 class Settings(BaseSettings):
     app_name: str = "etos-jda-connector"
+    application_version: str = "local"
     environment: str = "dev"
     disable_json_logs: bool = False
     log_level: str = "INFO"
+    checkpoint_path: str = "/mnt/checkpoints/checkpoint"
+    # Continue an interrupted run after its last committed page instead of starting over from the watermark
+    resume_interrupted_runs: bool = True
+    # Seconds the API serves JDA query results from its cache
+    api_cache_ttl: float = 30.0
+    # Prometheus export of job metrics: a textfile collector directory and/or a pushgateway, both off by default
+    metrics_path: str | None = None
+    metrics_pushgateway_url: str | None = None
+    # Jobs the `worker` command runs, by name, every so many seconds, e.g. WORKER_SCHEDULE='{"LoadStores": 900}'
+    worker_schedule: dict[str, float] = {}
+    # Bearer token the API requires to trigger worker jobs; triggering is disabled when unset
+    worker_trigger_token: SecretStr | None = None
 
     model_config = SettingsConfigDict(
-        env_file=find_dotenv(),
         extra="ignore",
         env_file_encoding="utf-8"
     )
@@ -31,45 +37,61 @@ class JDASettings(BaseSettings):
     jda_database_user: str
     jda_database_password: SecretStr
     jda_database_connection_string_dns: SecretStr
+    # Rows per array DML batch to start with; batches then adapt between the bounds, aiming at the target latency.
+    # Equal bounds fix the size.
+    jda_batch_size: int = 1000
+    jda_batch_size_min: int = 100
+    jda_batch_size_max: int = 10000
+    jda_batch_target_seconds: float = 1.0
+    jda_pool_min: int = 1
+    jda_pool_max: int = 4
+    jda_pool_increment: int = 1
+    # oracledb only runs asyncio in thin mode: the worker refuses to start in thick mode, and run-all with asyncio jobs
+    # switches to thin mode
+    jda_thick_mode: bool = True
+    # "append" inserts every changed store into the inbound table, "merge" upserts them through a staging table
+    jda_persist_mode: Literal["append", "merge"] = "append"
+    # Sessions LoadStores persists over in parallel; shard sessions come from the pool, next to the job's own, and
+    # the pool grows beyond JDA_POOL_MAX when needed to hold them all
+    jda_persist_parallelism: int = 1
     user: str = "CSG"
 
     model_config = SettingsConfigDict(
-        env_file=find_dotenv(),
         extra="ignore",
         env_file_encoding="utf-8"
-    )    
+    )
 
 class GraphQLSettings(BaseSettings):
     supergraph_spn: str
     supergraph_url: str
-    access_token: str | None = None
-    access_expires_on: int | None = None
+    supergraph_page_size: int = 1000
+    supergraph_http2: bool = True
+    supergraph_connect_timeout: float = 5.0
+    supergraph_read_timeout: float = 60.0
+    supergraph_max_retries: int = 4
+    supergraph_persisted_queries: bool = True
     model_config = SettingsConfigDict(
-        env_file=find_dotenv(),
         extra="ignore",
         env_file_encoding="utf-8"
     )
 
-    def refresh_token(self):
-        """Refresh the access token."""
-        credential = DefaultAzureCredential()
-        token = credential.get_token(f"{self.supergraph_spn}/.default")
-        self.access_token = token.token
-        self.access_expires_on = token.expires_on
-
-    @property
-    def authorization_header(self) -> dict[str, str]:
-        if self.access_token is None or self.access_expires_on is None or self.access_expires_on < time.time() - 60:
-            self.refresh_token()
-        return {
-            "Authorization": f"Bearer {self.access_token}"
-        }
-
-settings=Settings()
-dba_settings = JDASettings()
-graphql_settings = GraphQLSettings()
-# Print settings to verify they are loaded correctly
-print(settings)
-print(dba_settings)
-print(graphql_settings)
 
+@cache
+def env_file() -> str:
+    """Path of the nearest .env file, or an empty string when there is none."""
+    return find_dotenv()
+
+
+@cache
+def get_settings() -> Settings:
+    return Settings(_env_file=env_file() or None)
+
+
+@cache
+def get_jda_settings() -> JDASettings:
+    return JDASettings(_env_file=env_file() or None)
+
+
+@cache
+def get_graphql_settings() -> GraphQLSettings:
+    return GraphQLSettings(_env_file=env_file() or None)
@@ -0,0 +1,354 @@
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from functools import cache
+
+import httpx
+
+from app.settings import get_graphql_settings
+
+logger = logging.getLogger(__name__)
+
+
+class SupergraphAuth(httpx.Auth):
+    """Bearer token auth for supergraph requests.
+
+    One credential is reused for the lifetime of the process and the token is refreshed on a background timer
+    `refresh_margin` seconds before it expires, so requests only wait for a token when there is no valid one yet.
+    Works with both httpx.Client and httpx.AsyncClient.
+    """
+
+    def __init__(self, scope: str, credential=None, refresh_margin: float = 300, retry_interval: float = 30):
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self._credential = credential
+        self._token: str | None = None
+        self._expires_on: float = 0
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+
+    def auth_flow(self, request: httpx.Request) -> Generator[httpx.Request, httpx.Response, None]:
+        request.headers["Authorization"] = f"Bearer {self.token()}"
+        yield request
+
+    def token(self) -> str:
+        """Return a valid access token, only fetching one inline when none is valid."""
+        if self._token is None or self._expires_on <= time.time() + 60:
+            with self._lock:
+                if self._token is None or self._expires_on <= time.time() + 60:
+                    self._refresh()
+        return self._token
+
+    def close(self) -> None:
+        """Stop background refreshes."""
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _refresh(self) -> None:
+        if self._credential is None:
+            from azure.identity import DefaultAzureCredential
+
+            self._credential = DefaultAzureCredential()
+        access_token = self._credential.get_token(self.scope)
+        self._token, self._expires_on = access_token.token, access_token.expires_on
+        # A token issued with less than `refresh_margin` left, e.g. a cached one, must not make the timer spin
+        self._schedule(max(self._expires_on - self.refresh_margin - time.time(), self.retry_interval))
+
+    def _refresh_in_background(self) -> None:
+        try:
+            with self._lock:
+                self._refresh()
+        except Exception as error:
+            # The current token may still be valid for a while; try again shortly
+            logger.warning(f"Refreshing supergraph token failed: {error}")
+            self._schedule(self.retry_interval)
+
+    def _schedule(self, delay: float) -> None:
+        self.close()
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+@cache
+def get_supergraph_auth() -> SupergraphAuth:
+    """Process wide supergraph auth, shared by all supergraph clients."""
+    return SupergraphAuth(scope=f"{get_graphql_settings().supergraph_spn}/.default")
+
+
+# Responses worth retrying: rate limiting and gateway errors in front of the supergraph
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+
+@dataclass
+class SupergraphMetrics:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def observe(self, seconds: float, failed: bool = False) -> None:
+        with self.lock:
+            self.requests += 1
+            self.failures += failed
+            self.seconds += seconds
+
+    def retried(self) -> None:
+        with self.lock:
+            self.retries += 1
+
+    def as_dict(self) -> dict[str, int | float]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "seconds": round(self.seconds, 6),
+            }
+
+
+supergraph_metrics = SupergraphMetrics()
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Retry idempotent supergraph requests on gateway errors, rate limiting and network failures.
+
+    GET and HEAD are always idempotent; a POST, i.e. a GraphQL operation, is only retried when it is sent with
+    `extensions={"idempotent": True}`, so mutations are never repeated. Waits for `Retry-After` when the server
+    sends it, otherwise for an exponential backoff with full jitter. Each attempt is recorded in `metrics`.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, max_retries: int, metrics: SupergraphMetrics, owned: bool = True):
+        self.transport = transport
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.owned = owned
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as error:
+                self.metrics.observe(time.perf_counter() - start, failed=True)
+                if not should_retry(request, attempt, self.max_retries):
+                    raise
+                delay = backoff_delay(attempt)
+                reason = repr(error)
+            else:
+                self.metrics.observe(time.perf_counter() - start, failed=response.status_code >= 400)
+                if response.status_code not in RETRY_STATUS_CODES or not should_retry(request, attempt, self.max_retries):
+                    return response
+                delay = retry_after(response) or backoff_delay(attempt)
+                reason = f"HTTP {response.status_code}"
+                response.close()
+            log_retry(request, attempt, delay, reason)
+            self.metrics.retried()
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self) -> None:
+        if self.owned:
+            self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """Asyncio counterpart of RetryTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_retries: int, metrics: SupergraphMetrics):
+        self.transport = transport
+        self.max_retries = max_retries
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError as error:
+                self.metrics.observe(time.perf_counter() - start, failed=True)
+                if not should_retry(request, attempt, self.max_retries):
+                    raise
+                delay = backoff_delay(attempt)
+                reason = repr(error)
+            else:
+                self.metrics.observe(time.perf_counter() - start, failed=response.status_code >= 400)
+                if response.status_code not in RETRY_STATUS_CODES or not should_retry(request, attempt, self.max_retries):
+                    return response
+                delay = retry_after(response) or backoff_delay(attempt)
+                reason = f"HTTP {response.status_code}"
+                await response.aclose()
+            log_retry(request, attempt, delay, reason)
+            self.metrics.retried()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def should_retry(request: httpx.Request, attempt: int, max_retries: int) -> bool:
+    idempotent = request.method in ("GET", "HEAD") or request.extensions.get("idempotent", False)
+    return idempotent and attempt < max_retries
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def retry_after(response: httpx.Response, cap: float = 120.0) -> float | None:
+    """Seconds to wait according to a Retry-After header, in seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), cap)
+
+
+def log_retry(request: httpx.Request, attempt: int, delay: float, reason: str) -> None:
+    logger.warning(
+        f"Supergraph request failed ({reason}), retry {attempt + 1} in {delay:.1f}s",
+        extra={"data": {"url": str(request.url), "attempt": attempt + 1, "delay": round(delay, 3), "reason": reason}},
+    )
+
+
+def supergraph_http2() -> bool:
+    """Whether to negotiate HTTP/2 with the supergraph."""
+    return get_graphql_settings().supergraph_http2
+
+
+def supergraph_timeout() -> httpx.Timeout:
+    settings = get_graphql_settings()
+    return httpx.Timeout(settings.supergraph_read_timeout, connect=settings.supergraph_connect_timeout)
+
+
+def supergraph_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=60)
+
+
+@cache
+def get_supergraph_transport() -> RetryTransport:
+    """Process wide transport, so connections to the supergraph are kept alive across clients and jobs."""
+    return RetryTransport(
+        httpx.HTTPTransport(http2=supergraph_http2(), limits=supergraph_limits()),
+        max_retries=get_graphql_settings().supergraph_max_retries,
+        metrics=supergraph_metrics,
+        owned=False,
+    )
+
+
+def create_supergraph_client() -> httpx.Client:
+    """Supergraph client on the shared transport; gzip and brotli responses are decoded by httpx."""
+    return httpx.Client(
+        base_url=get_graphql_settings().supergraph_url,
+        auth=get_supergraph_auth(),
+        transport=get_supergraph_transport(),
+        timeout=supergraph_timeout(),
+    )
+
+
+def create_async_supergraph_client() -> httpx.AsyncClient:
+    """Asyncio supergraph client; its connections belong to the running event loop, so it has its own transport."""
+    return httpx.AsyncClient(
+        base_url=get_graphql_settings().supergraph_url,
+        auth=get_supergraph_auth(),
+        transport=AsyncRetryTransport(
+            httpx.AsyncHTTPTransport(http2=supergraph_http2(), limits=supergraph_limits()),
+            max_retries=get_graphql_settings().supergraph_max_retries,
+            metrics=supergraph_metrics,
+        ),
+        timeout=supergraph_timeout(),
+    )
+
+
+def selection_set(paths: Iterable[str], indent: str = "") -> str:
+    """GraphQL selection set for dotted field paths, e.g. ["id", "address.city_name"]."""
+    tree: dict = {}
+    for path in paths:
+        node = tree
+        for name in path.split("."):
+            node = node.setdefault(name, {})
+
+    def render(node: dict, depth: int) -> list[str]:
+        lines = []
+        for name, children in node.items():
+            if children:
+                lines.append(f"{indent}{'  ' * depth}{name} {{")
+                lines.extend(render(children, depth + 1))
+                lines.append(f"{indent}{'  ' * depth}}}")
+            else:
+                lines.append(f"{indent}{'  ' * depth}{name}")
+        return lines
+
+    return "{\n" + "\n".join(render(tree, 1)) + f"\n{indent}}}"
+
+
+class PersistedQuery:
+    """GraphQL query sent as an Apollo automatic persisted query.
+
+    Requests carry only the SHA-256 of the query; when the supergraph does not know the hash yet it answers
+    PersistedQueryNotFound and the query is sent once more with its text, which registers it. If the supergraph
+    does not support persisted queries at all, the full text is sent from then on.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.sha256 = hashlib.sha256(query.encode()).hexdigest()
+        self._supported: bool | None = None
+
+    @property
+    def supported(self) -> bool:
+        if self._supported is None:
+            self._supported = get_graphql_settings().supergraph_persisted_queries
+        return self._supported
+
+    @supported.setter
+    def supported(self, value: bool) -> None:
+        self._supported = value
+
+    def payload(self, variables: dict, with_query: bool) -> dict:
+        payload = {"variables": variables}
+        if self.supported:
+            payload["extensions"] = {"persistedQuery": {"version": 1, "sha256Hash": self.sha256}}
+        if with_query or not self.supported:
+            payload["query"] = self.query
+        return payload
+
+    def needs_query(self, response: httpx.Response) -> bool:
+        """Whether `response` asks for the query text; cheap byte checks, no parsing of successful responses."""
+        if not self.supported or response.status_code not in (200, 400) or b'"errors"' not in response.content:
+            return False
+        if b"PersistedQueryNotSupported" in response.content or b"PERSISTED_QUERY_NOT_SUPPORTED" in response.content:
+            logger.info("Supergraph does not support persisted queries, sending full query text")
+            self.supported = False
+            return True
+        return b"PersistedQueryNotFound" in response.content or b"PERSISTED_QUERY_NOT_FOUND" in response.content
+
+    def post(self, client: httpx.Client, variables: dict, **kwargs) -> httpx.Response:
+        response = client.post(url="", json=self.payload(variables, with_query=False), **kwargs)
+        if self.needs_query(response):
+            response = client.post(url="", json=self.payload(variables, with_query=True), **kwargs)
+        return response
+
+    async def post_async(self, client: httpx.AsyncClient, variables: dict, **kwargs) -> httpx.Response:
+        response = await client.post(url="", json=self.payload(variables, with_query=False), **kwargs)
+        if self.needs_query(response):
+            response = await client.post(url="", json=self.payload(variables, with_query=True), **kwargs)
+        return response
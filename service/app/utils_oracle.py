@@ -1,20 +1,425 @@
+import asyncio
 import logging
+import threading
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from itertools import batched, islice
 
 import oracledb
 
-from app.settings import JDASettings
-
-jda_settings = JDASettings()
+from app.settings import get_jda_settings
 
 logger = logging.getLogger(__name__)
 
+_pool: oracledb.ConnectionPool | None = None
+# Asyncio pools are bound to the event loop that created them, so every loop gets its own
+_async_pools: dict[asyncio.AbstractEventLoop, oracledb.AsyncConnectionPool] = {}
+_pool_lock = threading.Lock()
+_client_initialized = False
+_acquire_count = 0
+_acquire_wait_seconds = 0.0
+
+
+@dataclass
+class RejectedRow:
+    offset: int
+    message: str
+    # The bind row the database rejected
+    row: Sequence = ()
+
+
+class AdaptiveBatchSize:
+    """Array DML batch size that follows how fast JDA takes batches, within [`minimum`, `maximum`] rows.
+
+    After each full batch the size grows by `growth` while batches finish within half of `target_seconds` and rows
+    per second keep up, and halves when a batch takes longer than `target_seconds`. If growing cost throughput, the
+    previous size is restored. When even minimum sized batches overrun the target, JDA is falling behind and
+    `backpressure` tells the fetch how long to hold off. Thread safe, so parallel shards share one controller.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_seconds: float, growth: float = 1.5):
+        self.minimum, self.maximum = minimum, max(minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.target_seconds = target_seconds
+        self.growth = growth
+        self.lock = threading.Lock()
+        self.grown_from: tuple[int, float] | None = None  # size and rows per second before the last growth
+        self.behind_seconds = 0.0
+        self.backpressure_seconds = 0.0
+        self.decisions: Counter[str] = Counter()
+
+    @property
+    def adaptive(self) -> bool:
+        return self.minimum < self.maximum
+
+    def observe(self, rows: int, seconds: float) -> None:
+        """Adjust the size after a batch of `rows` took `seconds`."""
+        if not self.adaptive:
+            return
+        rows_per_second = rows / seconds if seconds > 0 else float("inf")
+        with self.lock:
+            previous = self.size
+            if seconds > self.target_seconds:
+                decision = "shrink"
+                self.size = max(self.minimum, self.size // 2)
+                # Even the smallest batches overrun: the database is falling behind
+                self.behind_seconds = seconds - self.target_seconds if previous == self.minimum else 0.0
+                self.grown_from = None
+            elif rows < self.size:
+                # The tail of a load says little about larger batches
+                return
+            elif self.grown_from is not None and rows_per_second < self.grown_from[1] * 0.9:
+                decision = "revert"
+                self.size, self.grown_from = self.grown_from[0], None
+                self.behind_seconds = 0.0
+            elif seconds < self.target_seconds / 2 and self.size < self.maximum:
+                decision = "grow"
+                self.grown_from = (self.size, rows_per_second)
+                self.size = min(self.maximum, max(self.size + 1, int(self.size * self.growth)))
+                self.behind_seconds = 0.0
+            else:
+                self.behind_seconds = 0.0
+                return
+            self.decisions[decision] += 1
+            size, behind_seconds = self.size, self.behind_seconds
+        if size != previous or behind_seconds:
+            logger.info(
+                f"JDA batch size {previous} -> {size} ({decision})",
+                extra={
+                    "data": {
+                        "decision": decision,
+                        "batch_size": size,
+                        "previous_batch_size": previous,
+                        "rows": rows,
+                        "seconds": round(seconds, 4),
+                        "rows_per_second": round(rows_per_second),
+                        "behind_seconds": round(behind_seconds, 4),
+                    }
+                },
+            )
+
+    def backpressure(self, cap: float = 30.0) -> float:
+        """Seconds an upstream fetch should wait before fetching more, 0 unless JDA is falling behind."""
+        with self.lock:
+            delay = min(self.behind_seconds, cap)
+            self.backpressure_seconds += delay
+        if delay:
+            logger.info(
+                f"JDA is falling behind, holding off the fetch for {delay:.2f}s",
+                extra={"data": {"decision": "backpressure", "seconds": round(delay, 4), "batch_size": self.size}},
+            )
+        return delay
+
+    def batches(self, rows: Iterable[Sequence]) -> Iterator[list]:
+        """Split `rows` into batches of the current size, which may change between batches."""
+        iterator = iter(rows)
+        while batch := list(islice(iterator, self.size)):
+            yield batch
+
+
+def adaptive_batch_size() -> AdaptiveBatchSize:
+    """Batch size controller configured by the JDA_BATCH_* settings; equal bounds give a fixed size."""
+    jda_settings = get_jda_settings()
+    return AdaptiveBatchSize(
+        initial=jda_settings.jda_batch_size,
+        minimum=jda_settings.jda_batch_size_min,
+        maximum=jda_settings.jda_batch_size_max,
+        target_seconds=jda_settings.jda_batch_target_seconds,
+    )
+
+
+@dataclass
+class BulkInsertResult:
+    inserted: int = 0
+    rejected: list[RejectedRow] = field(default_factory=list)
+    # Rows inserted or updated by the MERGE of a bulk_merge
+    merged: int = 0
+
+
+def init_oracle_client() -> None:
+    """Initialize the Oracle thick client, at most once per process, unless thin mode is configured."""
+    global _client_initialized
+    with _pool_lock:
+        if not _client_initialized and get_jda_settings().jda_thick_mode:
+            oracledb.init_oracle_client()
+            _client_initialized = True
+
+
+def get_oracle_pool() -> oracledb.ConnectionPool:
+    """Return the process wide JDA session pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        init_oracle_client()
+        with _pool_lock:
+            if _pool is None:
+                logger.info("Create JDA connection pool")
+                jda_settings = get_jda_settings()
+                _pool = oracledb.create_pool(
+                    user=jda_settings.jda_database_user,
+                    password=jda_settings.jda_database_password.get_secret_value(),
+                    dsn=jda_settings.jda_database_connection_string_dns.get_secret_value(),
+                    min=jda_settings.jda_pool_min,
+                    max=oracle_pool_max(),
+                    increment=jda_settings.jda_pool_increment,
+                    getmode=oracledb.POOL_GETMODE_WAIT,
+                )
+    return _pool
+
+
+def oracle_pool_max() -> int:
+    """Sessions the pool may open: JDA_POOL_MAX, raised so that every parallel shard gets a session next to the job's."""
+    jda_settings = get_jda_settings()
+    return max(jda_settings.jda_pool_max, jda_settings.jda_persist_parallelism + 1)
+
+
+@contextmanager
+def oracle_connection() -> Iterator[oracledb.Connection]:
+    """Check out a pooled JDA session, releasing it back to the pool on exit."""
+    global _acquire_count, _acquire_wait_seconds
+    pool = get_oracle_pool()
+    start = time.perf_counter()
+    connection = pool.acquire()
+    with _pool_lock:
+        _acquire_count += 1
+        _acquire_wait_seconds += time.perf_counter() - start
+    try:
+        yield connection
+    finally:
+        pool.release(connection)
+
+
+def get_async_oracle_pool() -> oracledb.AsyncConnectionPool:
+    """Return the asyncio JDA session pool of the running event loop, creating it on first use.
+
+    oracledb only supports asyncio in thin mode, so this pool cannot be used in a process that initialized the
+    thick client (set JDA_THICK_MODE=false to run sync and async jobs side by side).
+    """
+    if _client_initialized:
+        msg = "Async JDA sessions need thin mode, but this process initialized the thick client (JDA_THICK_MODE)"
+        raise RuntimeError(msg)
+    loop = asyncio.get_running_loop()
+    with _pool_lock:
+        if loop not in _async_pools:
+            logger.info("Create async JDA connection pool")
+            jda_settings = get_jda_settings()
+            _async_pools[loop] = oracledb.create_pool_async(
+                user=jda_settings.jda_database_user,
+                password=jda_settings.jda_database_password.get_secret_value(),
+                dsn=jda_settings.jda_database_connection_string_dns.get_secret_value(),
+                min=jda_settings.jda_pool_min,
+                max=jda_settings.jda_pool_max,
+                increment=jda_settings.jda_pool_increment,
+                getmode=oracledb.POOL_GETMODE_WAIT,
+            )
+        return _async_pools[loop]
+
+
+@asynccontextmanager
+async def async_oracle_connection() -> AsyncIterator[oracledb.AsyncConnection]:
+    """Check out a pooled asyncio JDA session, releasing it back to the pool on exit."""
+    global _acquire_count, _acquire_wait_seconds
+    pool = get_async_oracle_pool()
+    start = time.perf_counter()
+    connection = await pool.acquire()
+    _acquire_count += 1
+    _acquire_wait_seconds += time.perf_counter() - start
+    try:
+        yield connection
+    finally:
+        await pool.release(connection)
+
+
+def oracle_pool_statistics() -> dict[str, int | float]:
+    """Pool usage for monitoring; all zero until the pool is first used."""
+    with _pool_lock:
+        pools = [pool for pool in (_pool, *_async_pools.values()) if pool is not None]
+    return {
+        "opened": sum(pool.opened for pool in pools),
+        "busy": sum(pool.busy for pool in pools),
+        "min": get_jda_settings().jda_pool_min,
+        "max": oracle_pool_max(),
+        "acquired": _acquire_count,
+        "wait_seconds": round(_acquire_wait_seconds, 6),
+    }
+
+
+def close_oracle_pool() -> None:
+    """Close the session pool, e.g. on application shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+async def close_async_oracle_pool() -> None:
+    """Close the asyncio session pool of the running event loop, e.g. on application shutdown."""
+    with _pool_lock:
+        pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def bulk_insert(
+    connection: oracledb.Connection,
+    statement: str,
+    rows: Iterable[Sequence],
+    input_sizes: Sequence,
+    batch_size: int | AdaptiveBatchSize,
+) -> BulkInsertResult:
+    """Insert rows with array DML, one executemany round trip per batch.
+
+    Rows rejected by the database are collected per batch instead of failing the load; committing is left to the
+    caller.
+    """
+    result = BulkInsertResult()
+    controller = batch_size if isinstance(batch_size, AdaptiveBatchSize) else None
+    offset = 0
+    with connection.cursor() as cursor:
+        for batch_number, batch in enumerate(split_batches(rows, batch_size)):
+            start = time.perf_counter()
+            cursor.setinputsizes(*input_sizes)
+            cursor.executemany(statement, batch, batcherrors=True)
+            if controller is not None:
+                controller.observe(len(batch), time.perf_counter() - start)
+            collect_batch_errors(result, batch_number, offset, batch, cursor.getbatcherrors())
+            offset += len(batch)
+    return result
+
+
+async def async_bulk_insert(
+    connection: oracledb.AsyncConnection,
+    statement: str,
+    rows: Iterable[Sequence],
+    input_sizes: Sequence,
+    batch_size: int | AdaptiveBatchSize,
+) -> BulkInsertResult:
+    """Asyncio counterpart of bulk_insert."""
+    result = BulkInsertResult()
+    controller = batch_size if isinstance(batch_size, AdaptiveBatchSize) else None
+    offset = 0
+    with connection.cursor() as cursor:
+        for batch_number, batch in enumerate(split_batches(rows, batch_size)):
+            start = time.perf_counter()
+            cursor.setinputsizes(*input_sizes)
+            await cursor.executemany(statement, batch, batcherrors=True)
+            if controller is not None:
+                controller.observe(len(batch), time.perf_counter() - start)
+            collect_batch_errors(result, batch_number, offset, batch, cursor.getbatcherrors())
+            offset += len(batch)
+    return result
+
+
+def bulk_merge(
+    connection: oracledb.Connection,
+    stage_statement: str,
+    merge_statement: str,
+    rows: Iterable[Sequence],
+    input_sizes: Sequence,
+    batch_size: int | AdaptiveBatchSize,
+) -> BulkInsertResult:
+    """Load rows into a staging table with array DML, then apply them with one set-based MERGE.
+
+    The staging table is expected to be a global temporary table that empties on commit; committing is left to the
+    caller. `inserted` counts the staged rows, `merged` the rows the MERGE inserted or updated.
+    """
+    result = bulk_insert(connection, stage_statement, rows, input_sizes, batch_size)
+    with connection.cursor() as cursor:
+        cursor.execute(merge_statement)
+        result.merged = cursor.rowcount
+    return result
+
+
+async def async_bulk_merge(
+    connection: oracledb.AsyncConnection,
+    stage_statement: str,
+    merge_statement: str,
+    rows: Iterable[Sequence],
+    input_sizes: Sequence,
+    batch_size: int | AdaptiveBatchSize,
+) -> BulkInsertResult:
+    """Asyncio counterpart of bulk_merge."""
+    result = await async_bulk_insert(connection, stage_statement, rows, input_sizes, batch_size)
+    with connection.cursor() as cursor:
+        await cursor.execute(merge_statement)
+        result.merged = cursor.rowcount
+    return result
+
+
+# Character widths of a table's string columns, from the data dictionary
+COLUMN_WIDTHS_QUERY = """
+    SELECT LOWER(column_name), char_length
+      FROM all_tab_columns
+     WHERE owner = UPPER(:owner)
+       AND table_name = UPPER(:table_name)
+       AND data_type IN ('VARCHAR2', 'NVARCHAR2', 'CHAR', 'NCHAR')
+"""
+
+
+def column_widths(connection: oracledb.Connection, table: str) -> dict[str, int]:
+    """Maximum characters of each string column of `table` ("owner.table"), by lower case column name."""
+    owner, table_name = table.split(".")
+    with connection.cursor() as cursor:
+        cursor.execute(COLUMN_WIDTHS_QUERY, {"owner": owner, "table_name": table_name})
+        return dict(cursor.fetchall())
+
+
+async def async_column_widths(connection: oracledb.AsyncConnection, table: str) -> dict[str, int]:
+    """Asyncio counterpart of column_widths."""
+    owner, table_name = table.split(".")
+    with connection.cursor() as cursor:
+        await cursor.execute(COLUMN_WIDTHS_QUERY, {"owner": owner, "table_name": table_name})
+        return dict(await cursor.fetchall())
+
+
+TABLE_EXISTS_QUERY = """
+    SELECT COUNT(*)
+      FROM all_tables
+     WHERE owner = UPPER(:owner)
+       AND table_name = UPPER(:table_name)
+"""
+
+
+def table_exists(connection: oracledb.Connection, table: str) -> bool:
+    """Whether `table` ("owner.table") exists and is visible to the session."""
+    owner, table_name = table.split(".")
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_EXISTS_QUERY, {"owner": owner, "table_name": table_name})
+        return cursor.fetchone()[0] > 0
+
+
+async def async_table_exists(connection: oracledb.AsyncConnection, table: str) -> bool:
+    """Asyncio counterpart of table_exists."""
+    owner, table_name = table.split(".")
+    with connection.cursor() as cursor:
+        await cursor.execute(TABLE_EXISTS_QUERY, {"owner": owner, "table_name": table_name})
+        return (await cursor.fetchone())[0] > 0
+
+
+def split_batches(rows: Iterable[Sequence], batch_size: int | AdaptiveBatchSize) -> Iterator[list]:
+    if isinstance(batch_size, AdaptiveBatchSize):
+        return batch_size.batches(rows)
+    return (list(batch) for batch in batched(rows, batch_size))
+
 
-def create_oracle_connection() -> oracledb.Connection:
-    """Create oracle connection."""
-    logger.info("Connect to JDA database")
-    oracledb.init_oracle_client()
-    return oracledb.connect(
-        user=jda_settings.jda_database_user,
-        password=jda_settings.jda_database_password.get_secret_value(),
-        dsn=jda_settings.jda_database_connection_string_dns.get_secret_value(),
+def collect_batch_errors(
+    result: BulkInsertResult, batch_number: int, batch_offset: int, batch: list, errors: list
+) -> None:
+    """Add the outcome of one executemany batch, starting at row `batch_offset`, to `result`, logging rejected rows."""
+    result.inserted += len(batch) - len(errors)
+    result.rejected.extend(
+        RejectedRow(batch_offset + error.offset, error.message, batch[error.offset]) for error in errors
     )
+    if errors:
+        logger.warning(
+            f"Batch {batch_number} rejected {len(errors)} of {len(batch)} rows",
+            extra={
+                "data": {
+                    "batch": batch_number,
+                    "rejected": [{"offset": batch_offset + error.offset, "error": error.message} for error in errors],
+                }
+            },
+        )
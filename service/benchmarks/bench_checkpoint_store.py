@@ -0,0 +1,46 @@
+"""Checkpoint store costs as the number of fingerprints grows.
+
+    python -m benchmarks.bench_checkpoint_store --keys 100000 --keys 300000
+"""
+
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+from app.jobs.checkpoint_store import CheckpointStore
+
+
+def main(keys: Annotated[list[int] | None, typer.Option(help="Numbers of fingerprint keys")] = None) -> None:
+    for count in keys or [100_000, 300_000]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "checkpoints.bin"
+            fingerprints = {f"load_stores_fingerprints/{key}": b"%032x" % key for key in range(count)}
+
+            start = time.perf_counter()
+            CheckpointStore(path).update(fingerprints | {"load_stores_last_update_time": b"2024-01-01 00:00:00"})
+            write_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            CheckpointStore(path).get("load_stores_last_update_time")
+            get_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            CheckpointStore(path).update({"load_stores_last_update_time": b"2024-01-02 00:00:00"})
+            update_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            loaded = dict(CheckpointStore(path).items("load_stores_fingerprints/"))
+            items_seconds = time.perf_counter() - start
+
+            print(
+                f"{count:>7} keys, {path.stat().st_size / 1024 / 1024:.1f} MB: write all {write_seconds:.3f}s, "
+                f"read watermark {get_seconds * 1000:.2f}ms, update watermark {update_seconds:.3f}s, "
+                f"load {len(loaded)} fingerprints {items_seconds:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,63 @@
+"""Measure CLI cold start: importing main.py and running --help, as a CronJob pod does on every run.
+
+    python -m benchmarks.bench_import_time --runs 10
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+SERVICE_DIR = Path(__file__).parents[1]
+
+
+def measure(code: str, runs: int) -> float:
+    """Median wall time in seconds of running `code` in a fresh interpreter."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=SERVICE_DIR, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def slowest_imports(limit: int) -> list[tuple[int, str]]:
+    """Modules imported by main.py (two levels deep) by cumulative import time in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVICE_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        # `python -X importtime` indents nested imports by two spaces per level
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        if 1 <= depth <= 2:
+            timings.append((int(cumulative), module.strip()))
+    return sorted(timings, reverse=True)[:limit]
+
+
+def main(runs: Annotated[int, typer.Option(help="Interpreter starts per measurement")] = 10) -> None:
+    baseline = measure("pass", runs)
+    imported = measure("import main", runs)
+    helped = measure("import sys; sys.argv = ['main', '--help']; import main; main.main()", runs)
+
+    print(f"interpreter start: {baseline * 1000:.0f} ms")
+    print(f"import main:       {(imported - baseline) * 1000:.0f} ms")
+    print(f"main --help:       {(helped - baseline) * 1000:.0f} ms")
+    print("slowest imports (cumulative):")
+    for cumulative, module in slowest_imports(limit=10):
+        print(f"  {cumulative / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,110 @@
+"""End-to-end LoadStores throughput against the local stand-ins, with baselines to catch regressions.
+
+Each size runs in a fresh process, so peak RSS is that of a single load:
+
+    python -m benchmarks.bench_load_stores --counts 1000 --counts 10000 --counts 100000
+    python -m benchmarks.bench_load_stores --check             # exit 1 when slower or bigger than the baselines
+    python -m benchmarks.bench_load_stores --update-baseline   # record this machine's results as the baselines
+
+Stage timings come from the job's metrics and overlap: fetch and decode run in a background thread while the main
+thread filters (transform) and persists the previous page.
+"""
+
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Annotated
+
+import orjson
+import typer
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+BASELINES_KEY = "load_stores"
+
+# Settings the job reads but the stand-ins make irrelevant
+os.environ.setdefault("JDA_DATABASE_USER", "INTOWNER")
+os.environ.setdefault("JDA_DATABASE_PASSWORD", "unused")
+os.environ.setdefault("JDA_DATABASE_CONNECTION_STRING_DNS", "localhost:1521/JDA")
+os.environ.setdefault("SUPERGRAPH_SPN", "api://supergraph")
+os.environ.setdefault("SUPERGRAPH_URL", "http://127.0.0.1/graphql")
+
+
+def load_stores(supergraph_url: str, count: int) -> dict:
+    """Run LoadStores once against the stand-ins; runs in a child process."""
+    from app.jobs.job_get_stores import LoadStores
+    from app.settings import get_settings
+    from benchmarks.standins import SQLiteJDA, standins
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        get_settings().checkpoint_path = f"{checkpoint_dir}/checkpoint"
+        jda = SQLiteJDA()
+        with standins(supergraph_url, jda):
+            start = time.perf_counter()
+            with LoadStores() as job:
+                job.run()
+            seconds = time.perf_counter() - start
+            stage_seconds = job.metrics.as_dict()["stage_seconds"]
+        rows = jda.count()
+
+    if rows != count:
+        msg = f"Expected {count} stores in the stand-in JDA, found {rows}"
+        raise RuntimeError(msg)
+    return {
+        "stores": count,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(count / seconds),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stage_seconds": {stage: round(value, 3) for stage, value in stage_seconds.items() if stage != "task"},
+    }
+
+
+def regressions(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Ways in which `result` is worse than `baseline` by more than `tolerance`."""
+    found = []
+    if result["rows_per_second"] < baseline["rows_per_second"] * (1 - tolerance):
+        found.append(f"{result['rows_per_second']:,} rows/sec, baseline {baseline['rows_per_second']:,}")
+    if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        found.append(f"peak RSS {result['peak_rss_mb']} MB, baseline {baseline['peak_rss_mb']} MB")
+    return found
+
+
+def main(
+    counts: Annotated[list[int] | None, typer.Option(help="Numbers of synthetic stores to load")] = None,
+    check: Annotated[bool, typer.Option(help="Fail when a result regresses against the baselines")] = False,
+    update_baseline: Annotated[bool, typer.Option(help="Store the results as the new baselines")] = False,
+    tolerance: Annotated[float, typer.Option(help="Allowed regression, as a fraction of the baseline")] = 0.2,
+    repeat: Annotated[int, typer.Option(help="Runs per size, the fastest is reported")] = 3,
+) -> None:
+    from benchmarks.standins import FakeSupergraph
+
+    baselines = orjson.loads(BASELINES_PATH.read_bytes()) if BASELINES_PATH.exists() else {}
+    results = {}
+    failures = []
+    with FakeSupergraph() as supergraph:
+        for count in counts or [1_000, 10_000, 100_000]:
+            runs = []
+            for _ in range(repeat):
+                # A new process per run, so imports are cold and peak RSS is not inherited from a larger run
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    runs.append(executor.submit(load_stores, supergraph.url(count), count).result())
+            result = min(runs, key=lambda run: run["seconds"])
+            results[str(count)] = result
+            print(orjson.dumps(result).decode())
+            if check and (baseline := baselines.get(BASELINES_KEY, {}).get(str(count))):
+                failures += [f"{count} stores: {failure}" for failure in regressions(result, baseline, tolerance)]
+
+    if update_baseline:
+        baselines[BASELINES_KEY] = baselines.get(BASELINES_KEY, {}) | results
+        BASELINES_PATH.write_bytes(orjson.dumps(baselines, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS) + b"\n")
+    if failures:
+        print("Regressions against", BASELINES_PATH.name, *failures, sep="\n  ")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
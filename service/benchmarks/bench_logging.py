@@ -0,0 +1,69 @@
+"""Per-record cost on the emitting thread of GLogger JSON logging, as in per-store logging of a large load.
+
+Compares formatting on the emitting thread (a StreamHandler with the GLogger formatter) with the batching handler.
+--write-latency-ms simulates a container stdout pipe that blocks on every write:
+
+    python -m benchmarks.bench_logging --records 100000 --write-latency-ms 0.05
+"""
+
+import logging
+import os
+import time
+from typing import Annotated
+
+import typer
+
+from app.glogger import BatchingStreamHandler, GLoggerHandler
+
+
+class SlowStream:
+    """Stream whose every write blocks for a while, like a backpressured pipe."""
+
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text: str) -> None:
+        time.sleep(self.latency)
+        self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def emit_cost(handler: logging.Handler, records: int) -> tuple[float, float]:
+    """Seconds per record spent in logger.info, and total seconds until everything is written."""
+    handler.setFormatter(GLoggerHandler("etos-jda-connector", "bench", "local"))
+    logger = logging.getLogger(f"bench_{type(handler).__name__}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+
+    start = time.perf_counter()
+    for store_id in range(records):
+        logger.info("Stored store %s", store_id, extra={"data": {"store": store_id, "rows": 1}})
+    emitted = time.perf_counter() - start
+    handler.close()
+    written = time.perf_counter() - start
+
+    logger.removeHandler(handler)
+    return emitted / records, written
+
+
+def main(
+    records: Annotated[int, typer.Option(help="Number of log records")] = 100_000,
+    write_latency_ms: Annotated[float, typer.Option(help="Simulated latency of each write")] = 0.0,
+) -> None:
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = logging.logAsyncioTasks = False
+    with open(os.devnull, "w") as devnull:
+        stream = SlowStream(devnull, write_latency_ms / 1000) if write_latency_ms else devnull
+        for name, handler in [
+            ("format on emitting thread", logging.StreamHandler(stream)),
+            ("batching handler", BatchingStreamHandler(stream)),
+        ]:
+            per_record, total = emit_cost(handler, records)
+            print(f"{name:28} {per_record * 1_000_000:6.2f} us/record emit, {total:.2f}s until written")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,60 @@
+"""Decode time and memory of GetStores responses, for the slotted Store against a dict-backed equivalent.
+
+    python -m benchmarks.bench_store_decode --counts 10000 --counts 100000
+"""
+
+import dataclasses
+import gc
+import time
+import tracemalloc
+from typing import Annotated
+
+import orjson
+import typer
+
+from app.jobs import job_get_stores
+from app.jobs.job_get_stores import Store, decode_stores_page
+from benchmarks.synthetic import stores_response
+
+# Same fields without __slots__, as Store was declared before
+DictStore = dataclasses.make_dataclass(
+    "DictStore", [(field.name, field.type, field) for field in dataclasses.fields(Store)]
+)
+
+
+def measure(content: bytes) -> tuple[float, float]:
+    """Seconds to decode `content`, and MB retained by the decoded stores."""
+    seconds = min(timed(lambda: decode_stores_page(content)) for _ in range(3))
+
+    # Measured separately, tracing allocations slows decoding down several times
+    gc.collect()
+    tracemalloc.start()
+    stores, _, _ = decode_stores_page(content)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del stores
+    return seconds, retained / 1024 / 1024
+
+
+def main(counts: Annotated[list[int] | None, typer.Option(help="Numbers of stores to decode")] = None) -> None:
+    for count in counts or [10_000, 100_000]:
+        content = stores_response(count)
+        parse_seconds = min(timed(lambda: orjson.loads(content)) for _ in range(3))
+        print(f"{count:>7} stores, {len(content) / 1024 / 1024:.1f} MB response, orjson.loads {parse_seconds:.3f}s")
+        for name, record_type in [("slotted Store", Store), ("dict-backed Store", DictStore)]:
+            job_get_stores.Store = record_type
+            try:
+                seconds, megabytes = measure(content)
+            finally:
+                job_get_stores.Store = Store
+            print(f"  {name:18} {seconds:.3f}s ({count / seconds:,.0f} stores/sec), {megabytes:.1f} MB retained")
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    typer.run(main)
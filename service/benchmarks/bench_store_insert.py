@@ -0,0 +1,42 @@
+"""Compare the array DML insert against the previous PL/SQL block per row.
+
+Runs against the configured JDA database and rolls back, so nothing is left in intowner.csg_etos_store_in:
+
+    python -m benchmarks.bench_store_insert --rows 10000 --batch-size 1000
+"""
+
+import time
+from typing import Annotated
+
+import typer
+
+from app.jobs.job_get_stores import STORE_INPUT_SIZES, STORE_INSERT_STATEMENT, store_bind_row
+from app.utils_oracle import bulk_insert, oracle_connection
+from benchmarks.synthetic import make_store
+
+PLSQL_STATEMENT = f"BEGIN {STORE_INSERT_STATEMENT}; END;"
+
+
+def main(
+    rows: Annotated[int, typer.Option(help="Number of synthetic stores")] = 10_000,
+    batch_size: Annotated[int, typer.Option(help="Rows per array DML batch")] = 1000,
+) -> None:
+    bind_rows = [store_bind_row(make_store(store_id)) for store_id in range(rows)]
+    with oracle_connection() as connection:
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.executemany(PLSQL_STATEMENT, bind_rows)
+        plsql_seconds = time.perf_counter() - start
+        connection.rollback()
+
+        start = time.perf_counter()
+        bulk_insert(connection, STORE_INSERT_STATEMENT, bind_rows, STORE_INPUT_SIZES, batch_size)
+        array_seconds = time.perf_counter() - start
+        connection.rollback()
+
+    print(f"PL/SQL block executemany: {rows / plsql_seconds:,.0f} rows/sec ({plsql_seconds:.2f}s)")
+    print(f"Array DML, batch {batch_size}: {rows / array_seconds:,.0f} rows/sec ({array_seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,79 @@
+"""Compare the append persist mode against the staging table MERGE.
+
+Runs against the configured JDA database, which needs the staging table (see the create-stage-table command), and
+rolls back, so nothing is left in intowner.csg_etos_store_in. Synthetic store ids start at --first-store to stay
+clear of real stores:
+
+    python -m benchmarks.bench_store_merge --rows 10000 --changed 0.1
+"""
+
+import dataclasses
+import time
+from typing import Annotated
+
+import typer
+
+from app.jobs.job_get_stores import (
+    STORE_INPUT_SIZES,
+    STORE_INSERT_STATEMENT,
+    STORE_MERGE_STATEMENT,
+    STORE_STAGE_INSERT_STATEMENT,
+    STORE_STAGE_TABLE,
+    store_bind_row,
+)
+from app.utils_oracle import bulk_insert, bulk_merge, oracle_connection
+from benchmarks.synthetic import make_store
+
+
+def main(
+    rows: Annotated[int, typer.Option(help="Number of synthetic stores")] = 10_000,
+    changed: Annotated[float, typer.Option(help="Fraction of stores changed in the second run")] = 0.1,
+    batch_size: Annotated[int, typer.Option(help="Rows per array DML batch")] = 1000,
+    first_store: Annotated[int, typer.Option(help="Id of the first synthetic store")] = 900_000,
+) -> None:
+    stores = [make_store(store_id) for store_id in range(first_store, first_store + rows)]
+    changed_every = max(1, round(1 / changed)) if changed else rows + 1
+    second_run = [
+        dataclasses.replace(store, name=f"{store.name} (changed)") if index % changed_every == 0 else store
+        for index, store in enumerate(stores)
+    ]
+    bind_rows = [store_bind_row(store) for store in stores]
+    second_bind_rows = [store_bind_row(store) for store in second_run]
+
+    with oracle_connection() as connection:
+        append_seconds = timed(
+            lambda: bulk_insert(connection, STORE_INSERT_STATEMENT, bind_rows, STORE_INPUT_SIZES, batch_size)
+        )
+        connection.rollback()
+
+        first = bulk_merge_timed(connection, bind_rows, batch_size)
+        # The staging table only empties on commit, and this benchmark never commits
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {STORE_STAGE_TABLE}")
+        second = bulk_merge_timed(connection, second_bind_rows, batch_size)
+        connection.rollback()
+
+    print(f"Append, {rows} rows: {rows / append_seconds:,.0f} rows/sec ({append_seconds:.2f}s)")
+    print(f"Merge, {rows} new rows: {rows / first[0]:,.0f} rows/sec ({first[0]:.2f}s), {first[1]} rows merged")
+    print(
+        f"Merge, {rows} rows of which {changed:.0%} changed: {rows / second[0]:,.0f} rows/sec ({second[0]:.2f}s), "
+        f"{second[1]} rows merged"
+    )
+
+
+def bulk_merge_timed(connection, bind_rows: list[tuple], batch_size: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    result = bulk_merge(
+        connection, STORE_STAGE_INSERT_STATEMENT, STORE_MERGE_STATEMENT, bind_rows, STORE_INPUT_SIZES, batch_size
+    )
+    return time.perf_counter() - start, result.merged
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,45 @@
+"""Cost of the store normalization stage per 10k rows: column-wise decode_stores, and truncation to the stand-in
+JDA column widths. Stores are normalized a page at a time, as the jobs do.
+
+    python -m benchmarks.bench_store_normalize --counts 10000 --counts 100000 --page-size 1000
+"""
+
+import time
+from typing import Annotated
+
+import orjson
+import typer
+
+from app.jobs.job_get_stores import decode_stores, store_field_widths
+from app.jobs.normalize import truncate_columns
+from benchmarks.standins import STORE_COLUMN_WIDTHS
+from benchmarks.synthetic import stores_response
+
+
+def main(
+    counts: Annotated[list[int] | None, typer.Option(help="Numbers of stores to normalize")] = None,
+    page_size: Annotated[int, typer.Option(help="Stores per supergraph page")] = 1000,
+) -> None:
+    widths = store_field_widths(STORE_COLUMN_WIDTHS)
+    for count in counts or [10_000, 100_000]:
+        items = orjson.loads(stores_response(count))["data"]["stores"]["items"]
+        pages = [items[start : start + page_size] for start in range(0, count, page_size)]
+        per_10k = 10_000 / count * 1000
+        column_wise = min(timed(lambda: [decode_stores(page) for page in pages]) for _ in range(3))  # noqa: B023
+        stores = [decode_stores(page)[0] for page in pages]
+        start = time.perf_counter()
+        truncated = sum(truncate_columns(page, widths) for page in stores)
+        truncate = time.perf_counter() - start
+        print(
+            f"{count:>7} stores in pages of {page_size}, per 10k: column-wise {column_wise * per_10k:.1f}ms, truncate {truncate * per_10k:.1f}ms ({truncated} values cut)"
+        )
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,227 @@
+"""Local stand-ins for the supergraph and JDA, so jobs can run end to end without either.
+
+FakeSupergraph serves GetStores pages of synthetic stores over HTTP; SQLiteJDA is an in-memory SQLite database
+behind the subset of the oracledb connection interface the jobs use. `standins()` points the jobs at both.
+"""
+
+import re
+import sqlite3
+import threading
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from datetime import datetime
+from functools import cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import httpx
+import orjson
+
+from app.jobs import job
+from benchmarks.synthetic import make_store_item
+
+sqlite3.register_adapter(datetime, datetime.isoformat)
+
+STORE_TABLE_DDL = """
+CREATE TABLE intowner.csg_etos_store_in (
+    store INTEGER NOT NULL, store_name TEXT, store_name3 TEXT, store_name10 TEXT,
+    store_open_date TEXT, store_close_date TEXT, phone_number TEXT, fax_number TEXT, email TEXT,
+    total_square_ft INTEGER, selling_square_ft INTEGER, linear_distance INTEGER, store_format INTEGER,
+    store_format_name TEXT, org_unit_id TEXT, org_unit_name TEXT, store_type TEXT, timezone_name TEXT, gln TEXT,
+    chain INTEGER, chain_name TEXT, area INTEGER, area_name TEXT, region INTEGER, region_name TEXT,
+    district INTEGER, district_name TEXT, city TEXT, state TEXT, country_id TEXT, post TEXT,
+    store_mgr_name TEXT, contact_name TEXT, jda_processed_flag TEXT, jda_processed_time TEXT
+)
+"""
+
+# Widths the stand-in reports for the string columns, loosely after JDA's
+STORE_COLUMN_WIDTHS = {
+    "store_name": 150,
+    "store_name3": 3,
+    "store_name10": 10,
+    "phone_number": 20,
+    "fax_number": 20,
+    "email": 100,
+    "store_format_name": 60,
+    "org_unit_id": 20,
+    "org_unit_name": 120,
+    "store_type": 6,
+    "timezone_name": 25,
+    "gln": 13,
+    "chain_name": 120,
+    "area_name": 120,
+    "region_name": 120,
+    "district_name": 120,
+    "city": 25,
+    "state": 3,
+    "country_id": 3,
+    "post": 30,
+    "store_mgr_name": 120,
+    "contact_name": 120,
+}
+
+
+@cache
+def synthetic_items(count: int) -> list[dict]:
+    return [make_store_item(store_id) for store_id in range(count)]
+
+
+class FakeSupergraph:
+    """HTTP server answering GetStores for `/stores/<count>` with `count` synthetic stores, cursor paginated."""
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-supergraph", daemon=True)
+
+    def url(self, count: int) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/stores/{count}"
+
+    def __enter__(self) -> "FakeSupergraph":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _handler() -> type[BaseHTTPRequestHandler]:
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                variables = orjson.loads(self.rfile.read(int(self.headers["Content-Length"])))["variables"]
+                items = synthetic_items(int(self.path.rstrip("/").rsplit("/", 1)[-1]))
+                start = int(variables["after"] or 0)
+                end = min(start + variables["first"], len(items))
+                page = {
+                    "items": items[start:end],
+                    "page_info": {"end_cursor": str(end), "has_next_page": end < len(items)},
+                }
+                body = orjson.dumps({"data": {"stores": page}})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+
+class SQLiteCursor:
+    """Cursor with the oracledb calls used by the jobs, translating Oracle SQL to SQLite where needed."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.batch_errors: list[SimpleNamespace] = []
+
+    def __enter__(self) -> "SQLiteCursor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cursor.close()
+
+    def setinputsizes(self, *sizes) -> None:
+        pass
+
+    def execute(self, statement: str, parameters: Sequence | dict = ()) -> None:
+        # SQLite understands :name binds when they are passed by name
+        statement = translate_named(statement) if isinstance(parameters, dict) else translate(statement)
+        self.cursor.execute(statement, parameters)
+
+    def executemany(self, statement: str, rows: list[Sequence], batcherrors: bool = False) -> None:
+        statement = translate(statement)
+        self.batch_errors = []
+        if not batcherrors:
+            self.cursor.executemany(statement, rows)
+            return
+        # Like Oracle batch errors: insert what can be inserted and report the offsets of the rest
+        self.connection.execute("SAVEPOINT batch")
+        try:
+            self.cursor.executemany(statement, rows)
+        except sqlite3.Error:
+            self.connection.execute("ROLLBACK TO batch")
+            for offset, row in enumerate(rows):
+                try:
+                    self.cursor.execute(statement, row)
+                except sqlite3.Error as error:
+                    self.batch_errors.append(SimpleNamespace(offset=offset, message=str(error)))
+        self.connection.execute("RELEASE batch")
+
+    def getbatcherrors(self) -> list[SimpleNamespace]:
+        return self.batch_errors
+
+    def fetchone(self) -> tuple | None:
+        return self.cursor.fetchone()
+
+    def fetchall(self) -> list[tuple]:
+        return self.cursor.fetchall()
+
+
+class SQLiteJDA:
+    """In-memory SQLite database with the JDA tables the jobs write to."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("ATTACH DATABASE ':memory:' AS intowner")
+        self.connection.execute(STORE_TABLE_DDL)
+        self.connection.execute(
+            "CREATE TABLE all_tab_columns (owner TEXT, table_name TEXT, column_name TEXT, data_type TEXT, char_length INT)"
+        )
+        self.connection.executemany(
+            "INSERT INTO all_tab_columns VALUES ('INTOWNER', 'CSG_ETOS_STORE_IN', ?, 'VARCHAR2', ?)",
+            [(column.upper(), width) for column, width in STORE_COLUMN_WIDTHS.items()],
+        )
+        self.connection.execute("CREATE TABLE all_tables (owner TEXT, table_name TEXT)")
+        self.connection.execute("INSERT INTO all_tables VALUES ('INTOWNER', 'CSG_ETOS_STORE_IN')")
+        self.connection.execute("BEGIN")
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self.connection)
+
+    def commit(self) -> None:
+        self.connection.execute("COMMIT")
+        self.connection.execute("BEGIN")
+
+    def rollback(self) -> None:
+        self.connection.execute("ROLLBACK")
+        self.connection.execute("BEGIN")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def count(self, table: str = "intowner.csg_etos_store_in") -> int:
+        return self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def translate(statement: str) -> str:
+    """Oracle SQL as used by the jobs to SQLite: positional binds and SQLite's timestamp function."""
+    return re.sub(r":\w+", "?", translate_named(statement))
+
+
+def translate_named(statement: str) -> str:
+    return statement.replace("SYSTIMESTAMP", "CURRENT_TIMESTAMP")
+
+
+@contextmanager
+def standins(supergraph_url: str, jda: SQLiteJDA) -> Iterator[None]:
+    """Make jobs talk to `supergraph_url` without authentication and write to `jda` instead of the JDA pool."""
+
+    @contextmanager
+    def oracle_connection():
+        yield jda
+
+    def create_supergraph_client() -> httpx.Client:
+        return httpx.Client(base_url=supergraph_url, timeout=60)
+
+    originals = job.oracle_connection, job.create_supergraph_client
+    job.oracle_connection, job.create_supergraph_client = oracle_connection, create_supergraph_client
+    try:
+        yield
+    finally:
+        job.oracle_connection, job.create_supergraph_client = originals
@@ -0,0 +1,56 @@
+import orjson
+
+from app.jobs.job_get_stores import Store, decode_stores
+
+
+def make_store_item(store_id: int) -> dict:
+    """Build a plausible GetStores item for benchmarks."""
+    return {
+        "id": store_id,
+        "last_update_time": "2024-01-01 00:00:00",
+        "name": f"Etos {store_id}",
+        "address": {
+            "name": "Store manager",
+            "city_name": "Zaandam",
+            "country_code": "NL",
+            "district_id": store_id % 40,
+            "district_name": f"District {store_id % 40}",
+            "postal_code": "1506MA",
+        },
+        "contact": {"telephone": "0751234567", "email": f"store{store_id}@etos.nl"},
+        "linear_distance": 10,
+        "name_secondary": f"Etos store {store_id}",
+        "name_short": f"E{store_id}",
+        "datetime_opened": "2020-01-01 00:00:00",
+        "datetime_closed": None,
+        "size_selling_sqft": 1000,
+        "size_total_sqft": 1200,
+        "timezone_name": "Europe/Amsterdam",
+        "organization": {
+            "area_id": store_id % 8,
+            "area_name": f"Area {store_id % 8}",
+            "chain_id": 1,
+            "chain_name": "Etos",
+            "format_name": "Standard",
+            "gln": f"{8712345000000 + store_id}",
+            "store_format": 1,
+            "store_organizational_unit": f"OU{store_id % 10}",
+            "store_organizational_unit_name": f"Org unit {store_id % 10}",
+            "store_type": "STORE",
+        },
+    }
+
+
+def make_store(store_id: int) -> Store:
+    """Build a plausible store record for benchmarks."""
+    (store,), _ = decode_stores([make_store_item(store_id)])
+    return store
+
+
+def stores_response(count: int, start: int = 0, has_next_page: bool = False) -> bytes:
+    """A GetStores response body with `count` stores."""
+    page = {
+        "items": [make_store_item(store_id) for store_id in range(start, start + count)],
+        "page_info": {"end_cursor": str(start + count), "has_next_page": has_next_page},
+    }
+    return orjson.dumps({"data": {"stores": page}})
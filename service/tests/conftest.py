@@ -0,0 +1,8 @@
+import os
+
+# Settings are read from the environment; provide dummy values so app modules import without a .env
+os.environ.setdefault("JDA_DATABASE_USER", "INTOWNER")
+os.environ.setdefault("JDA_DATABASE_PASSWORD", "secret")
+os.environ.setdefault("JDA_DATABASE_CONNECTION_STRING_DNS", "localhost:1521/JDA")
+os.environ.setdefault("SUPERGRAPH_SPN", "api://supergraph")
+os.environ.setdefault("SUPERGRAPH_URL", "https://supergraph.local/graphql")
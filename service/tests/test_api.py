@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import main
+from app.api.cache import TTLCache
+
+
+def test_cache_coalesces_concurrent_loads_and_expires():
+    cache = TTLCache(ttl=0.2)
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def scenario():
+        values = await asyncio.gather(*(cache.get("pending", load) for _ in range(20)))
+        assert values == [1] * 20
+        assert await cache.get("pending", load) == 1
+        await asyncio.sleep(0.2)
+        assert await cache.get("pending", load) == 2
+
+    asyncio.run(scenario())
+
+
+def test_cache_does_not_keep_failures():
+    cache = TTLCache(ttl=60)
+    outcomes = iter([RuntimeError("ORA-12170"), {"pending": 3}])
+
+    async def load():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await cache.get("pending", load)
+        assert await cache.get("pending", load) == {"pending": 3}
+
+    asyncio.run(scenario())
+
+
+def test_status_endpoints_are_served_from_cache(monkeypatch):
+    queries = []
+
+    async def fetch_flag_counts():
+        queries.append("pending")
+        return {"pending": 2, "flags": {"U": 2, "P": 10}}
+
+    async def fetch_store(store_id):
+        queries.append(store_id)
+        return None
+
+    monkeypatch.setattr(main, "fetch_flag_counts", fetch_flag_counts)
+    monkeypatch.setattr(main, "fetch_store", fetch_store)
+    monkeypatch.setattr(main, "cache", TTLCache(ttl=60))
+    client = TestClient(main.app)
+
+    assert client.get("/healthcheck").json() == {"status": "ok"}
+    for _ in range(3):
+        assert client.get("/status/pending").json()["pending"] == 2
+    assert client.get("/stores/42").status_code == 404
+    assert queries == ["pending", 42]
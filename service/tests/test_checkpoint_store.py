@@ -0,0 +1,33 @@
+import threading
+
+from app.jobs.checkpoint_store import CheckpointStore
+
+
+def test_store_reads_updates_and_removes_keys(tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoints.bin")
+    assert store.get("watermark") is None
+
+    store.update({"watermark": b"2024-01-01", "hashes/2": b"b", "hashes/1": b"a", "hashes0": b"-"})
+    store.update({"hashes/2": None, "hashes/3": b"c"})
+
+    assert store.get("watermark") == b"2024-01-01"
+    assert store.get("hashes/2") is None
+    assert list(store.items("hashes/")) == [("hashes/1", b"a"), ("hashes/3", b"c")]
+    # A second instance, e.g. another replica, sees the same values
+    assert CheckpointStore(tmp_path / "checkpoints.bin").get("hashes/3") == b"c"
+
+
+def test_concurrent_writers_do_not_lose_updates(tmp_path):
+    def write(worker: int) -> None:
+        store = CheckpointStore(tmp_path / "checkpoints.bin")
+        for index in range(20):
+            store.update({f"{worker}/{index}": b"x"})
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(list(CheckpointStore(tmp_path / "checkpoints.bin").items())) == 80
+
@@ -0,0 +1,108 @@
+import re
+from datetime import datetime
+
+import oracledb
+import orjson
+
+from app.jobs.checkpoint_store import get_checkpoint_store
+from app.jobs.feed import Column, FeedJob, FeedSpec, compile_feed, record_fingerprint
+from app.jobs.job import run_job
+from app.jobs.job_get_stores import parse_datetime
+from app.settings import get_graphql_settings, get_settings
+from benchmarks.standins import FakeSupergraph, SQLiteJDA, standins
+from tests.test_job_get_stores import store_item
+
+STORE_NAMES_FEED = FeedSpec(
+    name="store_names",
+    operation="GetStoreNames",
+    root="stores",
+    table="intowner.csg_etos_store_in",
+    key="id",
+    columns=(
+        Column("store", "id", oracledb.DB_TYPE_NUMBER, int),
+        Column("store_name", "name", oracledb.DB_TYPE_VARCHAR),
+        Column("gln", "organization.gln", oracledb.DB_TYPE_VARCHAR),
+        Column("chain", "organization.chain_id", oracledb.DB_TYPE_NUMBER, int),
+        Column("store_open_date", "datetime_opened", oracledb.DB_TYPE_DATE, parse_datetime),
+        Column("region", None, oracledb.DB_TYPE_NUMBER),
+    ),
+)
+
+
+def insert_columns(statement: str) -> list[str]:
+    return [column.strip() for column in re.search(r"\(([^)]*)\)", statement).group(1).split(",")]
+
+
+def feed_response(items: list[dict]) -> bytes:
+    return orjson.dumps({"data": {"stores": {"items": items, "page_info": {"end_cursor": None, "has_next_page": False}}}})
+
+
+def test_feed_compiles_to_a_query_decoder_and_insert():
+    compiled = compile_feed(STORE_NAMES_FEED)
+    item = store_item(7) | {"id": "7", "datetime_opened": "2020-01-02 03:04:05"}
+
+    page = compiled.decode_page(feed_response([item]))
+
+    [(key, watermark, row)] = page.records
+    assert (key, watermark, page.cursor) == ("7", item["last_update_time"], None)
+    assert row == (
+        7,
+        item["name"],
+        item["organization"]["gln"],
+        item["organization"]["chain_id"],
+        datetime(2020, 1, 2, 3, 4, 5),
+        None,
+    )
+    assert record_fingerprint((key, watermark, row)) != record_fingerprint((key, watermark, (*row[:-1], 1)))
+    assert "organization {" in compiled.query.query and "address" not in compiled.query.query
+    assert insert_columns(compiled.insert_statement) == [
+        "store",
+        "store_name",
+        "gln",
+        "chain",
+        "store_open_date",
+        "region",
+        "jda_processed_flag",
+        "jda_processed_time",
+    ]
+
+
+def test_feed_sets_invalid_items_aside_and_cuts_values_to_the_column_widths():
+    items = [store_item(i) for i in range(5)]
+    del items[1]["organization"]["gln"]
+    items[2]["organization"]["chain_id"] = "first"
+    items[3]["id"] = None
+    items[4]["name"] = "Etos Zaandam Centrum"
+
+    page = compile_feed(STORE_NAMES_FEED).decode_page(feed_response(items), {"store_name": 12, "gln": 13})
+
+    assert [(key, row[1]) for key, _, row in page.records] == [("0", "Etos 0"), ("4", "Etos Zaandam")]
+    assert page.truncated == 1
+    assert [(item.key, item.reasons) for item in page.rejected] == [
+        (1, ["organization.gln is missing"]),
+        (2, ["organization.chain_id is invalid: 'first'"]),
+        (None, ["id is required"]),
+    ]
+
+
+class LoadStoreNames(FeedJob):
+    feed = STORE_NAMES_FEED
+
+
+def test_feed_job_loads_end_to_end_against_standins(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "checkpoint_path", str(tmp_path))
+    monkeypatch.setattr(get_graphql_settings(), "supergraph_page_size", 64)
+    store = get_checkpoint_store(str(tmp_path))
+    writes = []
+    monkeypatch.setattr(store, "update", lambda values, update=store.update: writes.append(values) or update(values))
+    jda = SQLiteJDA()
+    with FakeSupergraph() as supergraph, standins(supergraph.url(200), jda):
+        run_job(LoadStoreNames)
+        run_job(LoadStoreNames)
+
+    # The second run finds every store unchanged
+    assert jda.count() == 200
+    # Each run writes its watermark, fingerprints and last run with a single rewrite of the store
+    assert [len(values) for values in writes] == [202, 1]
+    assert store.get("store_names_last_update_time") is not None
+    assert not (tmp_path / "store_names_progress.journal").exists()
@@ -0,0 +1,50 @@
+import io
+import logging
+import sys
+import warnings
+
+import orjson
+
+from app.glogger import BatchingStreamHandler, GLoggerHandler, setup_glogger
+
+
+def test_batching_handler_writes_json_records_on_close():
+    stream = io.StringIO()
+    handler = BatchingStreamHandler(stream=stream, batch_size=10)
+    handler.setFormatter(GLoggerHandler("etos-jda-connector", "test", "local"))
+    logger = logging.getLogger("test_batching_handler")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    for store_id in range(25):
+        logger.info("Stored %s", store_id, extra={"data": {"store": store_id}})
+    logger.debug("Not emitted")
+    handler.close()
+    logger.removeHandler(handler)
+
+    records = [orjson.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record["msg"] for record in records] == [f"Stored {store_id}" for store_id in range(25)]
+    assert records[-1]["data"] == {"store": 24}
+    assert records[0]["service"] == "etos-jda-connector"
+
+
+def test_setup_glogger_leaves_stdout_and_stderr_alone(monkeypatch):
+    stdout, stderr = sys.stdout, sys.stderr
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+    for flag in ["logThreads", "logProcesses", "logMultiprocessing", "logAsyncioTasks"]:
+        monkeypatch.setattr(logging, flag, getattr(logging, flag))
+    logger = logging.getLogger("test_setup_glogger")
+    records = []
+    monkeypatch.setattr(logging.getLogger("py.warnings"), "handle", records.append)
+    try:
+        setup_glogger("etos-jda-connector", "test", logger=logger)
+        warnings.warn("deprecated", DeprecationWarning, stacklevel=1)
+    finally:
+        logging.captureWarnings(False)
+        for handler in logger.handlers:
+            handler.close()
+        logger.handlers.clear()
+
+    assert sys.stdout is stdout
+    assert sys.stderr is stderr
+    assert ["deprecated" in record.getMessage() for record in records] == [True]
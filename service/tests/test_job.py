@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.jobs import job as job_module
+from app.jobs.job import AsyncJob, prefetch, run_job, run_stages
+from app.settings import get_settings
+
+
+def test_prefetch_reraises_producer_error():
+    def produce():
+        yield 1
+        raise RuntimeError("boom")
+
+    consumed = []
+    with pytest.raises(RuntimeError, match="boom"):
+        for item in prefetch(produce()):
+            consumed.append(item)
+    assert consumed == [1]
+
+
+def test_run_stages_passes_items_through_in_order():
+    persisted = []
+
+    async def source():
+        for page in range(5):
+            yield page
+
+    async def transform(page):
+        await asyncio.sleep(0)
+        return page * 10
+
+    async def persist(page):
+        persisted.append(page)
+
+    asyncio.run(run_stages(source(), transform, persist, queue_size=1))
+
+    assert persisted == [0, 10, 20, 30, 40]
+
+
+def test_run_stages_cancels_on_stage_failure():
+    async def source():
+        while True:
+            yield 1
+
+    async def persist(page):
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError, match="database down"):
+        asyncio.run(run_stages(source(), persist))
+
+
+class NoopAsyncJob(AsyncJob):
+    async def task(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+def test_run_job_closes_the_async_pool_of_the_loop_it_ran_on(tmp_path, monkeypatch):
+    closed = []
+
+    async def close_async_oracle_pool():
+        closed.append(asyncio.get_running_loop())
+
+    monkeypatch.setattr(job_module, "close_async_oracle_pool", close_async_oracle_pool)
+    monkeypatch.setattr(get_settings(), "checkpoint_path", str(tmp_path))
+    run_job(NoopAsyncJob)
+    run_job(NoopAsyncJob)
+
+    assert len(closed) == 2 and closed[0] is not closed[1]
@@ -0,0 +1,377 @@
+import asyncio
+import dataclasses
+import re
+from contextlib import asynccontextmanager, contextmanager
+from types import SimpleNamespace
+
+import httpx
+import orjson
+import pytest
+
+from app.jobs.checkpoint_store import get_checkpoint_store
+from app.jobs.job import RejectSink, run_job
+from app.jobs.metrics import JobMetrics
+from app.jobs.normalize import truncate_columns
+from app.jobs.job_get_stores import (
+    GET_STORES_QUERY,
+    STORE_BIND_FIELDS,
+    STORE_COLUMNS,
+    STORE_FIELD_PATHS,
+    STORE_INSERT_STATEMENT,
+    STORE_SELECTION,
+    AsyncLoadStores,
+    LoadStores,
+    Store,
+    decode_stores,
+    store_bind_row,
+    store_field_widths,
+    store_merge_rows,
+)
+from app.jobs import job as job_module
+from app.jobs import job_get_stores
+from app.settings import get_graphql_settings, get_jda_settings, get_settings
+from app.utils_oracle import BulkInsertResult, RejectedRow
+from benchmarks.standins import FakeSupergraph, SQLiteJDA, standins
+
+
+def store_item(store_id: int) -> dict:
+    return {
+        "id": store_id,
+        "last_update_time": f"2024-01-01 00:{store_id // 60:02d}:{store_id % 60:02d}",
+        "name": f"Etos {store_id}",
+        "name_secondary": "",
+        "name_short": f"E{store_id}",
+        "address": {
+            "name": "Manager",
+            "city_name": "Zaandam",
+            "country_code": "NL",
+            "district_id": 1,
+            "district_name": "Noord",
+            "postal_code": "1506MA",
+        },
+        "contact": {"telephone": "0751234567", "email": "store@etos.nl"},
+        "linear_distance": 10,
+        "datetime_opened": "2020-01-01 00:00:00",
+        "datetime_closed": None,
+        "size_selling_sqft": 100,
+        "size_total_sqft": 120,
+        "timezone_name": "Europe/Amsterdam",
+        "organization": {
+            "area_id": 1,
+            "area_name": "Area",
+            "chain_id": 1,
+            "chain_name": "Etos",
+            "format_name": "Standard",
+            "gln": "8712345678901",
+            "store_format": 1,
+            "store_organizational_unit": "OU",
+            "store_organizational_unit_name": "Org unit",
+            "store_type": "STORE",
+        },
+    }
+
+
+def paged_stores(total: int):
+    def handler(request: httpx.Request) -> httpx.Response:
+        variables = orjson.loads(request.content)["variables"]
+        changed = [item for i in range(total) if (item := store_item(i))["last_update_time"] > variables["last_update_time"]]
+        start = int(variables["after"] or 0)
+        end = min(start + variables["first"], len(changed))
+        page = {
+            "items": changed[start:end],
+            "page_info": {"end_cursor": str(end), "has_next_page": end < len(changed)},
+        }
+        return httpx.Response(200, content=orjson.dumps({"data": {"stores": page}}))
+
+    return handler
+
+
+def paged_supergraph(total: int) -> httpx.Client:
+    return httpx.Client(base_url="https://supergraph.local", transport=httpx.MockTransport(paged_stores(total)))
+
+
+def load_stores_job(total: int, checkpoint_path: str) -> tuple[LoadStores, list[int]]:
+    persisted: list[int] = []
+    job = object.__new__(LoadStores)
+    job.global_settings = SimpleNamespace(checkpoint_path=checkpoint_path, resume_interrupted_runs=True)
+    job.metrics = JobMetrics()
+    job.jda_connection = SQLiteJDA()
+    job.supergraph_client = paged_supergraph(total)
+
+    def persist_store_data(stores):
+        persisted.extend(store.id for store in stores)
+        return BulkInsertResult(inserted=len(stores))
+
+    job.persist_store_data = persist_store_data
+    return job, persisted
+
+
+def run_task(job: LoadStores) -> None:
+    """Run the task and write the checkpoints it staged, as reporting the run does."""
+    job.task()
+    job.checkpoint_updates.commit()
+
+
+def test_fetch_stores_follows_cursor():
+    job = object.__new__(LoadStores)
+    job.supergraph_client = paged_supergraph(total=25)
+    job.metrics = JobMetrics()
+
+    pages = list(job.fetch_pages("2021-10-01 00:00:00", page_size=10))
+
+    assert [(len(stores), cursor) for stores, cursor in pages] == [(10, "10"), (10, "20"), (5, None)]
+    assert [store.id for stores, _ in pages for store in stores] == list(range(25))
+    assert job.metrics.as_dict()["stage_calls"] == {"fetch": 3, "decode": 3}
+    assert job.metrics.counters["rows_fetched"] == 25
+
+
+def test_task_only_loads_delta_since_checkpoint(tmp_path):
+    job, persisted = load_stores_job(total=25, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert len(persisted) == 25
+    assert get_checkpoint_store(str(tmp_path)).get("load_stores_last_update_time") == b"2024-01-01 00:00:24"
+
+    job, persisted = load_stores_job(total=25, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert persisted == []
+
+
+def test_task_skips_stores_without_changes(tmp_path):
+    job, persisted = load_stores_job(total=25, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert len(persisted) == 25
+
+    # Losing the watermark re-fetches everything, but nothing reaches JDA again
+    get_checkpoint_store(str(tmp_path)).update({"load_stores_last_update_time": None})
+    job, persisted = load_stores_job(total=25, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert persisted == []
+
+
+def test_interrupted_run_resumes_after_last_committed_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_graphql_settings(), "supergraph_page_size", 10)
+    job, persisted = load_stores_job(total=25, checkpoint_path=str(tmp_path))
+
+    def persist_until_third_page(stores):
+        if len(persisted) == 20:
+            raise RuntimeError("pod evicted")
+        persisted.extend(store.id for store in stores)
+        return BulkInsertResult(inserted=len(stores))
+
+    job.persist_store_data = persist_until_third_page
+    with pytest.raises(RuntimeError, match="pod evicted"):
+        job.task()
+    assert get_checkpoint_store(str(tmp_path)).get("load_stores_last_update_time") is None
+
+    # Only the page that was not committed is fetched and written again
+    job, persisted = load_stores_job(total=25, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert persisted == list(range(20, 25))
+    assert get_checkpoint_store(str(tmp_path)).get("load_stores_last_update_time") == b"2024-01-01 00:00:24"
+    assert not (tmp_path / "load_stores_progress.journal").exists()
+
+    # The journaled fingerprints were kept, so a full reload finds nothing new
+    get_checkpoint_store(str(tmp_path)).update({"load_stores_last_update_time": None})
+    job, persisted = load_stores_job(total=25, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert persisted == []
+
+
+def test_stores_rejected_by_jda_are_written_again(tmp_path):
+    job, persisted = load_stores_job(total=10, checkpoint_path=str(tmp_path))
+
+    def persist_rejecting_store_7(stores):
+        persisted.extend(store.id for store in stores)
+        offset = [store.id for store in stores].index(7)
+        return BulkInsertResult(
+            inserted=len(stores) - 1, rejected=[RejectedRow(offset, "ORA-12899", store_bind_row(stores[offset]))]
+        )
+
+    job.persist_store_data = persist_rejecting_store_7
+    run_task(job)
+    assert len(persisted) == 10
+    # Held below the rejected store, so the next incremental run fetches it again
+    assert get_checkpoint_store(str(tmp_path)).get("load_stores_last_update_time") == b"2024-01-01 00:00:06"
+
+    # Fetched again, only the rejected store is written
+    job, persisted = load_stores_job(total=10, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert persisted == [7]
+    assert get_checkpoint_store(str(tmp_path)).get("load_stores_last_update_time") == b"2024-01-01 00:00:09"
+
+
+def test_sharded_persist_checkpoints_committed_shards(tmp_path, monkeypatch):
+    attempts: list[set[int]] = []
+    failing = {3}
+
+    @contextmanager
+    def oracle_connection():
+        yield SimpleNamespace(commit=lambda: None, rollback=lambda: None)
+
+    def write_stores(connection, stores, batch_size):
+        ids = {store.id for store in stores}
+        attempts.append(ids)
+        if ids & failing:
+            raise RuntimeError("ORA-03113")
+        return BulkInsertResult(inserted=len(stores))
+
+    monkeypatch.setattr(job_module, "oracle_connection", oracle_connection)
+    monkeypatch.setattr(job_get_stores, "write_stores", write_stores)
+    monkeypatch.setattr(get_jda_settings(), "jda_persist_parallelism", 4)
+
+    job, _ = load_stores_job(total=20, checkpoint_path=str(tmp_path))
+    with pytest.raises(RuntimeError, match="1 of 4 store shards failed"):
+        job.task()
+    assert sorted(min(ids) for ids in attempts) == [0, 1, 2, 3]
+
+    # The retry only writes the shard that failed
+    attempts.clear()
+    failing.clear()
+    job, _ = load_stores_job(total=20, checkpoint_path=str(tmp_path))
+    run_task(job)
+    assert attempts == [{3, 7, 11, 15, 19}]
+
+
+def test_async_load_stores_persists_shards_concurrently(tmp_path, monkeypatch):
+    attempts: list[set[int]] = []
+
+    async def noop():
+        pass
+
+    @asynccontextmanager
+    async def async_oracle_connection():
+        yield SimpleNamespace(commit=noop, rollback=noop)
+
+    async def async_write_stores(connection, stores, batch_size):
+        attempts.append({store.id for store in stores})
+        return BulkInsertResult(inserted=len(stores))
+
+    async def async_column_widths(connection, table):
+        return {"store_name10": 2}
+
+    monkeypatch.setattr(job_module, "async_oracle_connection", async_oracle_connection)
+    monkeypatch.setattr(job_get_stores, "async_write_stores", async_write_stores)
+    monkeypatch.setattr(job_get_stores, "async_column_widths", async_column_widths)
+    monkeypatch.setattr(get_jda_settings(), "jda_persist_mode", "append")
+    monkeypatch.setattr(get_jda_settings(), "jda_persist_parallelism", 4)
+    job = object.__new__(AsyncLoadStores)
+    job.global_settings = SimpleNamespace(checkpoint_path=str(tmp_path), resume_interrupted_runs=True)
+    job.metrics = JobMetrics()
+    job.jda_connection = None
+    job.supergraph_client = httpx.AsyncClient(
+        base_url="https://supergraph.local", transport=httpx.MockTransport(paged_stores(20))
+    )
+
+    asyncio.run(job.task())
+    job.checkpoint_updates.commit()
+
+    assert sorted(min(ids) for ids in attempts) == [0, 1, 2, 3]
+    assert job.metrics.counters["rows_inserted"] == 20
+    assert job.metrics.counters["values_truncated"] == 10
+    assert get_checkpoint_store(str(tmp_path)).get("load_stores_last_update_time") == b"2024-01-01 00:00:19"
+
+
+def decode_store(item: dict) -> Store:
+    (store,), rejected = decode_stores([item])
+    assert rejected == []
+    return store
+
+
+def test_decode_stores_coerces_types():
+    store = decode_store(store_item(7) | {"id": "7", "size_total_sqft": "120", "datetime_closed": ""})
+    assert (store.id, store.size_total_sqft, store.datetime_opened.year, store.datetime_closed) == (7, 120, 2020, None)
+
+
+def test_decode_stores_rejects_invalid_items_with_reasons(tmp_path):
+    items = [store_item(i) for i in range(6)]
+    items[1] = items[1] | {"id": "1", "size_total_sqft": "120"}
+    del items[2]["organization"]["gln"]
+    items[3]["address"] = None
+    items[4] = items[4] | {"datetime_opened": "yesterday", "linear_distance": "far"}
+    items[5]["id"] = None
+
+    stores, rejected = decode_stores(items)
+
+    assert [(store.id, store.size_total_sqft) for store in stores] == [(0, 120), (1, 120)]
+    assert [(item.key, item.reasons) for item in rejected] == [
+        (2, ["organization.gln is missing"]),
+        (3, ["address is not an object"]),
+        (4, ["datetime_opened is invalid: 'yesterday'", "linear_distance is invalid: 'far'"]),
+        (None, ["id is required"]),
+    ]
+
+    sink = RejectSink("load_stores", str(tmp_path))
+    sink.write(rejected)
+    lines = [orjson.loads(line) for line in sink.path.read_bytes().splitlines()]
+    assert [line["key"] for line in lines] == [2, 3, 4, None]
+    assert lines[0]["item"] == items[2]
+
+
+def test_store_field_widths_truncate_to_the_narrowest_column():
+    widths = store_field_widths({"store_name10": 10, "phone_number": 20, "fax_number": 12, "email": 100})
+    assert widths == {"name_short": 10, "telephone": 12, "email": 100}
+
+    store = decode_store(store_item(7) | {"name_short": "Etos Zaandam Centrum"})
+    assert truncate_columns([store], widths) == 1
+    assert store.name_short == "Etos Zaand"
+
+
+def project(item: dict, paths: list[str]) -> dict:
+    projected: dict = {}
+    for path in paths:
+        *parents, name = path.split(".")
+        source, target = item, projected
+        for parent in parents:
+            source, target = source[parent], target.setdefault(parent, {})
+        target[name] = source[name]
+    return projected
+
+
+def test_store_projection_stays_in_sync_with_store_schema():
+    store_fields = {field.name for field in dataclasses.fields(Store)}
+    assert set(STORE_FIELD_PATHS) <= store_fields
+    assert {field for field in STORE_BIND_FIELDS if field} <= set(STORE_FIELD_PATHS)
+
+    # The decoder only reads selected fields, and the bind row follows STORE_BIND_FIELDS
+    store = decode_store(project(store_item(1), STORE_SELECTION))
+    assert store_bind_row(store) == tuple(getattr(store, field) if field else None for field in STORE_BIND_FIELDS)
+    assert "opening_hours" not in GET_STORES_QUERY
+
+
+def test_load_stores_end_to_end_against_standins(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "checkpoint_path", str(tmp_path))
+    monkeypatch.setattr(get_settings(), "metrics_path", str(tmp_path / "metrics"))
+    monkeypatch.setattr(get_graphql_settings(), "supergraph_page_size", 64)
+    jda = SQLiteJDA()
+    with FakeSupergraph() as supergraph, standins(supergraph.url(200), jda):
+        run_job(LoadStores)
+
+    assert jda.count() == 200
+    rows = jda.connection.execute(
+        "SELECT COUNT(DISTINCT store), MIN(jda_processed_flag) FROM intowner.csg_etos_store_in"
+    ).fetchone()
+    assert rows == (200, "U")
+    # Truncated to the widths JDA reports
+    assert jda.connection.execute("SELECT MAX(LENGTH(store_name3)) FROM intowner.csg_etos_store_in").fetchone() == (3,)
+    assert 'etos_jda_job_rows_inserted{job_name="LoadStores"} 200' in (tmp_path / "metrics" / "LoadStores.prom").read_text()
+
+
+def test_merge_mode_fails_early_without_the_staging_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "checkpoint_path", str(tmp_path))
+    monkeypatch.setattr(get_jda_settings(), "jda_persist_mode", "merge")
+    jda = SQLiteJDA()
+    # Nothing listens on the discard port, so fetching would fail differently
+    with standins("http://127.0.0.1:9/stores/0", jda), pytest.raises(RuntimeError, match="create-stage-table"):
+        run_job(LoadStores)
+
+
+def test_merge_statements_bind_the_insert_columns_once_per_store():
+    binds = re.findall(r":(\w+)", STORE_INSERT_STATEMENT)
+    assert list(STORE_COLUMNS) == binds
+    assert len(STORE_COLUMNS) == len(STORE_BIND_FIELDS)
+
+    stale, fresh = decode_store(store_item(1)), decode_store(store_item(1) | {"name": "Etos Zaandam"})
+    assert store_merge_rows([stale, decode_store(store_item(2)), fresh]) == [
+        store_bind_row(fresh),
+        store_bind_row(decode_store(store_item(2))),
+    ]
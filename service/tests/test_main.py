@@ -1,2 +1,24 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
 def test_dummy():
     assert True
+
+
+def test_cli_help_needs_no_settings():
+    # No JDA or supergraph variables and no .env: importing and --help must not resolve settings
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("JDA_", "SUPERGRAPH_"))}
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys; sys.argv = ['main', '--help']; import main; main.main()"],
+        cwd=Path(__file__).parents[1],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "run-all" in result.stdout
@@ -0,0 +1,20 @@
+from app.jobs.metrics import JobMetrics, export_metrics
+
+
+def test_spans_and_counters_are_reported_as_data_and_prometheus_text(tmp_path):
+    metrics = JobMetrics()
+    for _ in range(2):
+        with metrics.span("fetch"):
+            pass
+    metrics.count("rows_fetched", 10)
+    metrics.count("rows_fetched", 5)
+
+    data = metrics.as_dict()
+    assert data["stage_calls"] == {"fetch": 2}
+    assert data["counters"] == {"rows_fetched": 15}
+
+    export_metrics(metrics, "LoadStores", "succeeded", path=str(tmp_path), pushgateway_url=None)
+    text = (tmp_path / "LoadStores.prom").read_text()
+    assert 'etos_jda_job_rows_fetched{job_name="LoadStores"} 15' in text
+    assert 'etos_jda_job_stage_calls{job_name="LoadStores",stage="fetch"} 2' in text
+    assert 'etos_jda_job_succeeded{job_name="LoadStores"} 1' in text
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from app.jobs import scheduler
+from app.jobs.scheduler import run_jobs
+
+
+class FakeJob:
+    depends_on = ()
+    lock_name = None
+    seconds = 0.0
+    error: str | None = None
+
+
+def fake_job(
+    name: str, depends_on=(), seconds: float = 0.0, error: str | None = None, lock_name: str | None = None
+) -> type:
+    return type(
+        name, (FakeJob,), {"depends_on": depends_on, "seconds": seconds, "error": error, "lock_name": lock_name}
+    )
+
+
+runs: list[tuple[str, float, float]] = []
+
+
+@pytest.fixture(autouse=True)
+def fake_run_job(monkeypatch):
+    runs.clear()
+
+    def run_job(job):
+        start = time.perf_counter()
+        time.sleep(job.seconds)
+        runs.append((job.__name__, start, time.perf_counter()))
+        if job.error:
+            raise RuntimeError(job.error)
+
+    monkeypatch.setattr(scheduler, "run_job", run_job)
+
+
+def test_run_jobs_respects_dependencies_and_skips_dependents_of_failures():
+    extract = fake_job("Extract", error="supergraph down")
+    load = fake_job("Load", depends_on=(extract,))
+    report = fake_job("Report", depends_on=(load,))
+    independent = fake_job("Independent")
+
+    results = {result.name: result for result in run_jobs([report, load, extract, independent])}
+
+    assert results["Extract"].status == "failed"
+    assert results["Load"].status == "skipped"
+    assert results["Report"].status == "skipped"
+    assert results["Independent"].status == "succeeded"
+
+
+def test_run_jobs_runs_independent_jobs_concurrently_with_timeout():
+    slow = fake_job("Slow", seconds=5)
+    fast = [fake_job(f"Fast{i}", seconds=0.2) for i in range(3)]
+
+    start = time.perf_counter()
+    results = run_jobs([slow, *fast], max_workers=4, timeout=0.5)
+
+    assert time.perf_counter() - start < 2
+    assert [result.status for result in results] == ["timed_out", "succeeded", "succeeded", "succeeded"]
+
+
+def test_run_jobs_never_overlaps_jobs_sharing_a_lock():
+    load, load_async = fake_job("Load", seconds=0.2, lock_name="stores"), fake_job("LoadAsync", lock_name="stores")
+
+    results = run_jobs([load, load_async], max_workers=4)
+
+    assert [result.status for result in results] == ["succeeded", "succeeded"]
+    (_, _, load_end), (_, load_async_start, _) = sorted(runs)
+    assert load_async_start >= load_end
+
+
+def test_timed_out_job_keeps_its_lock_until_its_thread_returns():
+    slow = fake_job("Slow", seconds=1, lock_name="stores")
+    sibling = fake_job("Sibling", lock_name="stores")
+    other = fake_job("Other", seconds=0.1)
+
+    results = run_jobs([slow, sibling, other], max_workers=4, timeout=0.3)
+
+    assert [(result.status, result.error) for result in results] == [
+        ("timed_out", "exceeded 0.3s"),
+        ("skipped", "a timed out job is still running"),
+        ("succeeded", None),
+    ]
@@ -0,0 +1,66 @@
+import pytest
+
+from app.jobs import job as job_module
+from app.jobs.job import run_job
+from app.jobs.job_get_stores import LoadSpooledStores, SpoolStores, decode_spooled_store, decode_stores, store_spool_row
+from app.jobs.spool import SpoolReader, SpoolWriter, spool_path
+from app.settings import get_graphql_settings, get_settings
+from benchmarks.standins import FakeSupergraph, SQLiteJDA, standins
+from tests.test_job_get_stores import store_item
+
+
+def test_spool_round_trips_pages_and_stores(tmp_path):
+    stores, _ = decode_stores([store_item(i) for i in range(5)])
+    with SpoolWriter(tmp_path / "stores.spool", {"last_update_time": "2024-01-01 00:00:00"}) as spool:
+        spool.write("3", [store_spool_row(store) for store in stores[:3]])
+        spool.write(None, [store_spool_row(store) for store in stores[3:]])
+
+    with SpoolReader(tmp_path / "stores.spool") as spool:
+        assert spool.header == {"last_update_time": "2024-01-01 00:00:00"}
+        pages = [(after, [decode_spooled_store(row) for row in rows]) for after, rows in spool.pages()]
+
+    assert pages == [("3", stores[:3]), (None, stores[3:])]
+
+
+def test_spool_is_only_in_place_once_complete_and_rejects_damage(tmp_path):
+    path = tmp_path / "stores.spool"
+    with pytest.raises(RuntimeError), SpoolWriter(path, {}) as spool:
+        spool.write(None, [[1]])
+        raise RuntimeError("fetch failed")
+    assert not path.exists()
+    assert list(tmp_path.iterdir()) == []
+
+    with SpoolWriter(path, {}) as spool:
+        spool.write(None, [[1, "a"]])
+    content = path.read_bytes()
+
+    path.write_bytes(content[:-4])
+    with SpoolReader(path) as spool, pytest.raises(ValueError, match="truncated"):
+        list(spool.pages())
+
+    path.write_bytes(content.replace(b'"a"', b'"b"'))
+    with SpoolReader(path) as spool, pytest.raises(ValueError, match="corrupt"):
+        list(spool.pages())
+
+
+def unavailable_jda():
+    raise ConnectionError("JDA is in a maintenance window")
+
+
+def test_spooled_stores_load_without_the_supergraph(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "checkpoint_path", str(tmp_path))
+    monkeypatch.setattr(get_graphql_settings(), "supergraph_page_size", 64)
+    with FakeSupergraph() as supergraph, standins(supergraph.url(200), jda=None), monkeypatch.context() as patch:
+        patch.setattr(job_module, "oracle_connection", unavailable_jda)
+        run_job(SpoolStores)
+    assert spool_path(str(tmp_path), "load_stores").exists()
+
+    jda = SQLiteJDA()
+    # Nothing listens on the discard port, so any supergraph call would fail
+    with standins("http://127.0.0.1:9/stores/0", jda):
+        run_job(LoadSpooledStores)
+        assert jda.count() == 200
+
+        # The spool stays for reruns, but is recognised as loaded
+        run_job(LoadSpooledStores)
+        assert jda.count() == 200
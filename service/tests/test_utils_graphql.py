@@ -0,0 +1,118 @@
+import time
+from types import SimpleNamespace
+
+import httpx
+import orjson
+
+from app.utils_graphql import PersistedQuery, RetryTransport, SupergraphAuth, SupergraphMetrics
+
+
+class FakeCredential:
+    def __init__(self, lifetime: float):
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def get_token(self, scope: str):
+        self.calls += 1
+        return SimpleNamespace(token=f"token-{self.calls}", expires_on=time.time() + self.lifetime)
+
+
+def authorization(auth: SupergraphAuth) -> str:
+    request = next(auth.auth_flow(httpx.Request("POST", "https://supergraph.local")))
+    return request.headers["Authorization"]
+
+
+def test_token_is_reused_until_refresh_margin():
+    credential = FakeCredential(lifetime=3600)
+    auth = SupergraphAuth("api://supergraph/.default", credential=credential)
+
+    assert [authorization(auth) for _ in range(3)] == ["Bearer token-1"] * 3
+    assert credential.calls == 1
+    auth.close()
+
+
+def test_token_is_refreshed_in_background_before_expiry():
+    credential = FakeCredential(lifetime=120.3)
+    auth = SupergraphAuth("api://supergraph/.default", credential=credential, refresh_margin=120, retry_interval=0.1)
+
+    assert authorization(auth) == "Bearer token-1"
+    time.sleep(0.6)
+
+    assert credential.calls == 2
+    assert authorization(auth) == "Bearer token-2"
+    auth.close()
+
+
+def test_token_issued_within_refresh_margin_is_not_refreshed_in_a_loop():
+    credential = FakeCredential(lifetime=200)
+    auth = SupergraphAuth("api://supergraph/.default", credential=credential, refresh_margin=300, retry_interval=0.5)
+
+    assert authorization(auth) == "Bearer token-1"
+    time.sleep(0.3)
+    assert credential.calls == 1
+    auth.close()
+
+
+def flaky_transport(statuses: list[int]) -> tuple[RetryTransport, list[int]]:
+    attempts: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(len(attempts))
+        return httpx.Response(statuses[len(attempts) - 1], headers={"Retry-After": "0"})
+
+    transport = RetryTransport(httpx.MockTransport(handler), max_retries=3, metrics=SupergraphMetrics())
+    return transport, attempts
+
+
+def test_idempotent_query_is_retried_after_gateway_errors():
+    transport, attempts = flaky_transport([502, 503, 200])
+    client = httpx.Client(base_url="https://supergraph.local", transport=transport)
+
+    response = client.post(
+        "", json={"query": "query GetStores { stores { items { id } } }"}, extensions={"idempotent": True}
+    )
+
+    assert response.status_code == 200
+    assert len(attempts) == 3
+    assert (transport.metrics.requests, transport.metrics.retries) == (3, 2)
+    assert transport.metrics.as_dict()["retries"] == 2
+
+
+def test_non_idempotent_request_is_not_retried():
+    transport, attempts = flaky_transport([502, 200])
+    client = httpx.Client(base_url="https://supergraph.local", transport=transport)
+
+    response = client.post("", json={"query": "mutation { touch }"})
+
+    assert response.status_code == 502
+    assert len(attempts) == 1
+
+
+def test_persisted_query_registers_unknown_hash_once():
+    known: set[str] = set()
+    payloads: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = orjson.loads(request.content)
+        payloads.append(payload)
+        sha256 = payload["extensions"]["persistedQuery"]["sha256Hash"]
+        if "query" in payload:
+            known.add(sha256)
+        elif sha256 not in known:
+            return httpx.Response(200, json={"errors": [{"message": "PersistedQueryNotFound"}]})
+        return httpx.Response(200, json={"data": {"stores": {"items": []}}})
+
+    client = httpx.Client(base_url="https://supergraph.local", transport=httpx.MockTransport(handler))
+    query = PersistedQuery("query GetStores { stores { items { id } } }")
+
+    for _ in range(3):
+        assert query.post(client, {}).json() == {"data": {"stores": {"items": []}}}
+
+    assert ["query" in payload for payload in payloads] == [False, True, False, False]
+
+
+def test_http2_and_brotli_are_installed():
+    # httpx raises ImportError for HTTP/2 without h2, and only asks for br when brotli is installed
+    httpx.HTTPTransport(http2=True).close()
+    with httpx.Client() as client:
+        assert "br" in client.headers["Accept-Encoding"]
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+from app.settings import get_jda_settings
+from app.utils_oracle import AdaptiveBatchSize, bulk_insert, bulk_merge, oracle_pool_max
+
+
+class RecordingCursor:
+    def __init__(self, reject: set[int]):
+        self.reject = reject
+        self.batches: list[list] = []
+        self.errors: list = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def setinputsizes(self, *sizes):
+        self.input_sizes = sizes
+
+    def executemany(self, statement, rows, batcherrors=False):
+        assert batcherrors
+        self.batches.append(rows)
+        self.errors = [
+            SimpleNamespace(offset=offset, message="ORA-01400")
+            for offset, row in enumerate(rows)
+            if row[0] in self.reject
+        ]
+
+    def getbatcherrors(self):
+        return self.errors
+
+    def execute(self, statement):
+        self.executed = statement
+        self.rowcount = sum(len(batch) for batch in self.batches) - len(self.reject)
+
+
+def test_bulk_insert_batches_and_collects_rejected_rows():
+    cursor = RecordingCursor(reject={3, 7})
+    connection = SimpleNamespace(cursor=lambda: cursor)
+
+    result = bulk_insert(connection, "INSERT", [(i,) for i in range(10)], input_sizes=[int], batch_size=4)
+
+    assert [len(batch) for batch in cursor.batches] == [4, 4, 2]
+    assert result.inserted == 8
+    assert [row.offset for row in result.rejected] == [3, 7]
+
+
+def test_bulk_merge_stages_rows_then_merges_once():
+    cursor = RecordingCursor(reject={3})
+    connection = SimpleNamespace(cursor=lambda: cursor)
+
+    result = bulk_merge(connection, "INSERT", "MERGE", [(i,) for i in range(10)], input_sizes=[int], batch_size=4)
+
+    assert [len(batch) for batch in cursor.batches] == [4, 4, 2]
+    assert cursor.executed == "MERGE"
+    assert (result.inserted, result.merged) == (9, 9)
+
+
+def test_adaptive_batch_size_grows_shrinks_and_reverts_within_bounds():
+    batch_size = AdaptiveBatchSize(initial=1000, minimum=250, maximum=2000, target_seconds=1.0)
+
+    batch_size.observe(1000, 0.2)
+    assert batch_size.size == 1500
+    batch_size.observe(1500, 0.25)
+    assert batch_size.size == 2000
+    # Throughput still rose, and the size is at its maximum
+    batch_size.observe(2000, 0.3)
+    assert batch_size.size == 2000
+    batch_size.observe(2000, 1.6)
+    assert batch_size.size == 1000
+    batch_size.observe(1000, 0.3)
+    assert batch_size.size == 1500
+    # Growing cut throughput from 3333 to 2500 rows/sec
+    batch_size.observe(1500, 0.6)
+    assert batch_size.size == 1000
+    # A short tail batch says nothing
+    batch_size.observe(10, 0.001)
+    assert batch_size.size == 1000
+    assert dict(batch_size.decisions) == {"grow": 3, "shrink": 1, "revert": 1}
+    assert batch_size.backpressure() == 0
+
+
+def test_adaptive_batch_size_applies_backpressure_once_minimum_batches_overrun():
+    batch_size = AdaptiveBatchSize(initial=500, minimum=250, maximum=2000, target_seconds=1.0)
+
+    batch_size.observe(500, 2.0)
+    assert (batch_size.size, batch_size.backpressure()) == (250, 0)
+    batch_size.observe(250, 3.5)
+    assert batch_size.backpressure() == 2.5
+    batch_size.observe(250, 0.8)
+    assert batch_size.backpressure() == 0
+
+    fixed = AdaptiveBatchSize(initial=1000, minimum=1000, maximum=1000, target_seconds=1.0)
+    fixed.observe(1000, 5.0)
+    assert (fixed.size, fixed.backpressure()) == (1000, 0)
+
+
+def test_bulk_insert_follows_the_adaptive_batch_size():
+    cursor = RecordingCursor(reject={5, 13})
+    connection = SimpleNamespace(cursor=lambda: cursor)
+    batch_size = AdaptiveBatchSize(initial=2, minimum=1, maximum=8, target_seconds=60, growth=2)
+
+    result = bulk_insert(connection, "INSERT", [(i,) for i in range(20)], input_sizes=[int], batch_size=batch_size)
+
+    assert [len(batch) for batch in cursor.batches] == [2, 4, 8, 6]
+    assert result.inserted == 18
+    assert [row.offset for row in result.rejected] == [5, 13]
+
+
+def test_pool_holds_every_parallel_shard_next_to_the_job_session(monkeypatch):
+    monkeypatch.setattr(get_jda_settings(), "jda_pool_max", 4)
+    monkeypatch.setattr(get_jda_settings(), "jda_persist_parallelism", 1)
+    assert oracle_pool_max() == 4
+
+    monkeypatch.setattr(get_jda_settings(), "jda_persist_parallelism", 4)
+    assert oracle_pool_max() == 5
@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import threading
+import time
+from types import SimpleNamespace
+
+import oracledb
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+
+from app import utils_oracle
+from app.api import main
+from app.api.cache import TTLCache
+from app.jobs import job as job_module
+from app.jobs import worker as worker_module
+from app.jobs.job import AsyncJob, Job
+from app.jobs.worker import Worker, next_multiple, parse_schedule
+from app.settings import get_jda_settings, get_settings
+
+
+class FakeJob:
+    depends_on = ()
+    lock_name = None
+    release: threading.Event
+
+
+def fake_job(name: str, lock_name: str | None = None, error: str | None = None) -> type:
+    return type(name, (FakeJob,), {"lock_name": lock_name, "error": error, "release": threading.Event()})
+
+
+@pytest.fixture(autouse=True)
+def fake_run_job(monkeypatch):
+    def run_job(job):
+        assert job.release.wait(5)
+        if job.error:
+            raise RuntimeError(job.error)
+
+    monkeypatch.setattr(worker_module, "run_job", run_job)
+
+
+@pytest.fixture(autouse=True)
+def thin_mode(monkeypatch):
+    monkeypatch.setattr(get_jda_settings(), "jda_thick_mode", False)
+
+
+def wait_idle(worker: Worker) -> None:
+    for thread in list(worker.threads):
+        thread.join(5)
+
+
+def test_trigger_never_overlaps_runs_sharing_a_lock(tmp_path):
+    load, load_async, other = fake_job("Load", "stores"), fake_job("LoadAsync", "stores"), fake_job("Other")
+    worker = Worker([load, load_async, other], {}, str(tmp_path))
+
+    assert worker.trigger("Load")
+    assert not worker.trigger("Load")
+    assert not worker.trigger("LoadAsync")
+    assert worker.trigger("Other")
+    assert worker.status()["Load"]["running_since"] is not None
+    with pytest.raises(KeyError):
+        worker.trigger("Unknown")
+
+    load.release.set()
+    other.release.set()
+    wait_idle(worker)
+    assert worker.status()["Load"]["last_result"]["status"] == "succeeded"
+    assert worker.trigger("LoadAsync")
+    load_async.release.set()
+    wait_idle(worker)
+
+
+def test_workers_sharing_the_checkpoint_volume_skip_a_running_job(tmp_path):
+    load = fake_job("Load")
+    first, second = Worker([load], {}, str(tmp_path)), Worker([load], {}, str(tmp_path))
+
+    assert first.trigger("Load")
+    time.sleep(0.1)
+    assert second.trigger("Load")
+    wait_idle(second)
+    load.release.set()
+    wait_idle(first)
+
+    assert second.last_results["Load"].status == "skipped"
+    assert first.last_results["Load"].status == "succeeded"
+
+
+def test_schedule_runs_jobs_on_multiples_of_their_interval(tmp_path):
+    load = fake_job("Load")
+    load.release.set()
+    worker = Worker([load], parse_schedule(["Load=0.1"], {"Load": load}), str(tmp_path))
+
+    worker.start()
+    time.sleep(0.35)
+    worker.stop(timeout=5)
+
+    assert worker.last_results["Load"].status == "succeeded"
+    assert next_multiple(1000.0, 900) == 1800.0
+    with pytest.raises(ValueError, match="Invalid job name"):
+        parse_schedule({"Unknown": 60}, {"Load": load})
+
+
+def test_jobs_are_triggered_through_the_api(tmp_path, monkeypatch):
+    load = fake_job("Load")
+    client = TestClient(main.app)
+    headers = {"Authorization": "Bearer s3cret"}
+    monkeypatch.setattr(main.settings, "worker_trigger_token", SecretStr("s3cret"))
+    assert client.post("/jobs/Load/runs", headers=headers).status_code == 503
+
+    monkeypatch.setattr(main.app.state, "worker", Worker([load], {}, str(tmp_path)), raising=False)
+    assert client.post("/jobs/Load/runs").status_code == 401
+    assert client.post("/jobs/Load/runs", headers={"Authorization": "Bearer s3cre"}).status_code == 401
+    assert client.post("/jobs/Unknown/runs", headers=headers).status_code == 404
+    assert client.post("/jobs/Load/runs", headers=headers).json() == {"job": "Load", "status": "started"}
+    assert client.post("/jobs/Load/runs", headers=headers).status_code == 409
+
+    load.release.set()
+    wait_idle(main.app.state.worker)
+    assert client.get("/jobs").json()["Load"]["last_result"]["status"] == "succeeded"
+
+
+def test_triggering_jobs_is_disabled_without_a_token(tmp_path, monkeypatch):
+    load = fake_job("Load")
+    monkeypatch.setattr(main.app.state, "worker", Worker([load], {}, str(tmp_path)), raising=False)
+    monkeypatch.setattr(main.settings, "worker_trigger_token", None)
+
+    response = TestClient(main.app).post("/jobs/Load/runs", headers={"Authorization": "Bearer None"})
+
+    assert response.status_code == 403
+    assert main.app.state.worker.running == {}
+
+
+def test_worker_refuses_to_start_in_thick_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_jda_settings(), "jda_thick_mode", True)
+    worker = Worker([fake_job("Load")], {}, str(tmp_path))
+
+    with pytest.raises(RuntimeError, match="JDA_THICK_MODE=false"):
+        worker.start()
+    assert get_jda_settings().jda_thick_mode
+
+
+class FakePool:
+    """oracledb session pool handing out sessions that answer the status queries."""
+
+    def __init__(self, **kwargs):
+        self.opened = self.busy = 0
+        self.closed = False
+
+    def acquire(self):
+        return SimpleNamespace(cursor=FakeCursor)
+
+    def release(self, connection):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncPool(FakePool):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.loop = asyncio.get_running_loop()
+
+    async def acquire(self):
+        # A pool is bound to the loop that created it
+        assert asyncio.get_running_loop() is self.loop
+        return super().acquire()
+
+    async def release(self, connection):
+        assert asyncio.get_running_loop() is self.loop
+
+    async def close(self):
+        assert asyncio.get_running_loop() is self.loop
+        self.closed = True
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    async def execute(self, statement, *args, **kwargs):
+        pass
+
+    async def fetchall(self):
+        return [("U", 2), ("P", 10)]
+
+
+class SyncJdaJob(Job):
+    def task(self) -> None:
+        pass
+
+
+class AsyncJdaJob(AsyncJob):
+    async def task(self) -> None:
+        pass
+
+
+def test_api_reads_jda_next_to_sync_and_asyncio_jobs_of_its_worker(tmp_path, monkeypatch):
+    pools = []
+
+    def create_pool(pool_type):
+        def create(**kwargs):
+            pools.append(pool_type(**kwargs))
+            return pools[-1]
+
+        return create
+
+    def init_oracle_client():
+        raise AssertionError("the thick client rules out the API's asyncio sessions")
+
+    monkeypatch.setattr(worker_module, "run_job", job_module.run_job)
+    monkeypatch.setattr(oracledb, "init_oracle_client", init_oracle_client)
+    monkeypatch.setattr(oracledb, "create_pool", create_pool(FakePool))
+    monkeypatch.setattr(oracledb, "create_pool_async", create_pool(FakeAsyncPool))
+    monkeypatch.setattr(utils_oracle, "_pool", None)
+    monkeypatch.setattr(utils_oracle, "_async_pools", {})
+    monkeypatch.setattr(utils_oracle, "_client_initialized", False)
+    monkeypatch.setattr(job_module, "create_supergraph_client", lambda: SimpleNamespace(close=lambda: None))
+    monkeypatch.setattr(job_module, "create_async_supergraph_client", contextlib.nullcontext)
+    monkeypatch.setattr(get_settings(), "checkpoint_path", str(tmp_path))
+    monkeypatch.setattr(get_settings(), "metrics_path", str(tmp_path / "metrics"))
+    monkeypatch.setattr(main, "setup_glogger", lambda **kwargs: None)
+    monkeypatch.setattr(main, "cache", TTLCache(ttl=0))
+    worker = Worker([SyncJdaJob, AsyncJdaJob], {}, str(tmp_path))
+    monkeypatch.setattr(main.app.state, "worker", worker, raising=False)
+
+    with TestClient(main.app) as client:
+        assert client.get("/status/pending").json()["pending"] == 2
+        for job in ["SyncJdaJob", "AsyncJdaJob"]:
+            assert worker.trigger(job)
+            wait_idle(worker)
+            assert worker.last_results[job].status == "succeeded", worker.last_results[job].error
+            assert client.get("/status/pending").json()["pending"] == 2
+
+    # One pool for the sync job, and one for each event loop: the API's and the worker's
+    assert [type(pool) for pool in pools] == [FakeAsyncPool, FakePool, FakeAsyncPool]
+    assert pools[0].loop is not pools[2].loop
+    assert all(pool.closed for pool in pools)